@@ -0,0 +1,317 @@
+import io
+import re
+import json
+import time
+import uuid
+import random
+import threading
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from PIL import Image
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+GENRE_POOL = ["rock", "pop", "r&b", "hip hop", "pop rock", "alternative rock", "jazz", "electronic", "folk"]
+COVER_HOST_URL = "https://archive.org/download/synthetic"
+
+
+def generate_artists(count: int) -> list[str]:
+    """
+    Generates the names of the synthetic artists.
+
+    Args:
+        count (int): The number of artists.
+
+    Returns:
+        list[str]: The artist names.
+    """
+    return [f"Synthetic Artist {i:04d}" for i in range(count)]
+
+
+def generate_release_group(rng: random.Random, artist: str, artist_id: str, index: int) -> dict:
+    """
+    Generates the browse JSON of a release group. About one in ten release groups fails one of the release filters.
+
+    Args:
+        rng (random.Random): The random number generator.
+        artist (str): The name of the artist.
+        artist_id (str): The ID of the artist.
+        index (int): The index of the release group of the artist.
+
+    Returns:
+        dict: The release group in the format of the MusicBrainz browse endpoint.
+    """
+    credits = [{"name": artist, "joinphrase": "", "artist": {"id": artist_id, "name": artist, "disambiguation": ""}}]
+    secondary_types = []
+    first_release_date = f"{rng.randint(1960, 2022)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    roll = rng.random()
+    if roll < 0.03:
+        secondary_types = ["Live"]
+    elif roll < 0.06:
+        credits[0]["joinphrase"] = " & "
+        credits.append({"name": "Guest", "joinphrase": "", "artist": {"id": str(uuid.UUID(int=rng.getrandbits(128))),
+                                                                       "name": "Guest", "disambiguation": ""}})
+    elif roll < 0.1:
+        first_release_date = "2030-01-01"
+    genres = [{"name": name, "count": rng.randint(1, 20)} for name in rng.sample(GENRE_POOL, rng.randint(1, 4))]
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "title": f"Synthetic Album {index:03d}",
+        "disambiguation": "",
+        "first-release-date": first_release_date,
+        "primary-type": "Album",
+        "secondary-types": secondary_types,
+        "genres": genres,
+        "artist-credit": credits,
+    }
+
+
+def generate_cover(rng: random.Random, size: int = 1200) -> bytes:
+    """
+    Generates a random JPEG cover by upscaling a small noise image, so its file size is close to a real cover.
+
+    Args:
+        rng (random.Random): The random number generator.
+        size (int): The width and height of the cover in pixels.
+
+    Returns:
+        bytes: The JPEG cover.
+    """
+    noise = Image.frombytes("RGB", (16, 16), rng.randbytes(16 * 16 * 3))
+    buffer = io.BytesIO()
+    noise.resize((size, size), Image.Resampling.BICUBIC).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class SyntheticMusicBrainz:
+    """
+    Generates the artists, release groups and covers of a synthetic catalog and serves them like MusicBrainz and the Cover Art Archive.
+
+    Attributes:
+        artists (list[str]): The names of the artists.
+        release_groups (dict[str, list[dict]]): The release groups by artist ID.
+        covers (dict[str, bytes]): The JPEG cover of every release group by release group ID.
+        _artist_ids (dict[str, str]): The ID of every artist by name.
+        _latencies (dict[str, float]): The latency of the responses by host in seconds.
+
+    Methods:
+        get_adapter(): Returns a transport adapter that serves the catalog.
+    """
+    def __init__(self, artist_count: int = 20, release_groups_per_artist: int = 10, cover_size: int = 1200,
+                 latencies: dict[str, float] | None = None, seed: int = 0):
+        """
+        Initializes a SyntheticMusicBrainz object and generates the catalog.
+
+        Args:
+            artist_count (int): The number of artists.
+            release_groups_per_artist (int): The number of release groups of every artist.
+            cover_size (int): The width and height of the covers in pixels.
+            latencies (dict[str, float] | None): The latency of the responses by host in seconds. None serves without latency.
+            seed (int): The seed of the random number generator.
+        """
+        rng = random.Random(seed)
+        self.artists = generate_artists(artist_count)
+        self._artist_ids = {artist: str(uuid.UUID(int=rng.getrandbits(128))) for artist in self.artists}
+        self.release_groups = {}
+        self.covers = {}
+        for artist in self.artists:
+            artist_id = self._artist_ids[artist]
+            self.release_groups[artist_id] = [
+                generate_release_group(rng, artist, artist_id, i) for i in range(release_groups_per_artist)
+            ]
+            for release_group in self.release_groups[artist_id]:
+                self.covers[release_group["id"]] = generate_cover(rng, cover_size)
+        self._latencies = latencies or {}
+
+    def get_adapter(self) -> BaseAdapter:
+        """
+        Returns a transport adapter that serves the catalog.
+
+        Returns:
+            BaseAdapter: The adapter to mount on a requests session.
+        """
+        return _SyntheticAdapter(self)
+
+    def _respond(self, url: str) -> tuple[int, str, bytes]:
+        parts = urlsplit(url)
+        query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+        path = parts.path.rstrip("/")
+        host = parts.hostname or ""
+        time.sleep(self._latencies.get(host, 0.0))
+
+        if host == "musicbrainz.org" and path == "/ws/2/artist":
+            names = [name.replace('\\"', '"') for name in re.findall(r'"((?:[^"\\]|\\.)*)"', query.get("query", ""))]
+            names = names or [query.get("query", "")]
+            artists = [
+                {"id": self._artist_ids[name], "name": name, "sort-name": name, "score": 100}
+                for name in names if name in self._artist_ids
+            ]
+            return 200, "application/json", json.dumps({"artists": artists}).encode("utf-8")
+        if host == "musicbrainz.org" and path == "/ws/2/release-group":
+            release_groups = self.release_groups.get(query.get("artist"), [])
+            offset = int(query.get("offset", 0))
+            limit = int(query.get("limit", 25))
+            page = {"release-group-count": len(release_groups), "release-groups": release_groups[offset:offset + limit]}
+            return 200, "application/json", json.dumps(page).encode("utf-8")
+        if host == "coverartarchive.org" and path.startswith("/release-group/"):
+            release_group_id = path.split("/")[2]
+            if release_group_id not in self.covers:
+                return 404, "text/plain", b"Not found"
+            image_url = f"{COVER_HOST_URL}/{release_group_id}.jpg"
+            thumbnails = {size: f"{COVER_HOST_URL}/{release_group_id}-{size}.jpg" for size in ("250", "500", "1200")}
+            images = [{"front": True, "image": image_url, "thumbnails": thumbnails}]
+            return 200, "application/json", json.dumps({"images": images}).encode("utf-8")
+        if url.startswith(COVER_HOST_URL):
+            release_group_id = path.rsplit("/", 1)[1][:36]
+            if release_group_id in self.covers:
+                return 200, "image/jpeg", self.covers[release_group_id]
+        return 404, "text/plain", b"Not found"
+
+
+class _SyntheticAdapter(BaseAdapter):
+    def __init__(self, catalog: SyntheticMusicBrainz):
+        super().__init__()
+        self._catalog = catalog
+
+    def send(self, request: PreparedRequest, stream: bool = False, **kwargs) -> Response:
+        status, content_type, body = self._catalog._respond(request.url)
+        response = Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({"Content-Type": content_type})
+        response.encoding = "utf-8" if content_type == "application/json" else None
+        response.raw = io.BytesIO(body)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self) -> "_Result":
+        return self
+
+
+class _Query:
+    def __init__(self, client: "SyntheticSupabaseClient", table: str):
+        self._client = client
+        self._table = table
+
+    def upsert(self, rows: list[dict], **kwargs) -> _Result:
+        self._client._wait()
+        with self._client._lock:
+            if self._client.failing_upserts:
+                self._client.failing_upserts -= 1
+                raise ConnectionError("Synthetic upsert failure")
+            self._client.rows.extend(rows)
+            self._client.upserts.append(len(rows))
+        return _Result(rows)
+
+
+class _Bucket:
+    def __init__(self, client: "SyntheticSupabaseClient", bucket: str):
+        self._client = client
+        self._bucket = bucket
+
+    def get_public_url(self, path: str) -> str:
+        return f"{self._client.supabase_url}/storage/v1/object/public/{self._bucket}/{path}?"
+
+    def list(self, folder: str, options: dict | None = None) -> list[dict]:
+        self._client._wait()
+        return []
+
+    def upload(self, file: bytes, path: str, file_options: dict | None = None) -> dict:
+        self._client._wait()
+        with self._client._lock:
+            self._client.uploads[path] = len(file)
+        return {"Key": f"{self._bucket}/{path}"}
+
+
+class _Storage:
+    def __init__(self, client: "SyntheticSupabaseClient"):
+        self._client = client
+
+    def from_(self, bucket: str) -> _Bucket:
+        return _Bucket(self._client, bucket)
+
+
+class SyntheticSupabaseClient:
+    """
+    A stand-in for the Supabase client that accepts every table and storage request after a fixed latency.
+
+    Only the calls made by SupabaseSink and StorageManager are supported.
+
+    Attributes:
+        supabase_url (str): The URL used in public URLs.
+        column_names (list[str]): The column names returned by the get_column_names function.
+        rows (list[dict]): The upserted rows.
+        upserts (list[int]): The number of rows of every upsert.
+        failing_upserts (int): The number of next upserts that fail with a ConnectionError.
+        uploads (dict[str, int]): The size of every uploaded file by storage path.
+        storage: The storage client.
+    """
+    def __init__(self, column_names: list[str], latency: float = 0.0, supabase_url: str = "https://synthetic.supabase.co"):
+        """
+        Initializes a SyntheticSupabaseClient object.
+
+        Args:
+            column_names (list[str]): The column names returned by the get_column_names function.
+            latency (float): The latency of every request in seconds.
+            supabase_url (str): The URL used in public URLs.
+        """
+        self.supabase_url = supabase_url
+        self.column_names = column_names
+        self.rows = []
+        self.upserts = []
+        self.failing_upserts = 0
+        self.uploads = {}
+        self.storage = _Storage(self)
+        self._latency = latency
+        self._lock = threading.Lock()
+
+    def _wait(self) -> None:
+        if self._latency > 0:
+            time.sleep(self._latency)
+
+    def rpc(self, name: str, params: dict) -> _Result:
+        self._wait()
+        return _Result(self.column_names)
+
+    def from_(self, table: str) -> _Query:
+        return _Query(self, table)
+
+    table = from_
+
+
+class SyntheticModel:
+    """
+    A stand-in for the CLIP model that returns random unit vectors after a fixed latency per image,
+    for pipeline benchmarks that should not depend on the model or the hardware.
+
+    Attributes:
+        _dim (int): The number of dimensions of the embeddings.
+        _latency (float): The latency of every image in seconds.
+    """
+    def __init__(self, dim: int = 512, latency: float = 0.01):
+        """
+        Initializes a SyntheticModel object.
+
+        Args:
+            dim (int): The number of dimensions of the embeddings.
+            latency (float): The latency of every image in seconds.
+        """
+        self._dim = dim
+        self._latency = latency
+        self._rng = np.random.default_rng(0)
+
+    def encode(self, images: list, batch_size: int = 32, **kwargs) -> np.ndarray:
+        time.sleep(self._latency * len(images))
+        embeddings = self._rng.standard_normal((len(images), self._dim)).astype(np.float32)
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
@@ -0,0 +1,367 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import tempfile
+import contextlib
+import subprocess
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+import numpy as np
+from requests import Session
+
+
+COLUMN_NAMES = ["artist", "title", "year", "genre", "release_group_id", "src", "duplicate_of", "embedding"]
+TABLE = "releases"
+BUCKET = "covers"
+
+
+def _summarize(latencies: list[float], seconds: float) -> dict:
+    if not latencies:
+        return {"items": 0, "seconds": round(seconds, 4), "throughput": 0.0}
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "items": len(latencies),
+        "seconds": round(seconds, 4),
+        "throughput": round(len(latencies) / seconds, 2) if seconds > 0 else None,
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+        "mean_ms": round(float(latencies_ms.mean()), 3),
+    }
+
+
+def _measure(func: Callable[[Any], Any], items: list) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        item_start = time.perf_counter()
+        func(item)
+        latencies.append(time.perf_counter() - item_start)
+    return _summarize(latencies, time.perf_counter() - start)
+
+
+def _summarize_stages(seconds: float) -> dict:
+    from utils.metrics import METRICS
+    stages = {}
+    for histogram in METRICS.snapshot()["histograms"]:
+        if histogram["name"] != "pipeline_stage_seconds":
+            continue
+        count = histogram["count"]
+        stages[histogram["labels"]["stage"]] = {
+            "items": count,
+            "seconds": round(seconds, 4),
+            "throughput": round(count / seconds, 2) if seconds > 0 else None,
+            "p50_ms": round(histogram["p50"] * 1000, 3),
+            "p99_ms": round(histogram["p99"] * 1000, 3),
+            "mean_ms": round(histogram["sum"] / count * 1000, 3),
+        }
+    return stages
+
+
+def _make_catalog(args: dict):
+    from benchmarks.fixtures import SyntheticMusicBrainz
+    latencies = {
+        "musicbrainz.org": args["mb_latency"],
+        "coverartarchive.org": args["caa_latency"],
+        "archive.org": args["cover_latency"],
+    }
+    return SyntheticMusicBrainz(args["artists"], args["release_groups"], args["cover_size"], latencies, args["seed"])
+
+
+def _make_rows(catalog, count: int, rng: random.Random) -> list[dict]:
+    from musicbrainz.release_group import ReleaseGroup
+    from musicbrainz.extended_release_group import ExtendedReleaseGroup
+    rows = []
+    release_groups = [release_group for groups in catalog.release_groups.values() for release_group in groups]
+    for i in range(count):
+        release_group = ExtendedReleaseGroup(ReleaseGroup(release_groups[i % len(release_groups)]))
+        row = release_group.get_data("rock")
+        row["title"] = f"{row['title']} {i}"
+        row["src"] = f"https://synthetic.supabase.co/storage/v1/object/public/{BUCKET}/{i}.jpg"
+        row["embedding"] = "[" + ",".join(str(rng.uniform(-0.1, 0.1)) for _ in range(512)) + "]"
+        rows.append(row)
+    return rows
+
+
+def _load_model(args: dict):
+    if args["synthetic_model"] is not None:
+        from benchmarks.fixtures import SyntheticModel
+        return SyntheticModel(latency=args["synthetic_model"])
+    from main import load_model
+    return load_model()
+
+
+def bench_release_group_parse(args: dict) -> dict:
+    from musicbrainz.release_group import ReleaseGroup
+    from utils.utils import load_json
+    catalog = _make_catalog(args)
+    documents = [json.dumps(release_group) for groups in catalog.release_groups.values() for release_group in groups]
+
+    def parse(document: str) -> None:
+        release_group = ReleaseGroup(load_json(document))
+        release_group.get_id()
+        release_group.is_album()
+        release_group.is_solo()
+        release_group.is_released("2023-12-31")
+        release_group.get_fingerprint()
+
+    return _measure(parse, documents)
+
+
+def bench_get_genre(args: dict) -> dict:
+    from main import RELEASE_FILTER
+    from musicbrainz.release_group import ReleaseGroup
+    from musicbrainz.extended_release_group import ExtendedReleaseGroup
+    catalog = _make_catalog(args)
+    release_groups = [
+        ExtendedReleaseGroup(ReleaseGroup(release_group))
+        for groups in catalog.release_groups.values() for release_group in groups
+    ]
+    genres = [alias for aliases in RELEASE_FILTER["genres"].values() for alias in aliases]
+    return _measure(lambda release_group: release_group.get_genre(genres), release_groups)
+
+
+def bench_release_filter(args: dict) -> dict:
+    from main import RELEASE_FILTER
+    from musicbrainz.release_group import ReleaseGroup
+    from musicbrainz.release_group_filter import ReleaseGroupFilter
+    catalog = _make_catalog(args)
+    release_filter = ReleaseGroupFilter(RELEASE_FILTER)
+    release_groups = [ReleaseGroup(release_group) for groups in catalog.release_groups.values() for release_group in groups]
+    return _measure(release_filter.match, release_groups)
+
+
+def bench_save_cover(args: dict) -> dict:
+    from utils.utils import save_cover
+    catalog = _make_catalog(args)
+    covers = list(catalog.covers.items())
+    return _measure(lambda item: save_cover(os.path.join("covers", f"{item[0]}.jpg"), item[1], (1024, 1024)), covers)
+
+
+def bench_clip_encode(args: dict) -> dict:
+    from utils.utils import decode_cover
+    catalog = _make_catalog(args)
+    images = [decode_cover(cover, (1024, 1024)) for cover in catalog.covers.values()]
+    load_start = time.perf_counter()
+    model = _load_model(args)
+    load_seconds = time.perf_counter() - load_start
+    batch_size = args["embed_batch_size"]
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+    result = _measure(lambda batch: model.encode(batch, batch_size=len(batch)), batches)
+    result["images"] = len(images)
+    result["images_throughput"] = round(len(images) / result["seconds"], 2) if result["seconds"] > 0 else None
+    result["model_load_seconds"] = round(load_seconds, 4)
+    return result
+
+
+def bench_csv_save(args: dict) -> dict:
+    from managers.csv_manager import CSVManager
+    rows = _make_rows(_make_catalog(args), args["rows"], random.Random(args["seed"]))
+    cm = CSVManager("db.csv", batch_size=100, flush_interval=5.0)
+    start = time.perf_counter()
+    result = _measure(cm.save, rows)
+    cm.close()
+    result["seconds_with_close"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def bench_csv_exists(args: dict) -> dict:
+    from managers.csv_manager import CSVManager
+    rows = _make_rows(_make_catalog(args), args["rows"], random.Random(args["seed"]))
+    cm = CSVManager("db.csv", batch_size=100, flush_interval=5.0)
+    for row in rows[::2]:
+        cm.save(row)
+    cm.close()
+    load_start = time.perf_counter()
+    cm = CSVManager("db.csv", batch_size=100, flush_interval=5.0)
+    load_seconds = time.perf_counter() - load_start
+    result = _measure(cm.csv_data_exists, rows)
+    cm.close()
+    result["index_load_seconds"] = round(load_seconds, 4)
+    return result
+
+
+def bench_supabase_sink(args: dict) -> dict:
+    from benchmarks.fixtures import SyntheticSupabaseClient
+    from managers.supabase_sink import SupabaseSink
+    rows = _make_rows(_make_catalog(args), args["rows"], random.Random(args["seed"]))
+    client = SyntheticSupabaseClient(COLUMN_NAMES, args["supabase_latency"])
+    sink = SupabaseSink(client, TABLE, batch_size=100, flush_interval=5.0)
+    start = time.perf_counter()
+    result = _measure(sink.add, rows)
+    sink.close()
+    result["seconds_with_close"] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def _bench_end_to_end(args: dict, pipeline_mode: bool) -> dict:
+    import main
+    from benchmarks.fixtures import SyntheticSupabaseClient
+    from managers.journal_manager import JournalManager
+    from managers.refresh_manager import RefreshManager
+
+    catalog = _make_catalog(args)
+    session = Session()
+    session.mount("https://", catalog.get_adapter())
+    session.mount("http://", catalog.get_adapter())
+    client = SyntheticSupabaseClient(COLUMN_NAMES, args["supabase_latency"])
+
+    load_start = time.perf_counter()
+    model = _load_model(args)
+    load_seconds = time.perf_counter() - load_start
+
+    artists = catalog.artists
+    services = main.build_services(
+        argparse.Namespace(worker_id=None, incremental=False), session, artists, lambda: client, TABLE, BUCKET, pipeline_mode,
+        cached=False, model_loader=lambda: model,
+    )
+    journal = JournalManager(main.JOURNAL_FILE_PATH)
+    refresh = RefreshManager(main.REFRESH_FILE_PATH)
+    run = main.run_pipeline if pipeline_mode else main.run_sequential
+
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(services, journal, refresh, "all", artists, range(len(artists)))
+    finally:
+        services.close()
+        refresh.close()
+        journal.close()
+    seconds = time.perf_counter() - start
+
+    stages = _summarize_stages(seconds)
+    releases = stages.get("sink", {}).get("items", 0)
+    return {
+        "artists": len(artists),
+        "items": releases,
+        "seconds": round(seconds, 4),
+        "throughput": round(releases / seconds, 2) if seconds > 0 else None,
+        "model_load_seconds": round(load_seconds, 4),
+        "rows_upserted": len(client.rows),
+        "covers_uploaded": len(client.uploads),
+        "stages": stages,
+    }
+
+
+def bench_pipeline(args: dict) -> dict:
+    return _bench_end_to_end(args, pipeline_mode=True)
+
+
+def bench_sequential(args: dict) -> dict:
+    return _bench_end_to_end(args, pipeline_mode=False)
+
+
+BENCHMARKS = {
+    "release_group_parse": bench_release_group_parse,
+    "get_genre": bench_get_genre,
+    "release_filter": bench_release_filter,
+    "save_cover": bench_save_cover,
+    "clip_encode": bench_clip_encode,
+    "csv_save": bench_csv_save,
+    "csv_exists": bench_csv_exists,
+    "supabase_sink": bench_supabase_sink,
+    "pipeline": bench_pipeline,
+    "sequential": bench_sequential,
+}
+
+
+def _run_benchmark(name: str, args: dict) -> dict:
+    if not args["rate_limits"]:
+        from utils.utils import RATE_LIMITER
+        RATE_LIMITER.set_limits({})
+    with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as dir_path:
+        os.chdir(dir_path)
+        os.makedirs("data", exist_ok=True)
+        try:
+            result = BENCHMARKS[name](args)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def _get_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_comparison(results: dict, baseline: dict) -> None:
+    for name, result in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or not base.get("throughput") or not result.get("throughput"):
+            continue
+        change = result["throughput"] / base["throughput"] - 1
+        print(f"{name:22} {base['throughput']:>10.2f} -> {result['throughput']:>10.2f} items/s ({change:+.1%}), "
+              f"p99 {base.get('p99_ms', 0):.2f} -> {result.get('p99_ms', 0):.2f} ms", file=sys.stderr)
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks the ingestor and its components against synthetic fixtures.")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--artists", type=int, default=20, help="number of synthetic artists")
+    parser.add_argument("--release-groups", type=int, default=10, help="number of release groups of every artist")
+    parser.add_argument("--cover-size", type=int, default=1200, help="width and height of the synthetic covers")
+    parser.add_argument("--rows", type=int, default=5000, help="number of rows of the csv and sink benchmarks")
+    parser.add_argument("--mb-latency", type=float, default=0.05, help="latency of MusicBrainz responses in seconds")
+    parser.add_argument("--caa-latency", type=float, default=0.05, help="latency of Cover Art Archive responses in seconds")
+    parser.add_argument("--cover-latency", type=float, default=0.1, help="latency of cover downloads in seconds")
+    parser.add_argument("--supabase-latency", type=float, default=0.05, help="latency of Supabase requests in seconds")
+    parser.add_argument("--embed-batch-size", type=int, default=32, help="batch size of the clip_encode benchmark")
+    parser.add_argument("--synthetic-model", type=float, metavar="SECONDS",
+                        help="replace the CLIP model with random embeddings that take this many seconds per image")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the production rate limits instead of lifting them")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic fixtures")
+    parser.add_argument("--output", help="write the results to this JSON file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="print the throughput change against a previous results file")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    names = args.only or list(BENCHMARKS)
+    options = vars(args)
+    results = {
+        "meta": {
+            "commit": _get_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": {key: value for key, value in options.items() if key not in ("only", "output", "compare")},
+        },
+        "benchmarks": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    for name in names:
+        print(f"Running {name}...", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results["benchmarks"][name] = executor.submit(_run_benchmark, name, options).result()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, "r") as f:
+            _print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+from PIL import Image
+from utils.metrics import METRICS
+
+
+class BatchEmbedder:
+    """
+    Collects images from many threads into batches and encodes every batch with a single model call.
+
+    A batch is encoded as soon as it has batch_size images or flush_timeout seconds have passed since its first image.
+    The model starts loading in a background thread when the first image is submitted, e.g. on the first embedding cache miss,
+    so it loads while the first batch fills up and is never loaded if nothing is submitted. A failed load is retried on the next submit.
+
+    Attributes:
+        _model_loader (Callable[[], Any]): Returns the model with a SentenceTransformer-like encode method.
+        _model_future (Future | None): The future of the model or None if it has not started loading yet.
+        _batch_size (int): The maximum number of images in a batch.
+        _flush_timeout (float): The maximum number of seconds to wait for a batch to fill up.
+
+    Methods:
+        submit(image): Adds the image to the next batch and returns a future of its embedding.
+        encode(image): Adds the image to the next batch and blocks until its embedding is ready.
+        close(): Encodes the remaining images and stops the background thread.
+    """
+    def __init__(self, model_loader: Callable[[], Any], batch_size: int = 32, flush_timeout: float = 0.5):
+        """
+        Initializes a BatchEmbedder object and starts its background thread.
+
+        Args:
+            model_loader (Callable[[], Any]): Returns the model with a SentenceTransformer-like encode method.
+            batch_size (int): The maximum number of images in a batch.
+            flush_timeout (float): The maximum number of seconds to wait for a batch to fill up.
+
+        Raises:
+            ValueError: If the batch size is less than 1 or the flush timeout is negative.
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        if flush_timeout < 0:
+            raise ValueError("Flush timeout must not be negative")
+        self._model_loader = model_loader
+        self._model_future = None
+        self._lock = threading.Lock()
+        self._batch_size = batch_size
+        self._flush_timeout = flush_timeout
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._work, name="batch-embedder", daemon=True)
+        self._thread.start()
+
+    def submit(self, image: Image.Image) -> Future:
+        """
+        Adds the image to the next batch and returns a future of its embedding.
+
+        Args:
+            image (Image.Image): The decoded image.
+
+        Returns:
+            Future: The future of the image embedding.
+
+        Raises:
+            RuntimeError: If the embedder is closed.
+        """
+        if self._closed:
+            raise RuntimeError("BatchEmbedder is closed")
+        self._load_model()
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def encode(self, image: Image.Image) -> Any:
+        """
+        Adds the image to the next batch and blocks until its embedding is ready.
+
+        Args:
+            image (Image.Image): The decoded image.
+
+        Returns:
+            Any: The embedding of the image.
+        """
+        return self.submit(image).result()
+
+    def close(self) -> None:
+        """
+        Encodes the remaining images and stops the background thread.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _load_model(self) -> Future:
+        with self._lock:
+            if self._model_future is None:
+                self._model_future = Future()
+                threading.Thread(target=self._run_model_loader, args=(self._model_future,), name="model-loader", daemon=True).start()
+            return self._model_future
+
+    def _run_model_loader(self, future: Future) -> None:
+        try:
+            with METRICS.timer("model_load_seconds"):
+                model = self._model_loader()
+        except BaseException as e:
+            with self._lock:
+                self._model_future = None
+            future.set_exception(e)
+            return
+        future.set_result(model)
+
+    def _collect_batch(self) -> tuple[list, bool]:
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self._flush_timeout
+        while len(batch) < self._batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _work(self) -> None:
+        done = False
+        while not done:
+            batch, done = self._collect_batch()
+            if not batch:
+                continue
+            images = [image for image, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                model = self._load_model().result()
+                with METRICS.timer("embed_batch_seconds"):
+                    embeddings = model.encode(images, batch_size=len(images))
+                METRICS.increment("embed_images_total", len(images))
+            except BaseException as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, embedding in zip(futures, embeddings):
+                future.set_result(embedding)
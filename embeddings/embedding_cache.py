@@ -0,0 +1,176 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+from utils.utils import format_string
+from utils.metrics import METRICS
+
+
+KEY_SIZE = 32
+
+
+def _write_json_atomic(file_path: str, data: dict) -> None:
+    tmp_file_path = f"{file_path}.tmp"
+    with open(tmp_file_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file_path, file_path)
+
+
+class EmbeddingCache:
+    """
+    A persistent LRU cache of cover embeddings keyed by the SHA-256 of the decoded cover pixels and the model name.
+
+    The vectors and the key of every slot live in memory-mapped files, so lookups do not load the whole cache into memory.
+    An index file keeps the recency order of the keys. The key of a slot is cleared while its vector is rewritten,
+    so a crash never leaves a key pointing at a vector of another cover.
+
+    Attributes:
+        model_name (str): The name of the model that produced the embeddings.
+        dim (int): The number of dimensions of an embedding.
+        capacity (int): The maximum number of cached embeddings. The least recently used ones are evicted first.
+
+    Methods:
+        hash_image(image): Returns the cache key of the decoded image.
+        get(key): Returns the cached embedding of the key or None.
+        put(key, embedding): Stores the embedding of the key, evicting the least recently used one if the cache is full.
+        save(): Flushes the vectors to disk and saves the index file.
+    """
+    def __init__(self, dir_path: str, model_name: str, dim: int = 512, capacity: int = 100_000, save_interval: int = 100):
+        """
+        Initializes an EmbeddingCache object, creating the cache files if they do not exist.
+
+        Args:
+            dir_path (str): The directory of the cache files.
+            model_name (str): The name of the model that produced the embeddings.
+            dim (int): The number of dimensions of an embedding.
+            capacity (int): The maximum number of cached embeddings.
+            save_interval (int): The number of stored embeddings after which the index file is saved automatically.
+
+        Raises:
+            ValueError: If the existing cache files were created with a different dim or capacity.
+        """
+        self.model_name = model_name
+        self.dim = dim
+        self.capacity = capacity
+        self._save_interval = save_interval
+        self._unsaved_count = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(dir_path, exist_ok=True)
+        base_path = os.path.join(dir_path, format_string(model_name))
+        self._index_file_path = f"{base_path}.index.json"
+        vectors_file_path = f"{base_path}.vectors.f32"
+        keys_file_path = f"{base_path}.keys.bin"
+
+        index = {}
+        if os.path.exists(self._index_file_path):
+            with open(self._index_file_path, "r") as f:
+                index = json.load(f)
+            if index["dim"] != dim or index["capacity"] != capacity:
+                raise ValueError(f"Embedding cache in \"{dir_path}\" was created with a different dim or capacity")
+
+        mode = "r+" if os.path.exists(vectors_file_path) and os.path.exists(keys_file_path) else "w+"
+        self._vectors = np.memmap(vectors_file_path, dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self._keys = np.memmap(keys_file_path, dtype=np.uint8, mode=mode, shape=(capacity, KEY_SIZE))
+
+        slots = {}
+        for slot in np.flatnonzero(self._keys.any(axis=1)):
+            slots[self._keys[slot].tobytes().hex()] = int(slot)
+        self._slots = OrderedDict()
+        for key in index.get("order", []):
+            if key in slots:
+                self._slots[key] = slots.pop(key)
+        for key, slot in slots.items():
+            self._slots[key] = slot
+            self._slots.move_to_end(key, last=False)
+        used_slots = set(self._slots.values())
+        self._free_slots = [slot for slot in range(capacity - 1, -1, -1) if slot not in used_slots]
+
+    def hash_image(self, image: Image.Image) -> str:
+        """
+        Returns the cache key of the decoded image.
+
+        Args:
+            image (Image.Image): The decoded image.
+
+        Returns:
+            str: The hex SHA-256 of the model name, the image mode and size and the image pixels.
+        """
+        h = hashlib.sha256()
+        h.update(f"{self.model_name}\0{image.mode}\0{image.width}x{image.height}\0".encode())
+        h.update(image.tobytes())
+        return h.hexdigest()
+
+    def get(self, key: str) -> np.ndarray | None:
+        """
+        Returns the cached embedding of the key or None.
+
+        Args:
+            key (str): The key returned by hash_image.
+
+        Returns:
+            np.ndarray | None: A copy of the cached embedding or None if the key is not cached.
+        """
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                METRICS.increment("embedding_cache_requests_total", result="miss")
+                return None
+            self._slots.move_to_end(key)
+            METRICS.increment("embedding_cache_requests_total", result="hit")
+            return np.array(self._vectors[slot])
+
+    def put(self, key: str, embedding: np.ndarray) -> None:
+        """
+        Stores the embedding of the key, evicting the least recently used one if the cache is full.
+
+        Args:
+            key (str): The key returned by hash_image.
+            embedding (np.ndarray): The embedding to store.
+
+        Raises:
+            ValueError: If the embedding does not have dim dimensions.
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        if embedding.shape != (self.dim,):
+            raise ValueError(f"Embedding must have {self.dim} dimensions")
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is None:
+                if self._free_slots:
+                    slot = self._free_slots.pop()
+                else:
+                    _, slot = self._slots.popitem(last=False)
+            self._keys[slot] = 0
+            self._vectors[slot] = embedding
+            self._keys[slot] = np.frombuffer(bytes.fromhex(key), dtype=np.uint8)
+            self._slots[key] = slot
+            self._unsaved_count += 1
+            if self._unsaved_count >= self._save_interval:
+                self._save()
+
+    def save(self) -> None:
+        """
+        Flushes the vectors to disk and saves the index file.
+        """
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        self._vectors.flush()
+        self._keys.flush()
+        _write_json_atomic(self._index_file_path, {
+            "model_name": self.model_name,
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "order": list(self._slots.keys()),
+        })
+        self._unsaved_count = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
@@ -0,0 +1,231 @@
+import os
+import hashlib
+import threading
+from functools import lru_cache
+import numpy as np
+
+
+DTYPE_SUFFIXES = {"float32": "f32", "float16": "f16"}
+
+
+@lru_cache(maxsize=16)
+def _get_pgvector_format(dim: int, precision: int) -> str:
+    return "[" + ",".join([f"%.{precision}g"] * dim) + "]"
+
+
+def format_pgvector(embedding: np.ndarray, precision: int = 6) -> str:
+    """
+    Formats the embedding as a pgvector literal with a single string formatting call instead of one str call per element.
+
+    Args:
+        embedding (np.ndarray): The embedding.
+        precision (int): The number of significant digits of every element. float32 embeddings need at most 9 to round-trip.
+
+    Returns:
+        str: The pgvector literal, e.g. "[0.0123,-0.0456]".
+    """
+    values = np.asarray(embedding, dtype=np.float64).ravel().tolist()
+    return _get_pgvector_format(len(values), precision) % tuple(values)
+
+
+def _load_ids(file_path: str) -> list[str]:
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, "rb") as f:
+        content = f.read()
+    return content[:content.rfind(b"\n") + 1].decode("utf-8").splitlines()
+
+
+def _truncate(file_path: str, length: int) -> None:
+    if os.path.exists(file_path) and os.path.getsize(file_path) > length:
+        print(f"Truncating incomplete record in {file_path}")
+        with open(file_path, "r+b") as f:
+            f.truncate(length)
+
+
+class EmbeddingStore:
+    """
+    An append-only store of embeddings indexed by release group ID.
+
+    The vectors are appended to a raw "<file_path>.f32" (or ".f16") file that is a plain row-major matrix,
+    so it can be memory-mapped without parsing, and the IDs are appended to "<file_path>.ids", one per line.
+    A vector is always written before its ID, and a record left incomplete by a crash is truncated on the next initialization.
+    If an ID is stored again with a different vector, the latest vector wins.
+    Writes go straight to the operating system, so they survive a crash of the process.
+
+    Attributes:
+        _vectors_file_path (str): The path to the raw vector file.
+        _ids_file_path (str): The path to the ID file.
+        _dim (int): The number of dimensions of the embeddings.
+        _dtype (np.dtype): The data type of the stored vectors.
+        _rows (dict[str, int]): The row of the latest vector of every ID.
+        _ids (list[str]): The ID of every row.
+
+    Methods:
+        put(release_group_id, embedding): Appends the embedding of the release group unless it is already stored.
+        get(release_group_id): Returns a read-only view of the embedding of the release group or None.
+        get_digest(release_group_id): Returns the SHA-256 of the embedding of the release group or None.
+        ids(): Returns the ID of every row.
+        vectors(): Returns a read-only memory map of all rows.
+        flush(): Flushes the files to disk.
+        close(): Flushes and closes the files.
+    """
+    def __init__(self, file_path: str, dim: int = 512, dtype: str = "float32"):
+        """
+        Initializes an EmbeddingStore object, truncates an incomplete record and indexes the stored IDs.
+
+        Args:
+            file_path (str): The path to the store without the extension, e.g. "data/db.embeddings".
+            dim (int): The number of dimensions of the embeddings.
+            dtype (str): "float32" or "float16".
+
+        Raises:
+            ValueError: If the data type is not "float32" or "float16".
+        """
+        if dtype not in DTYPE_SUFFIXES:
+            raise ValueError(f"Data type \"{dtype}\" must be one of {', '.join(DTYPE_SUFFIXES)}")
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self._vectors_file_path = f"{file_path}.{DTYPE_SUFFIXES[dtype]}"
+        self._ids_file_path = f"{file_path}.ids"
+        self._dim = dim
+        self._dtype = np.dtype(dtype)
+        self._row_size = dim * self._dtype.itemsize
+        self._lock = threading.Lock()
+        self._ids = _load_ids(self._ids_file_path)
+        vectors_length = os.path.getsize(self._vectors_file_path) if os.path.exists(self._vectors_file_path) else 0
+        row_count = min(len(self._ids), vectors_length // self._row_size)
+        self._ids = self._ids[:row_count]
+        _truncate(self._vectors_file_path, row_count * self._row_size)
+        _truncate(self._ids_file_path, sum(len(id.encode("utf-8")) + 1 for id in self._ids))
+        self._rows = {id: row for row, id in enumerate(self._ids)}
+        self._vectors_file = open(self._vectors_file_path, "ab", buffering=0)
+        self._ids_file = open(self._ids_file_path, "ab", buffering=0)
+        self._memmap = None
+
+    def put(self, release_group_id: str, embedding: np.ndarray) -> None:
+        """
+        Appends the embedding of the release group unless the latest stored embedding of the release group is equal to it,
+        so rerunning the same model does not grow the store.
+
+        Args:
+            release_group_id (str): The ID of the release group.
+            embedding (np.ndarray): The embedding.
+
+        Raises:
+            ValueError: If the embedding does not have dim elements or the ID contains a line break.
+        """
+        vector = np.asarray(embedding, dtype=self._dtype).ravel()
+        if vector.shape[0] != self._dim:
+            raise ValueError(f"Embedding must have {self._dim} dimensions, got {vector.shape[0]}")
+        if "\n" in release_group_id:
+            raise ValueError(f"Release group ID \"{release_group_id}\" must not contain line breaks")
+        with self._lock:
+            row = self._rows.get(release_group_id)
+            if row is not None and np.array_equal(self._get_memmap()[row], vector):
+                return
+            self._vectors_file.write(vector.tobytes())
+            self._ids_file.write(f"{release_group_id}\n".encode("utf-8"))
+            self._rows[release_group_id] = len(self._ids)
+            self._ids.append(release_group_id)
+
+    def _get_memmap(self) -> np.ndarray:
+        if self._memmap is None or self._memmap.shape[0] != len(self._ids):
+            if not self._ids:
+                return np.empty((0, self._dim), dtype=self._dtype)
+            self._memmap = np.memmap(self._vectors_file_path, dtype=self._dtype, mode="r", shape=(len(self._ids), self._dim))
+        return self._memmap
+
+    def get(self, release_group_id: str) -> np.ndarray | None:
+        """
+        Returns a read-only view of the latest embedding of the release group or None.
+
+        Args:
+            release_group_id (str): The ID of the release group.
+
+        Returns:
+            np.ndarray | None: The embedding or None if the release group is not stored.
+        """
+        with self._lock:
+            row = self._rows.get(release_group_id)
+            if row is None:
+                return None
+            return self._get_memmap()[row]
+
+    def get_digest(self, release_group_id: str) -> str | None:
+        """
+        Returns the SHA-256 of the latest embedding of the release group or None,
+        e.g. to find out whether the embedding has changed since it was uploaded, also across merged stores.
+
+        Args:
+            release_group_id (str): The ID of the release group.
+
+        Returns:
+            str | None: The hex SHA-256 of the stored bytes of the embedding or None if the release group is not stored.
+        """
+        with self._lock:
+            row = self._rows.get(release_group_id)
+            if row is None:
+                return None
+            return hashlib.sha256(self._get_memmap()[row].tobytes()).hexdigest()
+
+    def ids(self) -> list[str]:
+        """
+        Returns the ID of every row, including rows superseded by a later vector of the same ID.
+
+        Returns:
+            list[str]: The IDs in row order.
+        """
+        with self._lock:
+            return list(self._ids)
+
+    def vectors(self) -> np.ndarray:
+        """
+        Returns a read-only memory map of all rows without copying them.
+
+        Returns:
+            np.ndarray: The vectors with shape (rows, dim).
+        """
+        with self._lock:
+            return self._get_memmap()
+
+    def __contains__(self, release_group_id: str) -> bool:
+        with self._lock:
+            return release_group_id in self._rows
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def flush(self) -> None:
+        """
+        Flushes the files to disk.
+        """
+        with self._lock:
+            os.fsync(self._vectors_file.fileno())
+            os.fsync(self._ids_file.fileno())
+
+    def close(self) -> None:
+        """
+        Flushes and closes the files.
+        """
+        with self._lock:
+            if self._vectors_file.closed:
+                return
+            os.fsync(self._vectors_file.fileno())
+            os.fsync(self._ids_file.fileno())
+            self._vectors_file.close()
+            self._ids_file.close()
+            self._memmap = None
+
+
+def delete_embedding_store(file_path: str) -> None:
+    """
+    Deletes the ID file and the vector files of the store if they exist.
+
+    Args:
+        file_path (str): The path to the store without the extension, e.g. "data/db.embeddings".
+    """
+    for suffix in ["ids", *DTYPE_SUFFIXES.values()]:
+        if os.path.exists(f"{file_path}.{suffix}"):
+            os.remove(f"{file_path}.{suffix}")
@@ -1,93 +1,970 @@
 import os
 import sys
-from PIL import Image
-from requests import Session
+import glob
+import shutil
+import argparse
+import time
+import threading
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+import numpy as np
+from PIL import UnidentifiedImageError
+from requests import HTTPError, Session
 from dotenv import load_dotenv
-from supabase import create_client
-from sentence_transformers import SentenceTransformer
-from utils.utils import load_lines, save_cover
-from managers.csv_manager import CSVManager
-from managers.offset_manager import OffsetManager
+from utils.utils import load_lines, RATE_LIMITER
+from utils.services import ServiceRegistry
+from utils.metrics import METRICS, PROFILER, MetricsExporter, measure_stage
+from utils.http_archive import HTTPArchive, ReplayPolicy, mount_archive
+from utils.stand_in_server import StandInServer
+from utils.cover_processor import CoverProcessor
+from utils.cover_index import CoverIndex, perceptual_hash, image_digest
+from managers.csv_manager import CSVManager, merge_csv_files, delete_csv_file
+from managers.dataset_manager import DatasetManager
+from managers.journal_manager import JournalManager
+from managers.lease_manager import LeaseManager
+from managers.refresh_manager import RefreshManager
+from managers.supabase_sink import SupabaseSink
+from managers.storage_manager import StorageManager
 from musicbrainz.musicbrainz_api import MusicBrainzAPI
+from musicbrainz.response_cache import ResponseCache
 from musicbrainz.extended_release_group import ExtendedReleaseGroup
+from musicbrainz.release_group_filter import ReleaseGroupFilter
+from musicbrainz.artist_resolver import ArtistResolver
+from embeddings.batch_embedder import BatchEmbedder
+from embeddings.embedding_cache import EmbeddingCache
+from embeddings.embedding_store import EmbeddingStore, format_pgvector, delete_embedding_store
+from pipeline.pipeline import Pipeline, Stage
+from pipeline.progress_tracker import ProgressTracker
+
+if TYPE_CHECKING:
+    from supabase import Client
+    from sentence_transformers import SentenceTransformer
 
 
 ARTISTS_FILE_PATH = "data/artists.txt"
 CSV_FILE_PATH = "data/db.csv"
 COVER_ART_DIR_PATH = "data/covers"
+EMBEDDING_CACHE_DIR_PATH = "data/embedding_cache"
+STORAGE_MANIFEST_FILE_PATH = "data/storage_manifest.json"
+JOURNAL_FILE_PATH = ".journal.sqlite3"
+LEASE_FILE_PATH = "data/leases.sqlite3"
+RATE_LIMIT_FILE_PATH = "data/rate_limits.sqlite3"
+REFRESH_FILE_PATH = "data/refresh.sqlite3"
+RESPONSE_CACHE_FILE_PATH = "data/cache/responses.sqlite3"
+COVER_CACHE_FILE_PATH = "data/cache/covers.sqlite3"
+ARTIST_CACHE_FILE_PATH = "data/cache/artists.sqlite3"
+COVER_INDEX_FILE_PATH = "data/cover_index.sqlite3"
+DATASET_DIR_PATH = "data/datasets"
+
+RESPONSE_CACHE_TTL = 12 * 60 * 60
+RESPONSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+COVER_CACHE_MAX_BYTES = 4 * 1024 * 1024 * 1024
+ARTIST_CACHE_TTL = 30 * 24 * 60 * 60
+ARTIST_SEARCH_BATCH_SIZE = 25
 
 MODEL_NAME = "clip-ViT-B-32"
+EMBED_BATCH_SIZE = 32
+EMBED_FLUSH_TIMEOUT = 0.5
+TORCH_THREADS = 0
+EMBEDDING_DIM = 512
+EMBEDDING_CACHE_CAPACITY = 100_000
+EMBEDDING_STORE_FILE_PATH = "data/db.embeddings"
+EMBEDDING_STORE_DTYPE = "float32"
+EMBEDDING_PRECISION = 6
+
+RELEASE_FILTER = {
+    "primary_types": ["album"],
+    "secondary_types": [],
+    "max_artist_credits": 1,
+    "released_by": "2023-12-31",
+    "genres": {"rock": ["rock"], "pop": ["pop"], "r&b": ["r&b"], "hip-hop": ["hip hop"]},
+    "min_genre_votes": 1,
+}
+
+CSV_BATCH_SIZE = 100
+CSV_FLUSH_INTERVAL = 5.0
+SUPABASE_BATCH_SIZE = 100
+SUPABASE_FLUSH_INTERVAL = 5.0
+STORAGE_UPLOAD_WORKERS = 8
+COVER_RESOLUTION = (1024, 1024)
+COVER_PROCESS_WORKERS = None
+COVER_DUPLICATE_DISTANCE = 4
+COVER_DUPLICATE_MIN_BITS = 8
+COVER_DUPLICATE_SIMILARITY = 0.95
+
+PIPELINE_MODE = True
+PIPELINE_QUEUE_SIZE = 32
+PIPELINE_PREFETCH = 1
+PIPELINE_WORKERS = {"fetch": 1, "cover": 4, "embed": EMBED_BATCH_SIZE, "sink": 1}
+CHECKPOINT_INTERVAL = 50
+
+LEASE_DURATION = 600
+LEASE_BATCH_SIZE = 1
+
+REPLAY_LATENCY = None
+REPLAY_ERROR_RATE = 0.0
+REPLAY_SEED = 0
+REPLAY_SUPABASE_KEY = "replay.replay.replay"
+
+METRICS_INTERVAL = 15.0
+METRICS_TEXTFILE_PATH = "data/metrics.prom"
+METRICS_JSONL_PATH = "data/metrics.jsonl"
+PROFILE_STAGES = []
+PROFILE_BACKEND = "cprofile"
+PROFILE_DIR_PATH = "data/profiles"
+
+COMMANDS = ["fetch", "embed", "upload", "all"]
+DATASETS = {"release_groups": "id", "listings": "artist", "uploads": "release_group_id"}
+DATASET_TIME_FIELDS = {"listings": "fetched_at", "uploads": "uploaded_at"}
+
+
+def fetch_listing(mb: MusicBrainzAPI, release_filter: ReleaseGroupFilter, release_groups: DatasetManager, artist: str,
+                  artist_id: str) -> dict:
+    """
+    Fetches the release groups of the artist, saves them to the release group dataset and keeps the ones that pass the filter.
+
+    Args:
+        mb (MusicBrainzAPI): The MusicBrainz API client.
+        release_filter (ReleaseGroupFilter): The filter compiled from RELEASE_FILTER.
+        release_groups (DatasetManager): The dataset of all fetched release groups.
+        artist (str): The name of the artist.
+        artist_id (str): The MusicBrainz ID of the artist.
+
+    Returns:
+        dict: The listing of the artist with "artist", "artist_id", "fetched_at" and "releases" keys.
+            "releases" has the releases that pass the filters,
+            each with "release_group_id", "fingerprint", "release_data" and "cover_path" keys.
+    """
+    fetched_release_groups = list(mb.fetch_release_groups(artist_id, "album"))
+    release_groups.put_many(release_group.to_dict() for release_group in fetched_release_groups)
+    releases = []
+    for release_group, release_genre in release_filter.select(fetched_release_groups):
+        release_group = ExtendedReleaseGroup(release_group)
+        releases.append({
+            "release_group_id": release_group.get_id(),
+            "fingerprint": release_group.get_fingerprint(),
+            "release_data": release_group.get_data(release_genre),
+            "cover_path": release_group.get_cover_path(COVER_ART_DIR_PATH),
+        })
+    return {
+        "artist": artist, "artist_id": artist_id, "fetched_at": time.time(), "releases": releases,
+    }
+
+
+def select_releases(refresh: RefreshManager, listing: dict) -> list[dict]:
+    """
+    Stages the fingerprints of the releases of the listing in the refresh manager and returns copies of the releases to process.
+
+    In the incremental mode, release groups that have not changed since they were last processed are skipped.
+    Only the release groups that pass the filter are staged, so a release group rejected by the filter is still processed
+    once a changed RELEASE_FILTER selects it.
+
+    Args:
+        refresh (RefreshManager): The manager of the release groups processed by previous runs.
+        listing (dict): The listing returned by fetch_listing.
+
+    Returns:
+        list[dict]: The releases to process, each with "release_group_id", "fingerprint", "release_data" and "cover_path" keys.
+    """
+    artist = listing["artist"]
+    releases = [
+        {**release, "release_data": dict(release["release_data"])} for release in listing["releases"]
+        if not refresh.is_unchanged(artist, release["release_group_id"], release["fingerprint"])
+    ]
+    refresh.stage(artist, {release["release_group_id"]: release["fingerprint"] for release in listing["releases"]})
+    return releases
+
+
+def download_cover(mb: MusicBrainzAPI, processor: CoverProcessor, storage: StorageManager | None, covers: CoverIndex | None,
+                   journal: JournalManager, release: dict) -> dict:
+    """
+    Downloads and decodes the cover art of the release and starts saving it to disk and uploading it to the bucket.
+
+    A cover saved by a previous run is loaded from disk instead of being downloaded again.
+    The decoded image is stored under the "cover" key for embedding.
+    The upload runs in the background while the cover is encoded. Its future public URL is stored under the "src_future" key.
+    If there is no storage manager, the cover is not uploaded and there is no "src_future" key.
+    If the cover has the same pixels as an earlier cover of the artist, it is not uploaded,
+    the ID of the other release is stored under the "duplicate_of" key and the public URL of its cover under the "src" key.
+    If it only has a similar perceptual hash, the other release is stored under the "duplicate_candidate" key
+    and the upload waits for confirm_duplicate.
+    If the release group has no usable front cover art, e.g. the Cover Art Archive has no image of it or returns 404,
+    the release is journaled as skipped and gets the "skipped" key, so the later stages pass it through without processing it.
+
+    Args:
+        mb (MusicBrainzAPI): The MusicBrainz API client.
+        processor (CoverProcessor): The processor that decodes and saves the cover art.
+        storage (StorageManager | None): The manager of the storage bucket or None to not upload the cover.
+        covers (CoverIndex | None): The index of the covers used to find near-duplicates or None to upload every cover.
+        journal (JournalManager): The journal of completed stages.
+        release (dict): The release returned by select_releases.
+
+    Returns:
+        dict: The same release.
+    """
+    release_group_id = release["release_group_id"]
+    cover_path = release["cover_path"]
+    if journal.is_stage_done(release_group_id, "cover") and os.path.exists(cover_path):
+        release["cover"], jpeg = processor.load(cover_path)
+    else:
+        try:
+            cover = mb.fetch_cover(release_group_id, size=max(COVER_RESOLUTION))
+            release["cover"], jpeg = processor.process(cover_path, cover)
+        except (ValueError, UnidentifiedImageError, HTTPError) as e:
+            if isinstance(e, HTTPError) and e.response.status_code != 404:
+                raise
+            print(f'Skipping {release["release_data"]["artist"]} - {release["release_data"]["title"]} without cover art: {e}')
+            METRICS.increment("covers_skipped_total")
+            journal.complete_stage(release_group_id, "skipped")
+            release["skipped"] = True
+            return release
+        journal.complete_stage(release_group_id, "cover")
+    storage_path = "/".join(cover_path.split("/")[-2:])
+    original = None
+    if covers is not None:
+        release["cover_hash"] = perceptual_hash(release["cover"])
+        release["cover_digest"] = image_digest(release["cover"])
+        original = covers.find_or_add(
+            release_group_id, release["release_data"]["artist"], release["cover_hash"], release["cover_digest"], storage_path,
+        )
+    if original and original["confirmed"]:
+        print(f'Found the same cover as {original["release_group_id"]} for {release_group_id}')
+        METRICS.increment("cover_duplicates_total")
+        release["duplicate_of"] = original["release_group_id"]
+        if storage:
+            release["src"] = storage.get_public_url(original["storage_path"])
+    elif original:
+        release["duplicate_candidate"] = original
+        if storage:
+            release["jpeg"] = jpeg
+    elif storage:
+        release["src_future"] = storage.submit(cover_path, storage_path, jpeg)
+    return release
+
+
+def confirm_duplicate(storage: StorageManager | None, covers: CoverIndex | None, store: EmbeddingStore, release: dict) -> dict:
+    """
+    Confirms or rejects the candidate duplicate found by download_cover by the cosine similarity of the embeddings of the covers
+    and records the decision in the cover index.
+
+    A confirmed duplicate gets the "duplicate_of" key and the "src" key with the public URL of the cover of the original.
+    A rejected one is an original, and its cover upload is started.
+    A candidate whose original has no stored embedding yet is rejected.
+
+    Args:
+        storage (StorageManager | None): The manager of the storage bucket or None to not upload the cover.
+        covers (CoverIndex | None): The index of the covers.
+        store (EmbeddingStore): The store of the embeddings of all releases.
+        release (dict): The release with a stored embedding.
+
+    Returns:
+        dict: The same release.
+    """
+    original = release.pop("duplicate_candidate", None)
+    if original is None:
+        return release
+    release_group_id = release["release_group_id"]
+    storage_path = "/".join(release["cover_path"].split("/")[-2:])
+    embedding = store.get(release_group_id)
+    original_embedding = store.get(original["release_group_id"])
+    similarity = None
+    if original_embedding is not None:
+        similarity = float(np.dot(embedding, original_embedding) / (
+            np.linalg.norm(embedding) * np.linalg.norm(original_embedding) or 1.0
+        ))
+    if similarity is not None and similarity >= COVER_DUPLICATE_SIMILARITY:
+        print(f'Found a near-duplicate of the cover of {original["release_group_id"]} for {release_group_id}')
+        METRICS.increment("cover_duplicates_total")
+        covers.add(release_group_id, release["release_data"]["artist"], release["cover_hash"], release["cover_digest"], storage_path,
+                   original)
+        release["duplicate_of"] = original["release_group_id"]
+        if storage:
+            release["src"] = storage.get_public_url(original["storage_path"])
+        release.pop("jpeg", None)
+    else:
+        covers.add(release_group_id, release["release_data"]["artist"], release["cover_hash"], release["cover_digest"], storage_path)
+        if storage:
+            release["src_future"] = storage.submit(release["cover_path"], storage_path, release.pop("jpeg"))
+    return release
+
+
+def embed_cover(embedder: BatchEmbedder, cache: EmbeddingCache, store: EmbeddingStore, journal: JournalManager,
+                release: dict) -> dict:
+    """
+    Encodes the cover art of the release and stores the embedding in the release data.
+
+    The stored embedding of the release whose cover has the same pixels or a cached embedding of the same pixels is reused,
+    otherwise the cover is encoded together with the covers of other threads in one batch.
+    The embedding is appended to the embedding store and formatted as a pgvector literal with EMBEDDING_PRECISION significant digits.
+
+    Args:
+        embedder (BatchEmbedder): The embedder used to encode the cover art.
+        cache (EmbeddingCache): The cache of cover embeddings.
+        store (EmbeddingStore): The store of the embeddings of all releases.
+        journal (JournalManager): The journal of completed stages.
+        release (dict): The release with a decoded cover.
+
+    Returns:
+        dict: The same release.
+    """
+    cover = release.pop("cover")
+    cover_emb = store.get(release["duplicate_of"]) if "duplicate_of" in release else None
+    if cover_emb is None:
+        cover_key = cache.hash_image(cover)
+        cover_emb = cache.get(cover_key)
+        if cover_emb is None:
+            cover_emb = embedder.encode(cover)
+            cache.put(cover_key, cover_emb)
+    store.put(release["release_group_id"], cover_emb)
+    release["embedding_digest"] = store.get_digest(release["release_group_id"])
+    release["release_data"]["embedding"] = format_pgvector(cover_emb, EMBEDDING_PRECISION)
+    journal.complete_stage(release["release_group_id"], "embed")
+    return release
+
+
+def load_embedding(store: EmbeddingStore, release: dict) -> dict:
+    """
+    Stores the embedding of the release saved by an earlier run of the embed command in the release data, without the model.
+
+    Args:
+        store (EmbeddingStore): The store of the embeddings of all releases.
+        release (dict): The release with a decoded cover and a stored embedding.
+
+    Returns:
+        dict: The same release.
+    """
+    release.pop("cover")
+    release["release_data"]["embedding"] = format_pgvector(store.get(release["release_group_id"]), EMBEDDING_PRECISION)
+    release["embedding_digest"] = store.get_digest(release["release_group_id"])
+    return release
+
+
+def upload_release(sink: SupabaseSink, cm: CSVManager, release: dict) -> None:
+    """
+    Waits for the cover art upload, passes the release data to the Supabase sink and saves it to the csv file.
+
+    The release data gets the "release_group_id", "src" and "duplicate_of" columns. A release whose cover duplicates the cover
+    of another release of the artist has the public URL of the other cover in "src" and the ID of the other release in "duplicate_of",
+    which is None for every other release.
+    Like the Supabase row, the csv row is identified by the "release_group_id" column: a changed row is appended with the time
+    it is saved at in the "updated_at" column and supersedes the earlier row of the release group, and an unchanged row is not saved again.
+
+    A release skipped by download_cover has no row.
+    The release is not journaled as completed until checkpoint is called.
+
+    Args:
+        sink (SupabaseSink): The sink of the Supabase table.
+        cm (CSVManager): The manager of the csv file.
+        release (dict): The release with an uploading or duplicate cover and an embedding.
+
+    Raises:
+        ValueError: If any key of the release data is not a column of the table.
+    """
+    if release.get("skipped"):
+        return
+    release_data = release["release_data"]
+    embedding = release_data.pop("embedding")
+    release_data["release_group_id"] = release["release_group_id"]
+    release_data["src"] = release.pop("src") if "duplicate_of" in release else release.pop("src_future").result()
+    release_data["duplicate_of"] = release.get("duplicate_of")
+    release_data["embedding"] = embedding
+
+    sink.add(release_data)
+
+    row = cm.find(release["release_group_id"]) or {}
+    row.pop("updated_at", None)
+    if row != {fieldname: "" if value is None else str(value) for fieldname, value in release_data.items()}:
+        cm.save({**release_data, "updated_at": time.time()})
+
+    print(f'Ending proccessing {release_data["artist"]} - {release_data["title"]}')
+
+
+def checkpoint(sink: SupabaseSink | None, cm: CSVManager | None, uploads: DatasetManager | None, journal: JournalManager,
+               releases: list[dict], stage: str = "sink") -> None:
+    """
+    Writes the buffered rows to the Supabase table and the csv file, saves the upload status of the releases
+    and journals the releases as completed.
+
+    Args:
+        sink (SupabaseSink | None): The sink of the Supabase table or None if no row has been uploaded.
+        cm (CSVManager | None): The manager of the csv file or None if no row has been saved.
+        uploads (DatasetManager | None): The dataset of the upload status of every release or None if no release has been uploaded.
+        journal (JournalManager): The journal of completed stages.
+        releases (list[dict]): The releases completed since the last checkpoint.
+        stage (str): The last stage of the command, journaled as completed for the releases.
+    """
+    if sink:
+        sink.flush()
+    if cm:
+        cm.flush()
+    if uploads is not None and stage == "sink":
+        uploaded_at = time.time()
+        uploads.put_many({
+            "release_group_id": release["release_group_id"],
+            "fingerprint": release["fingerprint"],
+            "embedding_digest": release["embedding_digest"],
+            "src": release["release_data"].get("src"),
+            "duplicate_of": release.get("duplicate_of"),
+            "uploaded_at": uploaded_at,
+        } for release in releases if not release.get("skipped"))
+        uploads.flush()
+    journal.complete_stage([release["release_group_id"] for release in releases], stage)
+    METRICS.increment("releases_done_total", len(releases))
+
+
+def get_last_stage(command: str) -> str:
+    """
+    Returns the last stage of the command, after which a release is completed.
+
+    Args:
+        command (str): "fetch", "embed", "upload" or "all".
+
+    Returns:
+        str: "fetch", "embed" or "sink".
+    """
+    return {"fetch": "fetch", "embed": "embed"}.get(command, "sink")
+
+
+def fetch_command_releases(services: ServiceRegistry, journal: JournalManager, refresh: RefreshManager, command: str,
+                           artist: str) -> list[dict]:
+    """
+    Returns the releases of the artist that the command still has to process.
+
+    The fetch and all commands resolve the MusicBrainz ID of the artist, fetch its listing and save it to the listing dataset.
+    The embed and upload commands read the listing saved by an earlier run instead and only fetch it if there is none,
+    so they can run on their own schedule without crawling MusicBrainz again.
+    The fetch command only reports the number of releases. The upload command skips releases without a stored embedding
+    and releases that have been uploaded with the same fingerprint and embedding.
+    As soon as there are releases to upload, the Supabase client is warmed up in the background, so its startup overlaps with the cover downloads.
+    The model is only loaded once the embedder gets its first cover, on the first embedding cache miss.
+
+    Args:
+        services (ServiceRegistry): The registry of the clients, managers, datasets and the model, created on first use.
+        journal (JournalManager): The journal of completed stages.
+        refresh (RefreshManager): The manager of the release groups processed by previous runs.
+        command (str): "fetch", "embed", "upload" or "all".
+        artist (str): The name of the artist.
+
+    Returns:
+        list[dict]: The releases returned by select_releases that the command processes.
+    """
+    listings = services.get("listings")
+    listing = listings.get(artist) if command in ("embed", "upload") else None
+    if listing is None:
+        artist_id = services.get("artist_resolver").resolve(artist)
+        listing = fetch_listing(services.get("mb"), services.get("release_filter"), services.get("release_groups"), artist, artist_id)
+        listings.put(listing)
+    if command == "fetch":
+        print(f"Found {len(listing['releases'])} releases of {artist}")
+        return []
+
+    stage = get_last_stage(command)
+    releases = [
+        release for release in select_releases(refresh, listing) if not journal.is_stage_done(release["release_group_id"], stage)
+    ]
+    if command == "upload":
+        store = services.get("store")
+        uploads = services.get("uploads")
+        embedded_releases = [release for release in releases if release["release_group_id"] in store]
+        if len(embedded_releases) < len(releases):
+            print(f"Skipping {len(releases) - len(embedded_releases)} releases of {artist} without a stored embedding")
+        releases = []
+        for release in embedded_releases:
+            upload = uploads.get(release["release_group_id"])
+            if (upload and upload["fingerprint"] == release["fingerprint"]
+                    and upload["embedding_digest"] == store.get_digest(release["release_group_id"])):
+                continue
+            releases.append(release)
+        if len(releases) < len(embedded_releases):
+            print(f"Skipping {len(embedded_releases) - len(releases)} releases of {artist} that are already uploaded")
+    if releases and command in ("upload", "all"):
+        services.warm_up("storage", "sink")
+    return releases
+
 
-GENRE_LIST = ["rock", "pop", "r&b", "hip hop"]
+def get_release_stages(services: ServiceRegistry, journal: JournalManager, command: str) -> list[tuple[str, Callable[[dict], dict]]]:
+    """
+    Returns the stages that process every fetched release for the command, without the upload to Supabase.
+    The stages after "cover" pass the releases skipped by download_cover through.
+
+    Args:
+        services (ServiceRegistry): The registry of the clients, managers and the model, created on first use.
+        journal (JournalManager): The journal of completed stages.
+        command (str): "fetch", "embed", "upload" or "all".
+
+    Returns:
+        list[tuple[str, Callable[[dict], dict]]]: The name and the function of every stage in processing order.
+    """
+    if command == "fetch":
+        return []
+    uploads = command in ("upload", "all")
+    stages = [("cover", lambda release: download_cover(
+        services.get("mb"), services.get("processor"), services.get("storage") if uploads else None, services.get("covers"),
+        journal, release,
+    ))]
+    if command == "upload":
+        stages.append(("load", lambda release: release if release.get("skipped") else confirm_duplicate(
+            services.get("storage"), services.get("covers"), services.get("store"), load_embedding(services.get("store"), release),
+        )))
+    else:
+        stages.append(("embed", lambda release: release if release.get("skipped") else confirm_duplicate(
+            services.get("storage") if uploads else None, services.get("covers"), services.get("store"),
+            embed_cover(services.get("embedder"), services.get("cache"), services.get("store"), journal, release),
+        )))
+    return stages
+
+
+def complete_artist(journal: JournalManager, refresh: RefreshManager, artists: list[str], artist_index: int,
+                    on_artist_done: Callable[[int], None] | None, commit: bool = True) -> None:
+    """
+    Journals the artist as completed, commits its release group listing and notifies the caller.
+
+    Args:
+        journal (JournalManager): The journal of completed stages.
+        refresh (RefreshManager): The manager of the release groups processed by previous runs.
+        artists (list[str]): The names of the artists.
+        artist_index (int): The index of the completed artist.
+        on_artist_done (Callable[[int], None] | None): Called with the index of the completed artist.
+        commit (bool): Whether the release group listing is committed. It is discarded by commands that do not upload.
+    """
+    journal.complete_artist(artists[artist_index])
+    if commit:
+        refresh.commit(artists[artist_index])
+    else:
+        refresh.discard(artists[artist_index])
+    METRICS.increment("artists_done_total")
+    if on_artist_done:
+        on_artist_done(artist_index)
+
+
+def claim_artists(leases: LeaseManager) -> Iterator[int]:
+    """
+    Claims artists through leases until there are no unfinished artists left to claim.
+
+    Args:
+        leases (LeaseManager): The manager of the artist leases.
+
+    Returns:
+        Iterator[int]: The indexes of the claimed artists.
+    """
+    while True:
+        artist_indexes = leases.claim(LEASE_BATCH_SIZE)
+        if not artist_indexes:
+            return
+        yield from artist_indexes
+
+
+def get_worker_path(path: str, worker_id: str) -> str:
+    """
+    Returns the path of a file or directory that belongs to the worker.
+
+    Args:
+        path (str): The path used by a single process run.
+        worker_id (str): The ID of the worker.
+
+    Returns:
+        str: The path with the worker ID inserted before the extension, e.g. "data/db.csv" -> "data/db.worker-1.csv".
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}.{worker_id}{extension}"
+
+
+def merge_worker_outputs() -> None:
+    """
+    Merges the csv files, embedding stores and datasets of all workers into CSV_FILE_PATH, EMBEDDING_STORE_FILE_PATH and DATASET_DIR_PATH
+    and deletes them and the lease database, so the next sharded run starts over and they are not merged again.
+
+    Of the rows with the same "release_group_id", the one saved last according to its "updated_at" column is kept,
+    and of the listings and uploads with the same key, the one fetched or uploaded last.
+    """
+    root, extension = os.path.splitext(CSV_FILE_PATH)
+    worker_csv_file_paths = glob.glob(f"{glob.escape(root)}.*{extension}")
+    rows_count = merge_csv_files(CSV_FILE_PATH, worker_csv_file_paths, "release_group_id")
+    print(f"Merged {len(worker_csv_file_paths)} worker csv files into {CSV_FILE_PATH} with {rows_count} rows")
+
+    root, extension = os.path.splitext(EMBEDDING_STORE_FILE_PATH)
+    worker_store_file_paths = [
+        file_path.removesuffix(".ids") for file_path in sorted(glob.glob(f"{glob.escape(root)}.*{extension}.ids"))
+    ]
+    store = EmbeddingStore(EMBEDDING_STORE_FILE_PATH, EMBEDDING_DIM, EMBEDDING_STORE_DTYPE)
+    for worker_store_file_path in worker_store_file_paths:
+        worker_store = EmbeddingStore(worker_store_file_path, EMBEDDING_DIM, EMBEDDING_STORE_DTYPE)
+        vectors = worker_store.vectors()
+        for row, release_group_id in enumerate(worker_store.ids()):
+            store.put(release_group_id, vectors[row])
+        worker_store.close()
+    print(f"Merged {len(worker_store_file_paths)} worker embedding stores into {EMBEDDING_STORE_FILE_PATH} with {len(store)} embeddings")
+    store.close()
+
+    worker_dataset_dir_paths = sorted(glob.glob(f"{glob.escape(DATASET_DIR_PATH)}.*"))
+    for name, key_field in DATASETS.items():
+        time_field = DATASET_TIME_FIELDS.get(name)
+        dataset = DatasetManager(os.path.join(DATASET_DIR_PATH, f"{name}.jsonl"), key_field)
+        for worker_dataset_dir_path in worker_dataset_dir_paths:
+            worker_dataset = DatasetManager(os.path.join(worker_dataset_dir_path, f"{name}.jsonl"), key_field)
+            dataset.put_many(
+                record for record in worker_dataset
+                if time_field is None or record[time_field] >= (dataset.get(record[key_field]) or {}).get(time_field, 0)
+            )
+            worker_dataset.close()
+        dataset.compact()
+        print(f"Merged {len(worker_dataset_dir_paths)} worker {name} datasets into {DATASET_DIR_PATH} with {len(dataset)} records")
+        dataset.close()
+
+    for worker_csv_file_path in worker_csv_file_paths:
+        delete_csv_file(worker_csv_file_path)
+    for worker_store_file_path in worker_store_file_paths:
+        delete_embedding_store(worker_store_file_path)
+    for worker_dataset_dir_path in worker_dataset_dir_paths:
+        shutil.rmtree(worker_dataset_dir_path)
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(f"{LEASE_FILE_PATH}{suffix}"):
+            os.remove(f"{LEASE_FILE_PATH}{suffix}")
+
+
+def run_sequential(services: ServiceRegistry, journal: JournalManager, refresh: RefreshManager, command: str,
+                   artists: list[str], artist_indexes: Iterable[int], on_artist_done: Callable[[int], None] | None = None) -> None:
+    """
+    Processes the artists one release at a time.
+
+    Args:
+        services (ServiceRegistry): The registry of the clients, managers and the model, created on first use.
+        journal (JournalManager): The journal of completed stages.
+        refresh (RefreshManager): The manager of the release groups processed by previous runs.
+        command (str): "fetch", "embed", "upload" or "all".
+        artists (list[str]): The names of the artists.
+        artist_indexes (Iterable[int]): The indexes of the artists to process.
+        on_artist_done (Callable[[int], None] | None): Called with the index of every completed artist.
+    """
+    uploads = command in ("upload", "all")
+    stages = get_release_stages(services, journal, command)
+    for i in artist_indexes:
+        if journal.is_artist_done(artists[i]):
+            complete_artist(journal, refresh, artists, i, on_artist_done, uploads)
+            continue
+        print(f"{i+1}/{len(artists)} Processing artist: {artists[i]}")
+
+        with measure_stage("fetch"):
+            releases = fetch_command_releases(services, journal, refresh, command, artists[i])
+        for release in releases:
+            for stage_name, process in stages:
+                with measure_stage(stage_name):
+                    process(release)
+            if uploads:
+                with measure_stage("sink"):
+                    upload_release(services.get("sink"), services.get("cm"), release)
+
+        checkpoint(services.peek("sink"), services.peek("cm"), services.get("uploads") if uploads else None, journal, releases,
+                   get_last_stage(command))
+        complete_artist(journal, refresh, artists, i, on_artist_done, uploads)
+
+
+def run_pipeline(services: ServiceRegistry, journal: JournalManager, refresh: RefreshManager, command: str,
+                 artists: list[str], artist_indexes: Iterable[int], on_artist_done: Callable[[int], None] | None = None) -> None:
+    """
+    Processes the artists with a separate worker pool for fetching, cover download, embedding and uploading.
+
+    The stages are connected by bounded queues of PIPELINE_QUEUE_SIZE items and run with PIPELINE_WORKERS workers each.
+    The next artist index is only taken from artist_indexes when fewer than PIPELINE_PREFETCH artists wait for the fetch stage,
+    so a worker of a sharded run only claims the artists it is processing, whose leases are renewed until they are done.
+    Completed releases are checkpointed every CHECKPOINT_INTERVAL releases.
+
+    Args:
+        services (ServiceRegistry): The registry of the clients, managers and the model, created on first use.
+        journal (JournalManager): The journal of completed stages.
+        refresh (RefreshManager): The manager of the release groups processed by previous runs.
+        command (str): "fetch", "embed", "upload" or "all".
+        artists (list[str]): The names of the artists.
+        artist_indexes (Iterable[int]): The indexes of the artists to process.
+        on_artist_done (Callable[[int], None] | None): Called with the index of every completed artist.
+    """
+    uploads = command in ("upload", "all")
+    tracker = ProgressTracker(lambda i: complete_artist(journal, refresh, artists, i, on_artist_done, uploads))
+    sink_lock = threading.Lock()
+    completed_releases = []
+
+    def flush() -> None:
+        checkpoint(services.peek("sink"), services.peek("cm"), services.get("uploads") if uploads else None, journal, completed_releases,
+                   get_last_stage(command))
+        tracker.complete_releases([release["artist_index"] for release in completed_releases])
+        completed_releases.clear()
+
+    def fetch(i: int) -> list[dict]:
+        if journal.is_artist_done(artists[i]):
+            tracker.add_artist(i, 0)
+            return []
+        print(f"{i+1}/{len(artists)} Processing artist: {artists[i]}")
+        releases = fetch_command_releases(services, journal, refresh, command, artists[i])
+        for release in releases:
+            release["artist_index"] = i
+        tracker.add_artist(i, len(releases))
+        return releases
+
+    def complete(release: dict) -> None:
+        with sink_lock:
+            if uploads:
+                upload_release(services.get("sink"), services.get("cm"), release)
+            completed_releases.append(release)
+            if len(completed_releases) >= CHECKPOINT_INTERVAL:
+                flush()
+
+    stages = [Stage("fetch", fetch, PIPELINE_WORKERS["fetch"], fan_out=True)]
+    for stage_name, process in get_release_stages(services, journal, command):
+        stages.append(Stage(stage_name, process, PIPELINE_WORKERS.get(stage_name, 1)))
+    if len(stages) > 1:
+        stages.append(Stage("sink" if uploads else "checkpoint", complete, PIPELINE_WORKERS["sink"]))
+    pipeline = Pipeline(stages, queue_size=PIPELINE_QUEUE_SIZE, prefetch=PIPELINE_PREFETCH)
+    pipeline.run(artist_indexes)
+    with sink_lock:
+        flush()
+
+
+def import_offset(journal: JournalManager, artists: list[str], file_path: str = ".offset") -> None:
+    """
+    Journals the artists completed according to an offset file left by an older version and deletes the file.
+
+    Args:
+        journal (JournalManager): The journal of completed stages.
+        artists (list[str]): The names of the artists.
+        file_path (str): The path to the offset file.
+    """
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, "r") as f:
+        offset = f.read().strip()
+    for artist in artists[:int(offset or 0)]:
+        journal.complete_artist(artist)
+    os.remove(file_path)
+
+
+def load_model() -> "SentenceTransformer":
+    """
+    Imports torch and loads the model used to encode the cover art.
+
+    Returns:
+        SentenceTransformer: The loaded model.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    if TORCH_THREADS:
+        torch.set_num_threads(TORCH_THREADS)
+    return SentenceTransformer(MODEL_NAME)
+
+
+def create_supabase_client(supabase_url: str, supabase_key: str) -> "Client":
+    """
+    Imports the Supabase client library and creates a client.
+
+    Args:
+        supabase_url (str): The URL of the Supabase project or of the stand-in server.
+        supabase_key (str): The key of the Supabase project.
+
+    Returns:
+        Client: The Supabase client.
+    """
+    from supabase import create_client
+    return create_client(supabase_url, supabase_key)
+
+
+def build_services(args: argparse.Namespace, session: Session, artists: list[str], create_client: Callable[[], "Client"],
+                   table: str, bucket: str, pipeline_mode: bool, public_url: str | None = None, cached: bool = True,
+                   model_loader: Callable[[], "SentenceTransformer"] = load_model) -> ServiceRegistry:
+    """
+    Registers the clients, managers and the model of a run, each created on first use.
+
+    The files of a worker of a sharded run are kept next to the shared ones with the worker ID inserted by get_worker_path.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments with the "worker_id" and "incremental" attributes.
+        session (Session): The session of the MusicBrainz and Cover Art Archive requests.
+        artists (list[str]): The names of the artists.
+        create_client (Callable[[], Client]): Creates the Supabase client.
+        table (str): The name of the Supabase table.
+        bucket (str): The name of the Supabase storage bucket.
+        pipeline_mode (bool): Whether the releases are processed by the pipeline, which decodes and embeds covers in parallel.
+        public_url (str | None): The URL of the Supabase project used in the public URLs of the covers.
+        cached (bool): Whether the MusicBrainz responses and the artist IDs are cached on disk. Disabled for record and replay runs.
+        model_loader (Callable[[], SentenceTransformer]): Loads the model used to encode the cover art.
+
+    Returns:
+        ServiceRegistry: The registry of the services.
+    """
+    def worker_path(path: str) -> str:
+        return get_worker_path(path, args.worker_id) if args.worker_id else path
+
+    services = ServiceRegistry()
+    services.register("response_cache", lambda: ResponseCache(
+        RESPONSE_CACHE_FILE_PATH, 0 if args.incremental else RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES,
+    ) if cached else None)
+    services.register("cover_cache", lambda: ResponseCache(
+        COVER_CACHE_FILE_PATH, None, COVER_CACHE_MAX_BYTES,
+    ) if cached else None)
+    services.register("mb", lambda: MusicBrainzAPI(session, services.get("response_cache"), services.get("cover_cache")))
+    services.register("artist_resolver", lambda: ArtistResolver(
+        ARTIST_CACHE_FILE_PATH if cached else ":memory:", services.get("mb"), artists, ARTIST_SEARCH_BATCH_SIZE, ARTIST_CACHE_TTL,
+    ))
+    services.register("release_filter", lambda: ReleaseGroupFilter(RELEASE_FILTER))
+    services.register("supabase", create_client, closer=lambda client: None)
+    services.register("storage", lambda: StorageManager(
+        services.get("supabase"), bucket, worker_path(STORAGE_MANIFEST_FILE_PATH), max_workers=STORAGE_UPLOAD_WORKERS,
+        public_url=public_url,
+    ))
+    services.register("sink", lambda: SupabaseSink(
+        services.get("supabase"), table, batch_size=SUPABASE_BATCH_SIZE, flush_interval=SUPABASE_FLUSH_INTERVAL,
+        on_conflict="release_group_id", update_existing=args.incremental,
+    ))
+    services.register("cm", lambda: CSVManager(
+        worker_path(CSV_FILE_PATH), key_fields=("release_group_id",), batch_size=CSV_BATCH_SIZE, flush_interval=CSV_FLUSH_INTERVAL,
+    ))
+    services.register("processor", lambda: CoverProcessor(
+        COVER_RESOLUTION, max_workers=COVER_PROCESS_WORKERS if pipeline_mode else 0,
+    ))
+    services.register("covers", lambda: CoverIndex(
+        worker_path(COVER_INDEX_FILE_PATH), COVER_DUPLICATE_DISTANCE, COVER_DUPLICATE_MIN_BITS,
+    ) if COVER_DUPLICATE_DISTANCE is not None else None)
+    services.register("model", model_loader, closer=lambda model: None)
+    services.register("embedder", lambda: BatchEmbedder(
+        lambda: services.get("model"), EMBED_BATCH_SIZE if pipeline_mode else 1, EMBED_FLUSH_TIMEOUT,
+    ))
+    services.register("cache", lambda: EmbeddingCache(
+        worker_path(EMBEDDING_CACHE_DIR_PATH), MODEL_NAME, EMBEDDING_DIM, EMBEDDING_CACHE_CAPACITY,
+    ), closer=lambda cache: cache.save())
+    services.register("store", lambda: EmbeddingStore(worker_path(EMBEDDING_STORE_FILE_PATH), EMBEDDING_DIM, EMBEDDING_STORE_DTYPE))
+    for name, key_field in DATASETS.items():
+        services.register(name, lambda name=name, key_field=key_field: DatasetManager(
+            os.path.join(worker_path(DATASET_DIR_PATH), f"{name}.jsonl"), key_field,
+        ))
+    return services
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line arguments.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Ingests release data from MusicBrainz into Supabase and a csv file.")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=COMMANDS,
+        default="all",
+        help="fetch: only fetch and filter the release groups, without the model or Supabase; "
+             "embed: also download the covers and store their embeddings, without Supabase; "
+             "upload: upload the covers and the releases with stored embeddings, without the model; "
+             "all: run every stage (default)",
+    )
+    parser.add_argument(
+        "--worker-id",
+        help="run as one of several workers that claim artists through leases in LEASE_FILE_PATH, "
+             "with their own csv file, journal, storage manifest and embedding cache",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only process release groups that are new or changed since they were last processed",
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="merge the csv files, embedding stores and datasets of all workers, delete the lease database and exit",
+    )
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument(
+        "--record",
+        metavar="ARCHIVE",
+        help="record every MusicBrainz, Cover Art Archive and Supabase request and response in the archive",
+    )
+    archive_group.add_argument(
+        "--replay",
+        metavar="ARCHIVE",
+        help="serve every request from the archive instead of the network, with REPLAY_LATENCY and REPLAY_ERROR_RATE",
+    )
+    return parser.parse_args()
 
 
 def main() -> None:
     try:
+        args = parse_args()
+        if args.merge:
+            merge_worker_outputs()
+            return
+
         load_dotenv()
         SUPABASE_URL = os.environ.get("SUPABASE_URL")
         SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
         SUPABASE_TABLE = os.environ.get("SUPABASE_TABLE")
         SUPABASE_BUCKET = os.environ.get("SUPABASE_BUCKET")
-        
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        model = SentenceTransformer(MODEL_NAME)
-        cm = CSVManager(CSV_FILE_PATH)
-        om = OffsetManager()
+
+        journal_file_path = JOURNAL_FILE_PATH
+        metrics_textfile_path = METRICS_TEXTFILE_PATH
+        metrics_jsonl_path = METRICS_JSONL_PATH
+        profile_dir_path = PROFILE_DIR_PATH
+        if args.worker_id:
+            journal_file_path = get_worker_path(JOURNAL_FILE_PATH, args.worker_id)
+            metrics_textfile_path = get_worker_path(METRICS_TEXTFILE_PATH, args.worker_id)
+            metrics_jsonl_path = get_worker_path(METRICS_JSONL_PATH, args.worker_id)
+            profile_dir_path = get_worker_path(PROFILE_DIR_PATH, args.worker_id)
+            RATE_LIMITER.share(RATE_LIMIT_FILE_PATH)
+
+        if args.command != "all":
+            journal_file_path = get_worker_path(journal_file_path, args.command)
+
+        session = Session()
+        supabase_url = SUPABASE_URL
+        supabase_key = SUPABASE_KEY
+        archive = None
+        server = None
+        if args.record or args.replay:
+            archive_mode = "record" if args.record else "replay"
+            archive = HTTPArchive(args.record or args.replay)
+            policy = ReplayPolicy(REPLAY_LATENCY, REPLAY_ERROR_RATE, seed=REPLAY_SEED)
+            mount_archive(session, archive, archive_mode, policy)
+            if args.command in ("upload", "all"):
+                server = StandInServer(archive, archive_mode, SUPABASE_URL, policy).start()
+                supabase_url = server.url
+                if args.replay and not supabase_key:
+                    supabase_key = REPLAY_SUPABASE_KEY
+
         artists = load_lines(ARTISTS_FILE_PATH)
-        
-        for i in range(om.offset,len(artists)):
-            print(f"{i+1}/{len(artists)} Processing artist: {artists[i]}")
-            
-            mb = MusicBrainzAPI(Session())
-            
-            artist_id = mb.fetch_artist_id(artists[i])
-            release_groups_ids = mb.fetch_release_groups_ids(artist_id)
-            
-            for release_group_id in release_groups_ids:
-                release_group = ExtendedReleaseGroup(mb.fetch_release_group(release_group_id))
-                if not release_group.is_album() or not release_group.is_solo() or not release_group.is_released("2023-12-31"):
-                    continue
-                
-                release_genre = release_group.get_genre(GENRE_LIST)
-                if not release_genre:
-                    continue
-                if release_genre == "hip hop":
-                    release_genre = "hip-hop"
-                release_data = release_group.get_data(release_genre)
-                
-                cover_path = release_group.get_cover_path(COVER_ART_DIR_PATH)
-                cover = mb.fetch_cover(release_group_id)
-                save_cover(cover_path, cover)
-                
-                db_cover_path = "/".join(cover_path.split("/")[-2:])
-                cover_in_storage = supabase.rpc("file_exists", {"bucket_id": SUPABASE_BUCKET, "file_path": db_cover_path}).execute().data
-                if not cover_in_storage:
-                    with open(cover_path, 'rb') as f:
-                        supabase.storage.from_(SUPABASE_BUCKET).upload(file=f,path=db_cover_path,file_options={"content-type":"image/jpeg"})
-                release_data["src"] = supabase.storage.from_(SUPABASE_BUCKET).get_public_url(db_cover_path)[:-1]
-                
-                cover_emb = model.encode(Image.open(cover_path))
-                cover_emb = "[" + ','.join(map(str, cover_emb)) + "]"
-                release_data["embedding"] = cover_emb
-                
-                table_col_names = supabase.rpc("get_column_names", {"tablename": SUPABASE_TABLE}).execute().data
-                for key in release_data.keys():
-                    if key not in table_col_names:
-                        raise ValueError(f"Column \"{key}\" does not exist in \"{SUPABASE_TABLE}\" table")
-                
-                row_in_table = supabase.from_(SUPABASE_TABLE).select("src").eq("src", release_data["src"]).execute().data
-                if not row_in_table:
-                    supabase.from_(SUPABASE_TABLE).insert(release_data).execute()
-                
-                if not cm.csv_data_exists(release_data):
-                    cm.save(release_data)
-                
-                print(f'Ending proccessing {release_data["artist"]} - {release_data["title"]}')
-            
-            om.offset += 1
-            om.save_to_file()
-      
-        om.delete_file()
+        services = build_services(
+            args, session, artists, lambda: create_supabase_client(supabase_url, supabase_key), SUPABASE_TABLE, SUPABASE_BUCKET,
+            PIPELINE_MODE, public_url=SUPABASE_URL, cached=archive is None,
+        )
+        journal = JournalManager(journal_file_path)
+        refresh = RefreshManager(REFRESH_FILE_PATH, skip_unchanged=args.incremental)
+        METRICS.set_gauge("artists_total", len(artists))
+        exporter = MetricsExporter(METRICS, METRICS_INTERVAL, metrics_textfile_path, metrics_jsonl_path)
+        if PROFILE_STAGES:
+            PROFILER.enable(PROFILE_STAGES, profile_dir_path, PROFILE_BACKEND)
+
+        leases = None
+        if args.worker_id:
+            leases = LeaseManager(LEASE_FILE_PATH, args.worker_id, LEASE_DURATION)
+            leases.add_artists(artists)
+            artist_indexes = claim_artists(leases)
+            on_artist_done = leases.complete
+        else:
+            import_offset(journal, artists)
+            artist_indexes = range(len(artists))
+            on_artist_done = None
+
+        run = run_pipeline if PIPELINE_MODE else run_sequential
+        try:
+            run(services, journal, refresh, args.command, artists, artist_indexes, on_artist_done)
+        finally:
+            services.close()
+            refresh.close()
+            if leases:
+                leases.close()
+            exporter.close()
+            PROFILER.close()
+            if server:
+                server.close()
+            if archive:
+                archive.close()
+
+        journal.delete_file()
         print("Done!")
     except KeyboardInterrupt:
         print("Exiting early...")
@@ -95,4 +972,4 @@ def main() -> None:
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,6 +1,11 @@
 import os
+import io
 import csv
+import time
+import hashlib
+import threading
 from utils.utils import create_file_if_not_exists
+from utils.metrics import METRICS
 
 def _validate_csv_file_path(file_path: str) -> None:
     if not file_path:
@@ -10,7 +15,7 @@ def _validate_csv_file_path(file_path: str) -> None:
 
 
 def _validate_csv_data(csv_data: dict) -> None:
-    if not csv_data or any(not key or not value for key, value in csv_data.items()):
+    if not csv_data or any(not key or (not value and value is not None) for key, value in csv_data.items()):
         raise ValueError(f"Every element of the csv_data must not be empty")
         
 
@@ -20,56 +25,320 @@ def _load_existing_fieldnames(file_path: str) -> list[str]:
         return next(reader, None)
 
 
-def _write_fieldnames(file_path: str, fieldnames: list[str]) -> None:
-    with open(file_path, "a", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-
-
 def _compare_fieldnames(fieldnames1: list[str], fieldnames2: list[str]) -> None:
     if set(fieldnames1) != set(fieldnames2):
         raise ValueError(f"Existing fieldnames in the csv file are different from the ones in the csv_data list")
 
 
-def _write_csv_data(file_path: str, csv_data: dict, fieldnames: list[str]) -> None:
-    with open(file_path, "a", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writerow(csv_data)
+def _format_row(cells: list) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(cells)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _load_checkpoint(file_path: str) -> int | None:
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "r") as f:
+        checkpoint = f.read().strip()
+        if checkpoint:
+            return int(checkpoint)
+        return None
+
+
+def _save_checkpoint(file_path: str, length: int) -> None:
+    tmp_file_path = f"{file_path}.tmp"
+    with open(tmp_file_path, "w") as f:
+        f.write(str(length))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file_path, file_path)
+
+
+def _recover_file(file_path: str, checkpoint_file_path: str) -> None:
+    checkpoint = _load_checkpoint(checkpoint_file_path)
+    if checkpoint is not None and os.path.getsize(file_path) > checkpoint:
+        print(f"Truncating incomplete batch in {file_path} to the last checkpoint")
+        with open(file_path, "r+b") as f:
+            f.truncate(checkpoint)
+
+
+def _format_cell(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _hash_row(cells: list) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for cell in cells:
+        h.update(_format_cell(cell).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.digest()
 
 
 class CSVManager:
-    def __init__(self, file_path: str):
+    """
+    Manages a csv file of release data with an in-memory index of its rows.
+
+    The file is scanned once on initialization. After that, duplicate checks are set lookups,
+    and rows found by their key fields are read from their byte offset.
+
+    Rows are buffered and appended to the open file in batches of batch_size rows or every flush_interval seconds.
+    Every batch is fsynced before its end offset is saved as a checkpoint,
+    and an incomplete batch left by a crash is truncated on the next initialization.
+
+    Attributes:
+        _file_path (str): The path to the csv file.
+        _checkpoint_file_path (str): The path to the file with the length of the csv file after the last complete batch.
+        _key_fields (tuple[str, ...]): The fieldnames that identify a row for keyed lookups.
+        _batch_size (int): The number of buffered rows that triggers a flush.
+        _flush_interval (float): The number of seconds since the last flush that triggers a flush.
+        _fieldnames (list[str] | None): The fieldnames of the csv file header or None if the file is empty.
+        _row_hashes (set[bytes]): The hashes of all rows.
+        _row_offsets (dict[tuple, int]): The byte offset of the last row with the given key.
+
+    Methods:
+        save(csv_data): Buffers the csv_data and flushes the buffer if the batch is complete.
+        flush(): Appends the buffered rows to the csv file and saves a checkpoint.
+        close(): Flushes the buffered rows and closes the csv file.
+        csv_data_exists(csv_data): Returns True if a row equal to the csv_data exists, False otherwise.
+        key_exists(*key): Returns True if a row with the given key exists, False otherwise.
+        find(*key): Returns the row with the given key or None.
+    """
+    def __init__(self, file_path: str, key_fields: tuple[str, ...] = ("artist", "title"),
+                 batch_size: int = 1, flush_interval: float = 5.0):
+        """
+        Initializes a CSVManager object, recovers the csv file to the last checkpoint and indexes its rows.
+
+        Args:
+            file_path (str): The path to the csv file.
+            key_fields (tuple[str, ...]): The fieldnames that identify a row for keyed lookups.
+            batch_size (int): The number of buffered rows that triggers a flush. 1 writes every row immediately.
+            flush_interval (float): The number of seconds since the last flush that triggers a flush.
+
+        Raises:
+            ValueError: If the batch size is less than 1.
+        """
         _validate_csv_file_path(file_path)
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
         self._file_path = create_file_if_not_exists(file_path)
+        self._checkpoint_file_path = f"{file_path}.checkpoint"
+        _recover_file(self._file_path, self._checkpoint_file_path)
+        self._key_fields = key_fields
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._fieldnames = _load_existing_fieldnames(self._file_path)
+        self._row_hashes = set()
+        self._row_offsets = {}
+        self._load_index()
+        self._file = open(self._file_path, "ab")
+        self._length = self._file.tell()
+        self._buffer = []
+        self._buffer_length = 0
+        self._flushed_at = time.monotonic()
+
+    def _load_index(self) -> None:
+        if not self._fieldnames:
+            return
+        with open(self._file_path, "rb") as f:
+            f.readline()
+            offset = f.tell()
+            for line in iter(f.readline, b""):
+                cells = next(csv.reader([line.decode("utf-8")]), None)
+                if cells:
+                    self._index_row(cells, offset)
+                offset = f.tell()
+
+    def _index_row(self, cells: list, offset: int) -> None:
+        self._row_hashes.add(_hash_row(cells))
+        row = dict(zip(self._fieldnames, cells))
+        if all(field in row for field in self._key_fields):
+            self._row_offsets[tuple(row[field] for field in self._key_fields)] = offset
+
+    def _ordered_cells(self, csv_data: dict) -> list:
+        _compare_fieldnames(self._fieldnames, list(csv_data.keys()))
+        return [csv_data[fieldname] for fieldname in self._fieldnames]
+
+    def _append_to_buffer(self, data: bytes) -> int:
+        offset = self._length + self._buffer_length
+        self._buffer.append(data)
+        self._buffer_length += len(data)
+        return offset
 
     def save(self, csv_data: dict) -> None:
+        """
+        Buffers the csv_data, writing the header first if the file is empty, and flushes the buffer if the batch is complete.
+
+        Args:
+            csv_data (dict): The row to append. A None value is saved as an empty cell.
+
+        Raises:
+            ValueError: If any other element of the csv_data is empty or its keys differ from the existing fieldnames.
+        """
         _validate_csv_data(csv_data)
-        fieldnames = list(csv_data.keys())
-        existing_fieldnames = _load_existing_fieldnames(self._file_path)     
-        original_file_length = os.path.getsize(self._file_path)
-        try:
-            if not existing_fieldnames:
-                _write_fieldnames(self._file_path, fieldnames)
-            else:
-                _compare_fieldnames(existing_fieldnames, fieldnames)
-            _write_csv_data(self._file_path, csv_data, fieldnames)
-        except KeyboardInterrupt as e:
-            with open(self._file_path, 'r+') as f:
-                f.truncate(original_file_length)
-            print(f"Saving csv_data to {self._file_path} has been cancelled.")
-            raise e
-        
+        with self._lock:
+            if not self._fieldnames:
+                self._fieldnames = list(csv_data.keys())
+                self._append_to_buffer(_format_row(self._fieldnames))
+            cells = self._ordered_cells(csv_data)
+            offset = self._append_to_buffer(_format_row(cells))
+            self._index_row([_format_cell(cell) for cell in cells], offset)
+            if len(self._buffer) >= self._batch_size or time.monotonic() - self._flushed_at >= self._flush_interval:
+                self._flush()
+
+    def flush(self) -> None:
+        """
+        Appends the buffered rows to the csv file with a single write, fsyncs it and saves a checkpoint.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        self._flushed_at = time.monotonic()
+        if not self._buffer:
+            return
+        with METRICS.timer("csv_flush_seconds"):
+            self._file.write(b"".join(self._buffer))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        METRICS.increment("csv_written_bytes_total", self._buffer_length)
+        self._length += self._buffer_length
+        self._buffer = []
+        self._buffer_length = 0
+        _save_checkpoint(self._checkpoint_file_path, self._length)
+
+    def close(self) -> None:
+        """
+        Flushes the buffered rows and closes the csv file.
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.close()
+
     def csv_data_exists(self, csv_data: dict) -> bool:
-        fieldnames = list(csv_data.keys())
-        cells = list(csv_data.values())
-        existing_fieldnames = _load_existing_fieldnames(self._file_path)
-        if not existing_fieldnames:
-            return False
-        _compare_fieldnames(existing_fieldnames, fieldnames)
-        with open(self._file_path, "r", newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            next(reader, None)
-            for row in reader:
-                if all(row[fieldname] == cell for fieldname, cell in zip(fieldnames, cells)):
-                    return True
-        return False
\ No newline at end of file
+        """
+        Returns True if a row equal to the csv_data exists, False otherwise.
+
+        Args:
+            csv_data (dict): The row to look for.
+
+        Returns:
+            bool: A boolean indicating whether the row exists.
+
+        Raises:
+            ValueError: If the keys of the csv_data differ from the existing fieldnames.
+        """
+        with self._lock:
+            if not self._fieldnames:
+                return False
+            return _hash_row(self._ordered_cells(csv_data)) in self._row_hashes
+
+    def key_exists(self, *key: str) -> bool:
+        """
+        Returns True if a row with the given key exists, False otherwise.
+
+        Args:
+            *key (str): The values of the key fields in order.
+
+        Returns:
+            bool: A boolean indicating whether a row with the key exists.
+        """
+        with self._lock:
+            return tuple(key) in self._row_offsets
+
+    def find(self, *key: str) -> dict | None:
+        """
+        Returns the row with the given key or None.
+
+        Args:
+            *key (str): The values of the key fields in order.
+
+        Returns:
+            dict | None: The last row with the key or None if there is no such row.
+        """
+        with self._lock:
+            offset = self._row_offsets.get(tuple(key))
+            if offset is None:
+                return None
+            if offset >= self._length:
+                self._flush()
+            with open(self._file_path, "rb") as f:
+                f.seek(offset)
+                line = f.readline().decode("utf-8")
+            return dict(zip(self._fieldnames, next(csv.reader([line]))))
+
+
+def merge_csv_files(file_path: str, input_file_paths: list[str], unique_field: str = "src", order_field: str = "updated_at") -> int:
+    """
+    Merges the rows of the csv files and of the existing file into the file in a deterministic order.
+
+    Rows are deduplicated by the unique field, keeping the row with the latest order field, e.g. the time it was saved at.
+    Of rows with the same order field, a row supersedes the earlier rows of the same file, and the rows of the input files,
+    in sorted order, supersede the rows of the existing file. A file without the order field, written by an older version,
+    is merged with an order field of 0.
+    The rows are sorted by all fields in header order, so the result does not depend on the order in which they were written.
+    The merged file replaces the file atomically.
+
+    Args:
+        file_path (str): The path to the merged csv file.
+        input_file_paths (list[str]): The paths to the csv files to merge.
+        unique_field (str): The fieldname that identifies a row.
+        order_field (str): The numeric fieldname by which the latest of the rows with the same unique field is kept.
+
+    Returns:
+        int: The number of rows in the merged file.
+
+    Raises:
+        ValueError: If the fieldnames of the files differ in other fields than the order field.
+    """
+    _validate_csv_file_path(file_path)
+    fieldnames = None
+    rows = {}
+    paths = [file_path] + [path for path in sorted(input_file_paths) if path != file_path]
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        _recover_file(path, f"{path}.checkpoint")
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if not header:
+                continue
+            header_fieldnames = header if order_field in header else header + [order_field]
+            if fieldnames is None:
+                fieldnames = header_fieldnames
+            _compare_fieldnames(fieldnames, header_fieldnames)
+            for cells in reader:
+                row = {order_field: "0", **dict(zip(header, cells))}
+                cells = tuple(row[fieldname] for fieldname in fieldnames)
+                key = row.get(unique_field, cells)
+                if key not in rows or float(row[order_field]) >= float(rows[key][0]):
+                    rows[key] = (row[order_field], cells)
+    if fieldnames is None:
+        return 0
+
+    tmp_file_path = f"{file_path}.tmp"
+    with open(tmp_file_path, "wb") as f:
+        f.write(_format_row(fieldnames))
+        for cells in sorted(cells for _, cells in rows.values()):
+            f.write(_format_row(list(cells)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file_path, file_path)
+    _save_checkpoint(f"{file_path}.checkpoint", os.path.getsize(file_path))
+    return len(rows)
+
+
+def delete_csv_file(file_path: str) -> None:
+    """
+    Deletes the csv file and its checkpoint file if they exist.
+
+    Args:
+        file_path (str): The path to the csv file.
+    """
+    for path in (file_path, f"{file_path}.checkpoint"):
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,204 @@
+import os
+import json
+import threading
+from typing import Iterable, Iterator
+
+
+def _index_lines(file_path: str, key_field: str) -> tuple[dict, int, int]:
+    offsets = {}
+    length = 0
+    count = 0
+    with open(file_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            offsets[json.loads(line)[key_field]] = length
+            length += len(line)
+            count += 1
+    return offsets, length, count
+
+
+class DatasetManager:
+    """
+    Manages an append-only JSON Lines dataset of records keyed by one of their fields,
+    so the stages of a run can write their results to disk and later runs of other stages can read them.
+
+    Records are appended and the latest record of a key replaces the earlier ones. A record equal to the latest record of its key
+    is not appended again. Only the offset of the latest record of every key is kept in memory, records are read from the file on access.
+    A line left incomplete by a crash is truncated on initialization, and the file is compacted to the latest records
+    if most of its records have been replaced.
+
+    Attributes:
+        _file_path (str): The path to the dataset file.
+        _key_field (str): The field that identifies a record.
+        _offsets (dict[str, int]): The offset of the latest record of every key.
+
+    Methods:
+        get(key): Returns the latest record of the key or None.
+        put(record): Appends the record.
+        put_many(records): Appends the records in one write.
+        keys(): Returns the keys of all records.
+        compact(): Rewrites the file with only the latest record of every key.
+        flush(): Writes the appended records to disk.
+        close(): Writes the appended records to disk and closes the file.
+    """
+    def __init__(self, file_path: str, key_field: str):
+        """
+        Initializes a DatasetManager object, creating the dataset file if it does not exist, indexes its records
+        and compacts it if most of them have been replaced.
+
+        Args:
+            file_path (str): The path to the dataset file.
+            key_field (str): The field that identifies a record.
+        """
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self._file_path = file_path
+        self._key_field = key_field
+        self._offsets = {}
+        length = 0
+        count = 0
+        if os.path.exists(file_path):
+            self._offsets, length, count = _index_lines(file_path, key_field)
+            if os.path.getsize(file_path) > length:
+                print(f"Truncating incomplete record in {file_path}")
+                with open(file_path, "r+b") as f:
+                    f.truncate(length)
+        self._length = length
+        self._file = open(file_path, "ab")
+        self._reader = open(file_path, "rb")
+        self._lock = threading.Lock()
+        if count > 2 * len(self._offsets):
+            self.compact()
+
+    def _read_line(self, offset: int) -> bytes:
+        self._file.flush()
+        self._reader.seek(offset)
+        return self._reader.readline()
+
+    def get(self, key: str) -> dict | None:
+        """
+        Returns the latest record of the key or None.
+
+        Args:
+            key (str): The key of the record.
+
+        Returns:
+            dict | None: The record or None if there is no record of the key.
+        """
+        with self._lock:
+            offset = self._offsets.get(key)
+            if offset is None:
+                return None
+            return json.loads(self._read_line(offset))
+
+    def put(self, record: dict) -> None:
+        """
+        Appends the record.
+
+        Args:
+            record (dict): The record with the key field.
+
+        Raises:
+            ValueError: If the record does not have the key field.
+        """
+        self.put_many([record])
+
+    def put_many(self, records: Iterable[dict]) -> None:
+        """
+        Appends the records in one write, skipping records equal to the latest record of their key.
+
+        Args:
+            records (Iterable[dict]): The records with the key field.
+
+        Raises:
+            ValueError: If a record does not have the key field.
+        """
+        lines = []
+        for record in records:
+            if self._key_field not in record:
+                raise ValueError(f"Record must have the \"{self._key_field}\" field")
+            lines.append((record[self._key_field], (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")))
+        with self._lock:
+            appended = []
+            latest = {}
+            for key, line in lines:
+                if key in latest:
+                    unchanged = latest[key] == line
+                else:
+                    offset = self._offsets.get(key)
+                    unchanged = offset is not None and self._read_line(offset) == line
+                if unchanged:
+                    continue
+                latest[key] = line
+                self._offsets[key] = self._length
+                self._length += len(line)
+                appended.append(line)
+            self._file.write(b"".join(appended))
+
+    def keys(self) -> list[str]:
+        """
+        Returns the keys of all records in the order of their latest record.
+
+        Returns:
+            list[str]: The keys.
+        """
+        with self._lock:
+            return sorted(self._offsets, key=self._offsets.get)
+
+    def compact(self) -> None:
+        """
+        Rewrites the file with only the latest record of every key, in the order of the latest records, and replaces it atomically.
+        """
+        with self._lock:
+            keys = sorted(self._offsets, key=self._offsets.get)
+            lines = [self._read_line(self._offsets[key]) for key in keys]
+            tmp_file_path = f"{self._file_path}.tmp"
+            with open(tmp_file_path, "wb") as f:
+                f.write(b"".join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            self._reader.close()
+            os.replace(tmp_file_path, self._file_path)
+            self._offsets = {}
+            self._length = 0
+            for key, line in zip(keys, lines):
+                self._offsets[key] = self._length
+                self._length += len(line)
+            self._file = open(self._file_path, "ab")
+            self._reader = open(self._file_path, "rb")
+
+    def __iter__(self) -> Iterator[dict]:
+        for key in self.keys():
+            record = self.get(key)
+            if record is not None:
+                yield record
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._offsets
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._offsets)
+
+    def flush(self) -> None:
+        """
+        Writes the appended records to disk.
+        """
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        """
+        Writes the appended records to disk and closes the file.
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._reader.close()
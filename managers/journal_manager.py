@@ -0,0 +1,125 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Iterable
+
+
+def _connect(file_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS stages ("
+        "release_group_id TEXT NOT NULL, stage TEXT NOT NULL, completed_at REAL NOT NULL, "
+        "PRIMARY KEY (release_group_id, stage))"
+    )
+    connection.execute("CREATE TABLE IF NOT EXISTS artists (artist TEXT PRIMARY KEY, completed_at REAL NOT NULL)")
+    return connection
+
+
+class JournalManager:
+    """
+    Manages a durable SQLite journal of the completed stages of every release group and of the completed artists.
+
+    The journal runs in WAL mode and every record is written in its own transaction, so a crash never loses completed work
+    and the pipeline can resume straight from unfinished release groups.
+
+    Attributes:
+        _file_path (str): The path to the journal database.
+        _connection (sqlite3.Connection): The connection to the journal database.
+
+    Methods:
+        complete_stage(release_group_ids, stage): Records that the stage is completed for the release groups.
+        is_stage_done(release_group_id, stage): Returns True if the stage is completed for the release group, False otherwise.
+        complete_artist(artist): Records that all release groups of the artist are completed.
+        is_artist_done(artist): Returns True if all release groups of the artist are completed, False otherwise.
+        close(): Closes the journal database.
+        delete_file(): Closes and deletes the journal database.
+    """
+    def __init__(self, file_path: str = ".journal.sqlite3"):
+        """
+        Initializes a JournalManager object, creating the journal database if it does not exist.
+
+        Args:
+            file_path (str): The path to the journal database.
+        """
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self._file_path = file_path
+        self._connection = _connect(file_path)
+        self._lock = threading.Lock()
+
+    def complete_stage(self, release_group_ids: str | Iterable[str], stage: str) -> None:
+        """
+        Records that the stage is completed for the release groups in a single transaction.
+
+        Args:
+            release_group_ids (str | Iterable[str]): The ID or IDs of the release groups.
+            stage (str): The name of the stage.
+        """
+        if isinstance(release_group_ids, str):
+            release_group_ids = [release_group_ids]
+        completed_at = time.time()
+        rows = [(release_group_id, stage, completed_at) for release_group_id in release_group_ids]
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany("INSERT OR REPLACE INTO stages VALUES (?, ?, ?)", rows)
+
+    def is_stage_done(self, release_group_id: str, stage: str) -> bool:
+        """
+        Returns True if the stage is completed for the release group, False otherwise.
+
+        Args:
+            release_group_id (str): The ID of the release group.
+            stage (str): The name of the stage.
+
+        Returns:
+            bool: A boolean indicating whether the stage is completed.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM stages WHERE release_group_id = ? AND stage = ?", (release_group_id, stage)
+            ).fetchone()
+        return row is not None
+
+    def complete_artist(self, artist: str) -> None:
+        """
+        Records that all release groups of the artist are completed.
+
+        Args:
+            artist (str): The name of the artist.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute("INSERT OR REPLACE INTO artists VALUES (?, ?)", (artist, time.time()))
+
+    def is_artist_done(self, artist: str) -> bool:
+        """
+        Returns True if all release groups of the artist are completed, False otherwise.
+
+        Args:
+            artist (str): The name of the artist.
+
+        Returns:
+            bool: A boolean indicating whether the artist is completed.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT 1 FROM artists WHERE artist = ?", (artist,)).fetchone()
+        return row is not None
+
+    def close(self) -> None:
+        """
+        Closes the journal database.
+        """
+        with self._lock:
+            self._connection.close()
+
+    def delete_file(self) -> None:
+        """
+        Closes and deletes the journal database together with its WAL files.
+        """
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(f"{self._file_path}{suffix}"):
+                os.remove(f"{self._file_path}{suffix}")
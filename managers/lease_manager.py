@@ -0,0 +1,141 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+def _connect(file_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(file_path, timeout=60, check_same_thread=False, isolation_level=None)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS leases ("
+        "artist TEXT PRIMARY KEY, position INTEGER NOT NULL, worker_id TEXT, expires_at REAL, done INTEGER NOT NULL DEFAULT 0)"
+    )
+    return connection
+
+
+class LeaseManager:
+    """
+    Distributes artists between worker processes on one or more hosts through expiring leases in a shared SQLite database.
+
+    A worker claims unfinished artists whose lease is free or expired, so the artists of a crashed worker are
+    claimed again by another worker once its leases expire. A background thread renews the leases held by the worker.
+
+    Attributes:
+        _worker_id (str): The ID of the worker.
+        _lease_duration (float): The number of seconds a lease is valid for without renewal.
+
+    Methods:
+        add_artists(artists): Adds the artists that are not in the database yet.
+        claim(count): Claims up to count unfinished artists and returns their positions.
+        complete(position): Marks the artist at the position as done.
+        renew(): Extends all leases held by the worker.
+        close(): Stops the renewal thread and frees the unfinished leases of the worker.
+    """
+    def __init__(self, file_path: str, worker_id: str, lease_duration: float = 600):
+        """
+        Initializes a LeaseManager object and starts the lease renewal thread.
+
+        Args:
+            file_path (str): The path to the lease database.
+            worker_id (str): The ID of the worker.
+            lease_duration (float): The number of seconds a lease is valid for without renewal.
+        """
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self._worker_id = worker_id
+        self._lease_duration = lease_duration
+        self._connection = _connect(file_path)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._renew_periodically, name="lease-renewal", daemon=True)
+        self._thread.start()
+
+    def _execute(self, *statements: tuple[str, tuple]) -> list[tuple]:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = []
+                for sql, parameters in statements:
+                    rows = self._connection.execute(sql, parameters).fetchall()
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            return rows
+
+    def add_artists(self, artists: list[str]) -> None:
+        """
+        Adds the artists that are not in the database yet.
+
+        Args:
+            artists (list[str]): The names of the artists in order.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO leases (artist, position) VALUES (?, ?)",
+                    [(artist, position) for position, artist in enumerate(artists)],
+                )
+                self._connection.executemany(
+                    "UPDATE leases SET position = ? WHERE artist = ?",
+                    [(position, artist) for position, artist in enumerate(artists)],
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def claim(self, count: int = 1) -> list[int]:
+        """
+        Claims up to count unfinished artists whose lease is free or expired and returns their positions.
+
+        Args:
+            count (int): The maximum number of artists to claim.
+
+        Returns:
+            list[int]: The positions of the claimed artists in ascending order. Empty if there is no unfinished artist left to claim.
+        """
+        now = time.time()
+        rows = self._execute(
+            ("UPDATE leases SET worker_id = ?, expires_at = ? WHERE artist IN ("
+             "SELECT artist FROM leases WHERE done = 0 AND (worker_id IS NULL OR expires_at < ?) ORDER BY position LIMIT ?)",
+             (self._worker_id, now + self._lease_duration, now, count)),
+            ("SELECT position FROM leases WHERE worker_id = ? AND expires_at = ? AND done = 0 ORDER BY position",
+             (self._worker_id, now + self._lease_duration)),
+        )
+        return [position for position, in rows]
+
+    def complete(self, position: int) -> None:
+        """
+        Marks the artist at the position as done if the worker still holds its lease.
+
+        Args:
+            position (int): The position of the artist.
+        """
+        self._execute(("UPDATE leases SET done = 1 WHERE position = ? AND worker_id = ?", (position, self._worker_id)))
+
+    def renew(self) -> None:
+        """
+        Extends all unfinished leases held by the worker.
+        """
+        self._execute((
+            "UPDATE leases SET expires_at = ? WHERE worker_id = ? AND done = 0",
+            (time.time() + self._lease_duration, self._worker_id),
+        ))
+
+    def close(self) -> None:
+        """
+        Stops the renewal thread and frees the unfinished leases of the worker.
+        """
+        self._closed.set()
+        self._thread.join()
+        self._execute((
+            "UPDATE leases SET worker_id = NULL, expires_at = NULL WHERE worker_id = ? AND done = 0",
+            (self._worker_id,),
+        ))
+        self._connection.close()
+
+    def _renew_periodically(self) -> None:
+        while not self._closed.wait(self._lease_duration / 3):
+            self.renew()
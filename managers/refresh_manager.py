@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import threading
+
+
+def _connect(file_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(file_path, timeout=60, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS release_groups ("
+        "artist TEXT NOT NULL, release_group_id TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+        "PRIMARY KEY (artist, release_group_id))"
+    )
+    return connection
+
+
+class RefreshManager:
+    """
+    Keeps the release group IDs of every artist with the fingerprints they had when they were last processed,
+    so an incremental run only processes new or changed release groups.
+
+    The listing of an artist is staged in memory when it is fetched and committed once all of its release groups are processed,
+    so a crash never marks unprocessed release groups as known. The state database can be shared by the workers of a sharded run,
+    as every artist is only processed by the worker holding its lease.
+
+    Attributes:
+        skip_unchanged (bool): Whether unchanged release groups are skipped.
+        _connection (sqlite3.Connection): The connection to the state database.
+        _pending (dict[str, dict[str, str]]): The staged fingerprints by release group ID by artist.
+
+    Methods:
+        is_unchanged(artist, release_group_id, fingerprint): Returns True if the release group can be skipped, False otherwise.
+        stage(artist, fingerprints): Stages the fetched listing of the artist.
+        commit(artist): Replaces the stored listing of the artist with the staged one.
+        discard(artist): Discards the staged listing of the artist.
+        close(): Closes the state database.
+    """
+    def __init__(self, file_path: str, skip_unchanged: bool = False):
+        """
+        Initializes a RefreshManager object, creating the state database if it does not exist.
+
+        Args:
+            file_path (str): The path to the state database.
+            skip_unchanged (bool): Whether unchanged release groups are skipped.
+        """
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self.skip_unchanged = skip_unchanged
+        self._connection = _connect(file_path)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def is_unchanged(self, artist: str, release_group_id: str, fingerprint: str) -> bool:
+        """
+        Returns True if the release group can be skipped, i.e. skip_unchanged is set and the release group
+        was processed before with the same fingerprint, False otherwise.
+
+        Args:
+            artist (str): The name of the artist.
+            release_group_id (str): The ID of the release group.
+            fingerprint (str): The current fingerprint of the release group.
+
+        Returns:
+            bool: A boolean indicating whether the release group can be skipped.
+        """
+        if not self.skip_unchanged:
+            return False
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fingerprint FROM release_groups WHERE artist = ? AND release_group_id = ?", (artist, release_group_id)
+            ).fetchone()
+        return row is not None and row[0] == fingerprint
+
+    def stage(self, artist: str, fingerprints: dict[str, str]) -> None:
+        """
+        Stages the fetched listing of the artist.
+
+        Args:
+            artist (str): The name of the artist.
+            fingerprints (dict[str, str]): The fingerprints of all release groups of the artist by release group ID.
+        """
+        with self._lock:
+            self._pending[artist] = fingerprints
+
+    def commit(self, artist: str) -> None:
+        """
+        Replaces the stored listing of the artist with the staged one in a single transaction.
+        Does nothing if no listing is staged for the artist.
+
+        Args:
+            artist (str): The name of the artist.
+        """
+        with self._lock:
+            fingerprints = self._pending.pop(artist, None)
+            if fingerprints is None:
+                return
+            with self._connection:
+                self._connection.execute("BEGIN")
+                self._connection.execute("DELETE FROM release_groups WHERE artist = ?", (artist,))
+                self._connection.executemany(
+                    "INSERT INTO release_groups VALUES (?, ?, ?)",
+                    [(artist, release_group_id, fingerprint) for release_group_id, fingerprint in fingerprints.items()],
+                )
+
+    def discard(self, artist: str) -> None:
+        """
+        Discards the staged listing of the artist without storing it, e.g. after a run that did not upload its releases.
+
+        Args:
+            artist (str): The name of the artist.
+        """
+        with self._lock:
+            self._pending.pop(artist, None)
+
+    def close(self) -> None:
+        """
+        Closes the state database.
+        """
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,191 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from utils.utils import create_file_if_not_exists
+from utils.metrics import METRICS
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+LIST_PAGE_SIZE = 1000
+
+
+def _load_manifest(file_path: str) -> dict[str, str]:
+    with open(file_path, "r") as f:
+        content = f.read().strip()
+        if content:
+            return json.loads(content)
+        return {}
+
+
+def _save_manifest(file_path: str, manifest: dict[str, str]) -> None:
+    tmp_file_path = f"{file_path}.tmp"
+    with open(tmp_file_path, "w") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file_path, file_path)
+
+
+class StorageManager:
+    """
+    Uploads cover art to a Supabase storage bucket, skipping covers that are already there.
+
+    A local manifest keeps the SHA-256 of every uploaded file by its storage path, so unchanged covers are skipped without any request.
+    For paths missing from the manifest, the bucket folder is listed once and existing files are added to the manifest.
+    Uploads run in a thread pool.
+    If the client talks to a stand-in server, public URLs are built from the public URL of the real project instead.
+
+    Attributes:
+        _client (Client): The Supabase client.
+        _bucket (str): The name of the storage bucket.
+        _manifest_file_path (str): The path to the manifest file.
+        _manifest (dict[str, str]): The SHA-256 of every uploaded file by its storage path.
+        _listed_folders (dict[str, set[str]]): The file names in every listed bucket folder.
+        _public_url (str | None): The URL of the Supabase project used in public URLs or None to use the URL of the client.
+
+    Methods:
+        get_public_url(storage_path): Returns the public URL of the file.
+        upload(local_path, storage_path, content): Uploads the file if it is missing or changed and returns its public URL.
+        submit(local_path, storage_path, content): Uploads the file in the thread pool and returns a future of its public URL.
+        save(): Saves the manifest file.
+        close(): Waits for the pending uploads and saves the manifest file.
+    """
+    def __init__(self, client: "Client", bucket: str, manifest_file_path: str, max_workers: int = 8, save_interval: int = 50,
+                 public_url: str | None = None):
+        """
+        Initializes a StorageManager object and loads the manifest file.
+
+        Args:
+            client (Client): The Supabase client.
+            bucket (str): The name of the storage bucket.
+            manifest_file_path (str): The path to the manifest file.
+            max_workers (int): The number of concurrent uploads.
+            save_interval (int): The number of uploads after which the manifest file is saved automatically.
+            public_url (str | None): The URL of the Supabase project used in public URLs. None uses the URL of the client.
+        """
+        self._client = client
+        self._bucket = bucket
+        self._manifest_file_path = create_file_if_not_exists(manifest_file_path)
+        self._manifest = _load_manifest(self._manifest_file_path)
+        self._listed_folders = {}
+        self._public_url = public_url.rstrip("/") if public_url else None
+        self._save_interval = save_interval
+        self._unsaved_count = 0
+        self._lock = threading.Lock()
+        self._folder_locks = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage")
+
+    def get_public_url(self, storage_path: str) -> str:
+        """
+        Returns the public URL of the file.
+
+        Args:
+            storage_path (str): The path to the file in the bucket.
+
+        Returns:
+            str: The public URL of the file without the trailing question mark.
+        """
+        url = self._client.storage.from_(self._bucket).get_public_url(storage_path).rstrip("?")
+        client_url = self._client.supabase_url.rstrip("/")
+        if self._public_url and url.startswith(client_url):
+            url = self._public_url + url[len(client_url):]
+        return url
+
+    def _list_folder(self, folder: str) -> set[str]:
+        with self._lock:
+            folder_lock = self._folder_locks.setdefault(folder, threading.Lock())
+        with folder_lock:
+            if folder not in self._listed_folders:
+                names = set()
+                offset = 0
+                while True:
+                    files = self._client.storage.from_(self._bucket).list(folder, {"limit": LIST_PAGE_SIZE, "offset": offset})
+                    names.update(file["name"] for file in files)
+                    offset += len(files)
+                    if len(files) < LIST_PAGE_SIZE:
+                        break
+                self._listed_folders[folder] = names
+            return self._listed_folders[folder]
+
+    def _record(self, storage_path: str, content_hash: str) -> None:
+        with self._lock:
+            self._manifest[storage_path] = content_hash
+            self._unsaved_count += 1
+            if self._unsaved_count >= self._save_interval:
+                self._save()
+
+    def upload(self, local_path: str, storage_path: str, content: bytes | None = None) -> str:
+        """
+        Uploads the file if it is missing or changed and returns its public URL.
+
+        Args:
+            local_path (str): The path to the file on disk.
+            storage_path (str): The path to the file in the bucket.
+            content (bytes | None): The content of the file if it is already in memory. None reads it from the local path.
+
+        Returns:
+            str: The public URL of the file.
+        """
+        if content is None:
+            with open(local_path, "rb") as f:
+                content = f.read()
+        content_hash = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            uploaded_hash = self._manifest.get(storage_path)
+        if uploaded_hash == content_hash:
+            METRICS.increment("storage_uploads_total", result="skipped")
+            return self.get_public_url(storage_path)
+
+        if uploaded_hash is None:
+            folder, name = os.path.split(storage_path)
+            if name in self._list_folder(folder):
+                self._record(storage_path, content_hash)
+                METRICS.increment("storage_uploads_total", result="skipped")
+                return self.get_public_url(storage_path)
+
+        with METRICS.timer("storage_upload_seconds"):
+            self._client.storage.from_(self._bucket).upload(
+                file=content,
+                path=storage_path,
+                file_options={"content-type": "image/jpeg", "upsert": "true"},
+            )
+        METRICS.increment("storage_uploads_total", result="uploaded")
+        self._record(storage_path, content_hash)
+        return self.get_public_url(storage_path)
+
+    def submit(self, local_path: str, storage_path: str, content: bytes | None = None) -> Future:
+        """
+        Uploads the file in the thread pool and returns a future of its public URL.
+
+        Args:
+            local_path (str): The path to the file on disk.
+            storage_path (str): The path to the file in the bucket.
+            content (bytes | None): The content of the file if it is already in memory. None reads it from the local path.
+
+        Returns:
+            Future: The future of the public URL of the file.
+        """
+        return self._executor.submit(self.upload, local_path, storage_path, content)
+
+    def save(self) -> None:
+        """
+        Saves the manifest file.
+        """
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        _save_manifest(self._manifest_file_path, self._manifest)
+        self._unsaved_count = 0
+
+    def close(self) -> None:
+        """
+        Waits for the pending uploads and saves the manifest file.
+        """
+        self._executor.shutdown(wait=True)
+        self.save()
@@ -0,0 +1,164 @@
+import threading
+from typing import TYPE_CHECKING
+from utils.metrics import METRICS
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+def _load_column_names(client: "Client", table: str) -> set[str]:
+    column_names = client.rpc("get_column_names", {"tablename": table}).execute().data
+    if not column_names:
+        raise ValueError(f"Table \"{table}\" does not exist or has no columns")
+    return set(column_names)
+
+
+class SupabaseSink:
+    """
+    Writes rows to a Supabase table in batches.
+
+    The table schema is fetched once on initialization and every row is validated against it before it is buffered.
+    Buffered rows are written with a single upsert on the conflict column once the batch is complete,
+    every flush_interval seconds by a background thread and on close.
+    Rows that already exist in the table are left unchanged unless update_existing is set.
+
+    Attributes:
+        _client (Client): The Supabase client.
+        _table (str): The name of the table.
+        _on_conflict (str): The unique column used to find existing rows.
+        _update_existing (bool): Whether existing rows are updated instead of left unchanged.
+        _batch_size (int): The number of buffered rows that triggers a flush.
+        _flush_interval (float): The number of seconds between flushes by the background thread.
+        _column_names (set[str]): The column names of the table.
+
+    Methods:
+        validate(row): Raises ValueError if the row has a key that is not a column of the table.
+        add(row): Buffers the row and flushes the buffer if the batch is complete.
+        flush(): Writes the buffered rows to the table.
+        close(): Stops the background thread and writes the buffered rows to the table.
+    """
+    def __init__(self, client: "Client", table: str, on_conflict: str = "src", batch_size: int = 100, flush_interval: float = 5.0,
+                 update_existing: bool = False):
+        """
+        Initializes a SupabaseSink object, fetches the table schema and starts the background flush thread.
+
+        Args:
+            client (Client): The Supabase client.
+            table (str): The name of the table.
+            on_conflict (str): The unique column used to find existing rows.
+            batch_size (int): The number of buffered rows that triggers a flush.
+            flush_interval (float): The number of seconds between flushes by the background thread.
+            update_existing (bool): Whether existing rows are updated instead of left unchanged.
+
+        Raises:
+            ValueError: If the batch size is less than 1 or the table has no columns.
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        self._client = client
+        self._table = table
+        self._on_conflict = on_conflict
+        self._update_existing = update_existing
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._column_names = _load_column_names(client, table)
+        self._rows = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._flush_periodically, name="supabase-sink", daemon=True)
+        self._thread.start()
+
+    def validate(self, row: dict) -> None:
+        """
+        Raises ValueError if the row has a key that is not a column of the table.
+
+        Args:
+            row (dict): The row to validate.
+
+        Raises:
+            ValueError: If any key of the row is not a column of the table or the row has no conflict column.
+        """
+        for key in row.keys():
+            if key not in self._column_names:
+                raise ValueError(f"Column \"{key}\" does not exist in \"{self._table}\" table")
+        if not row.get(self._on_conflict):
+            raise ValueError(f"Row must have a non-empty \"{self._on_conflict}\" value")
+
+    def add(self, row: dict) -> None:
+        """
+        Buffers the row and flushes the buffer if the batch is complete.
+
+        Args:
+            row (dict): The row to write.
+
+        Raises:
+            ValueError: If the row is not valid for the table.
+            Exception: The error of a failed background flush.
+        """
+        self._raise_error()
+        self.validate(row)
+        with self._lock:
+            self._rows[row[self._on_conflict]] = row
+            batch_complete = len(self._rows) >= self._batch_size
+        if batch_complete:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows to the table with a single upsert.
+
+        Raises:
+            Exception: The error of a failed background flush.
+        """
+        self._raise_error()
+        self._flush()
+
+    def _flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._rows.values())
+                self._rows = {}
+            if not rows:
+                return
+            try:
+                with METRICS.timer("supabase_upsert_seconds"):
+                    self._client.from_(self._table).upsert(
+                        rows, on_conflict=self._on_conflict, ignore_duplicates=not self._update_existing
+                    ).execute()
+                METRICS.increment("supabase_rows_total", len(rows))
+            except BaseException:
+                with self._lock:
+                    self._rows = {row[self._on_conflict]: row for row in rows} | self._rows
+                raise
+
+    def close(self) -> None:
+        """
+        Stops the background thread and writes the buffered rows to the table.
+        The rows of a failed background flush are written again before its error is raised.
+
+        Raises:
+            Exception: The error of a failed background flush.
+        """
+        if not self._closed.is_set():
+            self._closed.set()
+            self._thread.join()
+        error, self._error = self._error, None
+        try:
+            self._flush()
+        finally:
+            if error:
+                raise error
+
+    def _raise_error(self) -> None:
+        if self._error:
+            error, self._error = self._error, None
+            raise error
+
+    def _flush_periodically(self) -> None:
+        while not self._closed.wait(self._flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self._error = e
@@ -0,0 +1,176 @@
+import os
+import re
+import time
+import sqlite3
+import threading
+from musicbrainz.musicbrainz_api import MusicBrainzAPI, match_artist
+
+
+MBID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE)
+
+
+def is_mbid(artist: str) -> bool:
+    """
+    Returns True if the string is a MusicBrainz ID, False otherwise.
+
+    Args:
+        artist (str): An artist name or ID.
+
+    Returns:
+        bool: A boolean indicating whether the string is a MusicBrainz ID.
+    """
+    return MBID_PATTERN.fullmatch(artist.strip()) is not None
+
+
+def _connect(file_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(file_path, timeout=60, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS artists ("
+        "name TEXT PRIMARY KEY, artist_id TEXT NOT NULL, score INTEGER, resolved_at REAL NOT NULL)"
+    )
+    return connection
+
+
+class ArtistResolver:
+    """
+    Resolves artist names to MusicBrainz IDs through a persistent cache, so every name is only searched for once.
+
+    Entries of the artist list that are MusicBrainz IDs are used as they are. A name missing from the cache is resolved
+    together with the next unresolved names of the artist list in one OR-combined search, and every name is matched
+    with the artist of that name with the highest score. A name without a match is resolved with a search of its own,
+    which falls back to the first result like fetch_artist does.
+
+    Attributes:
+        _mb (MusicBrainzAPI): The MusicBrainz API client.
+        _artists (list[str]): The artist list, used to look ahead for the names to resolve in the same search.
+        _indexes (dict[str, int]): The index of every name in the artist list.
+        _batch_size (int): The maximum number of names resolved in one search.
+        _ttl (float | None): The number of seconds a resolved name is kept for. None keeps it forever.
+        _connection (sqlite3.Connection): The connection to the cache database.
+        _unmatched (set[str]): The names that a batch search did not match, resolved with a search of their own.
+
+    Methods:
+        resolve(artist): Returns the MusicBrainz ID of the artist.
+        get(artist): Returns the cached resolution of the artist or None.
+        close(): Closes the cache database.
+    """
+    def __init__(self, file_path: str, mb: MusicBrainzAPI, artists: list[str], batch_size: int = 25, ttl: float | None = None):
+        """
+        Initializes an ArtistResolver object, creating the cache database if it does not exist.
+
+        Args:
+            file_path (str): The path to the cache database.
+            mb (MusicBrainzAPI): The MusicBrainz API client.
+            artists (list[str]): The artist list.
+            batch_size (int): The maximum number of names resolved in one search.
+            ttl (float | None): The number of seconds a resolved name is kept for. None keeps it forever.
+
+        Raises:
+            ValueError: If the batch size is smaller than 1.
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self._mb = mb
+        self._artists = artists
+        self._indexes = {}
+        for index, artist in enumerate(artists):
+            self._indexes.setdefault(artist, index)
+        self._batch_size = batch_size
+        self._ttl = ttl
+        self._connection = _connect(file_path)
+        self._unmatched = set()
+        self._lock = threading.Lock()
+
+    def _get_many(self, names: list[str]) -> dict[str, dict]:
+        placeholders = ", ".join("?" * len(names))
+        rows = self._connection.execute(
+            f"SELECT name, artist_id, score, resolved_at FROM artists WHERE name IN ({placeholders})", names
+        ).fetchall()
+        now = time.time()
+        return {
+            name: {"artist_id": artist_id, "score": score, "resolved_at": resolved_at}
+            for name, artist_id, score, resolved_at in rows
+            if self._ttl is None or now - resolved_at < self._ttl
+        }
+
+    def _put_many(self, artists: dict[str, dict]) -> None:
+        now = time.time()
+        with self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO artists VALUES (?, ?, ?, ?)",
+                [(name, artist["id"], artist.get("score"), now) for name, artist in artists.items()],
+            )
+
+    def get(self, artist: str) -> dict | None:
+        """
+        Returns the cached resolution of the artist or None.
+
+        Args:
+            artist (str): The name of the artist.
+
+        Returns:
+            dict | None: The resolution with "artist_id", "score" and "resolved_at" keys
+                or None if the name is not cached or has expired.
+        """
+        with self._lock:
+            return self._get_many([artist]).get(artist)
+
+    def resolve(self, artist: str) -> str:
+        """
+        Returns the MusicBrainz ID of the artist, searching for it and the next unresolved names of the artist list
+        if it is not cached.
+
+        Args:
+            artist (str): The name or MusicBrainz ID of the artist.
+
+        Returns:
+            str: The MusicBrainz ID of the artist.
+
+        Raises:
+            ValueError: If no artist is found for the name.
+        """
+        if is_mbid(artist):
+            return artist.strip().lower()
+        with self._lock:
+            index = self._indexes.get(artist)
+            window = [artist]
+            if index is not None:
+                window += [
+                    name for name in self._artists[index + 1:index + self._batch_size]
+                    if name != artist and not is_mbid(name) and name not in self._unmatched
+                ]
+            window = list(dict.fromkeys(window))
+            cached = self._get_many(window)
+            if artist in cached:
+                return cached[artist]["artist_id"]
+
+            names = [artist] + [name for name in window[1:] if name not in cached]
+            if artist not in self._unmatched:
+                results = self._mb.search_artists(names)
+                resolved = {}
+                for name in names:
+                    match = match_artist(name, results)
+                    if match:
+                        resolved[name] = match
+                    else:
+                        self._unmatched.add(name)
+                if resolved:
+                    self._put_many(resolved)
+                if artist in resolved:
+                    return resolved[artist]["id"]
+
+            match = self._mb.fetch_artist(artist)
+            self._put_many({artist: match})
+            self._unmatched.discard(artist)
+            return match["id"]
+
+    def close(self) -> None:
+        """
+        Closes the cache database.
+        """
+        with self._lock:
+            self._connection.close()
@@ -13,14 +13,17 @@ class ExtendedReleaseGroup(ReleaseGroup):
         get_data: Extracts relevant data from a music release and returns it as a dictionary.
         get_cover_path: Returns the formatted path for a release's cover art.
     """
+    __slots__ = ()
+
     def __init__(self, release_group: ReleaseGroup):
         """
-        Initializes an ExtendedReleaseGroup object with the given release group data.
+        Initializes an ExtendedReleaseGroup object with the fields of the given release group, without parsing them again.
         
         Args:
             release_group (ReleaseGroup): The release group object to extend.
         """
-        super().__init__(release_group._release_data)
+        for name in ReleaseGroup.__slots__:
+            object.__setattr__(self, name, getattr(release_group, name))
     
     def get_genre(self, genre_list: list[str]) -> str:
         """
@@ -35,11 +38,11 @@ class ExtendedReleaseGroup(ReleaseGroup):
         """
         max_count = 0
         max_count_genre = ""
-        for genre in self.get_genres():
+        for name, count in self.get_genres():
             for string in genre_list:
-                if string.lower() in str(genre["name"]).lower():
-                    if genre["count"] > max_count:
-                        max_count = genre["count"]
+                if string.lower() in str(name).lower():
+                    if count > max_count:
+                        max_count = count
                         max_count_genre = string
         return max_count_genre
 
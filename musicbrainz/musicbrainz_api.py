@@ -1,90 +1,229 @@
+from typing import Iterator
+from urllib.parse import quote
 from requests import Session
-from utils.utils import make_api_request
+from utils.utils import make_api_request, load_json
 from musicbrainz.release_group import ReleaseGroup
+from musicbrainz.response_cache import ResponseCache
 
 
 MUSICBRAINZ_API_URL = "https://musicbrainz.org/ws/2"
 COVERARTARTCHIVE_API_URL = "https://coverartarchive.org"
-    
+BROWSE_LIMIT = 100
+SEARCH_LIMIT = 100
+THUMBNAIL_SIZES = {"small": 250, "large": 500}
+CHUNK_SIZE = 64 * 1024
+MAX_COVER_BYTES = 32 * 1024 * 1024
+
+
+def match_artist(name: str, artists: list[dict]) -> dict | None:
+    """
+    Returns the artist of the search results whose name, sort name or alias is the name, case-insensitive,
+    with the highest score, or None if no artist has the name.
+
+    Args:
+        name (str): The name of the artist.
+        artists (list[dict]): The artists returned by the artist search.
+
+    Returns:
+        dict | None: The matching artist or None.
+    """
+    name = name.casefold()
+    matches = [
+        artist for artist in artists
+        if name in {
+            str(artist.get("name", "")).casefold(),
+            str(artist.get("sort-name", "")).casefold(),
+            *(str(alias.get("name", "")).casefold() for alias in artist.get("aliases") or []),
+        }
+    ]
+    return max(matches, key=lambda artist: artist.get("score", 0), default=None)
+
     
 class MusicBrainzAPI:
     """
     A class for interacting with the MusicBrainz API.
 
+    JSON responses are served from the response cache and revalidated once stale if a cache is given.
+    Cover art is stored in a separate cache, so large images do not evict the JSON responses.
+
     Attributes:
     _session: A Session object used to make requests to the MusicBrainz API.
+    _cache: A ResponseCache of JSON responses or None.
+    _cover_cache: A ResponseCache of cover art or None.
 
     Methods:
-    fetch_artist_id(artist): Searches for an artist by name and fetches the ID of the first matching artist.
-    fetch_release_groups_ids(artist_id): Fetches the release groups IDs of the artist by artist_id.
-    fetch_release_group(release_group_id): Fetches the release group by release_group_id.
-    fetch_release_group_cover(release_group_id): Fetches the cover art of the release group by release group ID.
+    fetch_artist(artist): Searches for an artist by name and fetches the matching artist with the highest score.
+    fetch_artist_id(artist): Searches for an artist by name and fetches the ID of the matching artist with the highest score.
+    search_artists(names): Searches for the artists of all names with one query.
+    fetch_release_groups(artist_id, release_type): Fetches all release groups of the artist of the given type page by page.
+    fetch_cover_url(release_group_id, size): Fetches the URL of the front cover art of the release group closest to the size.
+    fetch_cover(release_group_id, size, max_bytes): Fetches the cover art of the release group by release group ID.
     """
-    def __init__(self, session: Session):
+    def __init__(self, session: Session, cache: ResponseCache | None = None, cover_cache: ResponseCache | None = None):
         """
         Initializes a MusicBrainzAPI object.
 
         Args:
         _session(Session): A Session object used to make requests to the MusicBrainz API.
+        cache(ResponseCache | None): The cache of JSON responses. None disables caching.
+        cover_cache(ResponseCache | None): The cache of cover art. None disables caching.
         """
         self._session = session
+        self._cache = cache
+        self._cover_cache = cover_cache
+
+    def _fetch_json(self, url: str) -> dict:
+        if self._cache is None:
+            return load_json(make_api_request(self._session, url).content)
+        entry = self._cache.get(url)
+        if entry and entry["fresh"]:
+            return load_json(entry["body"])
+        response = make_api_request(self._session, url, headers=self._cache.get_revalidation_headers(entry))
+        if entry and response.status_code == 304:
+            self._cache.touch(url)
+            return load_json(entry["body"])
+        self._cache.put(url, response.content, response.headers)
+        return load_json(response.content)
+
+    def fetch_artist(self, artist: str) -> dict:
+        """
+        Searches for an artist by name and fetches the matching artist with the highest score,
+        or the first artist of the results if none of them has the name.
+
+        Args:
+        artist (str): The name of the artist to search for.
+
+        Returns:
+        dict: The artist with "id", "name" and "score" keys.
+
+        Raises:
+        ValueError: If the search does not return any artist.
+        """
+        data = self._fetch_json(f"{MUSICBRAINZ_API_URL}/artist/?query={quote(artist)}&fmt=json")
+        if not data["artists"]:
+            raise ValueError(f"No artist found for \"{artist}\"")
+        return match_artist(artist, data["artists"]) or data["artists"][0]
 
     def fetch_artist_id(self, artist: str) -> str:
         """
-        Searches for an artist by name and fetches the ID of the first matching artist.
+        Searches for an artist by name and fetches the ID of the matching artist with the highest score,
+        or of the first artist of the results if none of them has the name.
 
         Args:
         artist (str): The name of the artist to search for.
 
         Returns:
-        str: The ID of the first artist that matches the search query.
+        str: The ID of the artist.
+
+        Raises:
+        ValueError: If the search does not return any artist.
+        """
+        return self.fetch_artist(artist)["id"]
+
+    def search_artists(self, names: list[str], limit: int = SEARCH_LIMIT) -> list[dict]:
+        """
+        Searches for the artists of all names with one query that combines a phrase query of every name with OR.
+
+        Args:
+        names (list[str]): The names of the artists.
+        limit (int): The maximum number of artists returned, at most 100.
+
+        Returns:
+        list[dict]: The artists matching any of the names in the order of their score, to be matched with match_artist.
         """
-        response = make_api_request(self._session, f"{MUSICBRAINZ_API_URL}/artist/?query={artist}&fmt=json")
-        data = response.json()
-        artist_id = data["artists"][0]["id"]
-        return artist_id
+        query = " OR ".join('"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"' for name in names)
+        data = self._fetch_json(f"{MUSICBRAINZ_API_URL}/artist/?query={quote(query)}&limit={limit}&fmt=json")
+        return data["artists"]
 
-    def fetch_release_groups_ids(self, artist_id: str) -> list[str]:
+    def fetch_release_groups(self, artist_id: str, release_type: str = "album") -> Iterator[ReleaseGroup]:
         """
-        Fetches the release groups IDs of the artist by artist ID.
+        Fetches all release groups of the artist of the given type page by page.
+
+        Uses the browse endpoint, which returns up to 100 complete release groups per request,
+        instead of looking up every release group by ID.
 
         Args:
         artist_id(str): The ID of the artist.
+        release_type(str): The release group type to filter by on the server. Empty string fetches all types.
 
         Returns:
-        list[str]: A list of release groups IDs of the artist.
+        Iterator[ReleaseGroup]: The release groups of the artist.
         """
-        response = make_api_request(self._session, f"{MUSICBRAINZ_API_URL}/artist/{artist_id}?inc=release-groups&fmt=json")
-        data = response.json()
-        release_groups_data = data["release-groups"]
-        release_groups_ids = [release_group["id"] for release_group in release_groups_data]
-        return release_groups_ids
-    
-    def fetch_release_group(self, release_group_id: str) -> ReleaseGroup:
+        offset = 0
+        type_filter = f"&type={release_type}" if release_type else ""
+        while True:
+            data = self._fetch_json(
+                f"{MUSICBRAINZ_API_URL}/release-group?artist={artist_id}{type_filter}"
+                f"&inc=artist-credits+genres&limit={BROWSE_LIMIT}&offset={offset}&fmt=json"
+            )
+            release_groups = ReleaseGroup.from_browse_page(data)
+            yield from release_groups
+            offset += len(release_groups)
+            if not release_groups or offset >= data["release-group-count"]:
+                break
+
+    def fetch_cover_url(self, release_group_id: str, size: int | None = None) -> str:
         """
-        Fetches the release group data by release group ID.
+        Fetches the URL of the front cover art of the release group closest to the given size.
+
+        The smallest Cover Art Archive thumbnail that is not smaller than the size is chosen.
+        If every thumbnail is smaller, the original image is chosen.
 
         Args:
         release_group_id(str): The ID of the release group.
+        size(int | None): The target size of the longest side of the cover art in pixels. None chooses the original image.
 
         Returns:
-        ReleaseGroup: A ReleaseGroup object representing the release group of the release group ID.
+        str: The URL of the cover art.
+
+        Raises:
+        ValueError: If the release group has no front cover art.
         """
-        response = make_api_request(self._session, f"{MUSICBRAINZ_API_URL}/release-group/{release_group_id}?inc=artists+genres&fmt=json")
-        data = response.json()
-        release_group = ReleaseGroup(data)
-        return release_group
-    
-    def fetch_cover(self, release_group_id: str) -> bytes:
+        if size is None:
+            return f"{COVERARTARTCHIVE_API_URL}/release-group/{release_group_id}/front"
+        images = self._fetch_json(f"{COVERARTARTCHIVE_API_URL}/release-group/{release_group_id}")["images"]
+        image = next((image for image in images if image.get("front")), None)
+        if image is None:
+            raise ValueError(f"Release group \"{release_group_id}\" has no front cover art")
+        thumbnails = {}
+        for name, url in image.get("thumbnails", {}).items():
+            thumbnail_size = THUMBNAIL_SIZES.get(name, int(name) if name.isdigit() else None)
+            if thumbnail_size and url:
+                thumbnails[thumbnail_size] = url
+        larger_sizes = [thumbnail_size for thumbnail_size in thumbnails if thumbnail_size >= size]
+        if larger_sizes:
+            return thumbnails[min(larger_sizes)]
+        return image["image"]
+
+    def fetch_cover(self, release_group_id: str, size: int | None = None, max_bytes: int = MAX_COVER_BYTES) -> bytes:
         """
         Fetches the cover art of the release group by release group ID.
 
+        The cover art is streamed in chunks into a buffer bounded by max_bytes.
+        Cover art URLs are immutable, so cached cover art is returned without revalidation.
+
         Args:
         release_group_id(str): The ID of the release group.
+        size(int | None): The target size of the longest side of the cover art in pixels. None fetches the original image.
+        max_bytes(int): The maximum size of the cover art in bytes.
 
         Returns:
         bytes: The content of the cover art of the release group in bytes.
+
+        Raises:
+        ValueError: If the cover art is larger than max_bytes.
         """
-        response = make_api_request(self._session, f"{COVERARTARTCHIVE_API_URL}/release-group/{release_group_id}/front")
-        cover = response.content
-        return cover
\ No newline at end of file
+        url = self.fetch_cover_url(release_group_id, size)
+        entry = self._cover_cache.get(url) if self._cover_cache else None
+        if entry:
+            return entry["body"]
+        with make_api_request(self._session, url, stream=True) as response:
+            buffer = bytearray()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                buffer.extend(chunk)
+                if len(buffer) > max_bytes:
+                    raise ValueError(f"Cover art of the release group \"{release_group_id}\" is larger than {max_bytes} bytes")
+        cover = bytes(buffer)
+        if self._cover_cache:
+            self._cover_cache.put(url, cover, response.headers)
+        return cover
@@ -1,32 +1,103 @@
+import json
+import hashlib
 from datetime import datetime
-from utils.utils import format_date
+from utils.utils import load_json, date_to_ordinal
 
 class ReleaseGroup:
     """
-    Represents a release group, encapsulating its data and providing methods for accessing and manipulating it.
+    Represents a release group, keeping only the fields of the MusicBrainz data that are used for filtering and saving it.
+
+    The fields are parsed once on initialization into slots instead of keeping the response dict alive,
+    so hundreds of thousands of release groups fit in memory. The first release date is also kept as an ordinal,
+    so it is compared as an integer. A release group is immutable.
 
     Attributes:
-        _release_data (dict): The underlying data for the release group.
-        
+        _id (str): The ID of the release group.
+        _title (str | None): The title of the release group.
+        _disambiguation (str | None): The disambiguation of the title of the release group.
+        _first_release_date (str | None): The first release date of the release group as returned by MusicBrainz.
+        _release_ordinal (int | None): The ordinal of the first release date or None if it is unknown or malformed.
+        _primary_type (str | None): The primary type of the release group.
+        _secondary_types (tuple[str, ...] | None): The secondary types of the release group.
+        _genres (tuple[tuple[str, int], ...]): The name and vote count of every genre of the release group.
+        _artist_credit (tuple[tuple[str, str, str | None], ...]): The credited name, artist ID and artist disambiguation of every credit.
+
     Methods:
+    from_browse_page(page): Returns the release groups of a page of the browse endpoint.
     get_id: Retrieves the ID of the release group.
     get_artist_name: Retrieves the artist name of the release group.
     get_artist_name_disambiguation: Retrieves the disambiguation of the artist name of the release group.
     get_title: Retrieves the title of the release group.
     get_title_disambiguation: Retrieves the disambiguation of the title of the release group.
-    get_genres: Retrieves the list of genres associated with the release group.
+    get_first_release_date: Retrieves the first release date of the release group.
+    get_release_ordinal: Retrieves the ordinal of the first release date of the release group.
+    get_primary_type: Retrieves the primary type of the release group.
+    get_secondary_types: Retrieves the secondary types of the release group.
+    get_artist_credit_count: Retrieves the number of artist credits of the release group.
+    get_genres: Retrieves the genres associated with the release group.
     is_album: Returns True if the release is an album, False otherwise.
     is_solo: Returns True if the release is a solo release, False otherwise.
     is_released(date): Returns True if the release has been released, False otherwise.
+    get_fingerprint: Returns a hash of the fields used for filtering and saving the release group.
+    to_dict: Returns the kept fields of the release group in the format returned by the MusicBrainz API.
     """
+    __slots__ = (
+        "_id", "_title", "_disambiguation", "_first_release_date", "_release_ordinal",
+        "_primary_type", "_secondary_types", "_genres", "_artist_credit",
+    )
+
     def __init__(self, release_data: dict):
         """
         Initializes a ReleaseGroup object with the given release data.
 
         Args:
-            _release_data (dict): The data for the release group.
+            release_data (dict): The data for the release group as returned by the MusicBrainz API.
+                A first release date that is not a valid date in the "%Y-%m-%d" or "%Y-%m" or "%Y" format, e.g. "0000",
+                is kept as returned, but the release group has no release ordinal, like a release group without a date.
+        """
+        first_release_date = release_data.get("first-release-date")
+        try:
+            release_ordinal = date_to_ordinal(first_release_date) if first_release_date else None
+        except ValueError:
+            release_ordinal = None
+        secondary_types = release_data.get("secondary-types")
+        fields = {
+            "_id": release_data["id"],
+            "_title": release_data.get("title"),
+            "_disambiguation": release_data.get("disambiguation"),
+            "_first_release_date": first_release_date,
+            "_release_ordinal": release_ordinal,
+            "_primary_type": release_data.get("primary-type"),
+            "_secondary_types": tuple(secondary_types) if secondary_types is not None else None,
+            "_genres": tuple((genre["name"], genre["count"]) for genre in release_data.get("genres", [])),
+            "_artist_credit": tuple(
+                (credit["name"], credit["artist"]["id"], credit["artist"].get("disambiguation"))
+                for credit in release_data.get("artist-credit", [])
+            ),
+        }
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @classmethod
+    def from_browse_page(cls, page: dict | bytes | str) -> list["ReleaseGroup"]:
         """
-        self._release_data = release_data
+        Returns the release groups of a page of the release group browse endpoint.
+
+        Args:
+            page (dict | bytes | str): The page, either parsed or as the JSON document.
+
+        Returns:
+            list[ReleaseGroup]: The release groups of the page.
+        """
+        if not isinstance(page, dict):
+            page = load_json(page)
+        return [cls(release_data) for release_data in page["release-groups"]]
 
     def get_id(self) -> str:
         """
@@ -35,7 +106,7 @@ class ReleaseGroup:
         Returns:
             str: The ID of the release group.
         """
-        return self._release_data["id"]
+        return self._id
 
     def get_artist_name(self) -> str:
         """
@@ -44,8 +115,8 @@ class ReleaseGroup:
         Returns:
             str: The artist name of the release group.
         """
-        return self._release_data["artist-credit"][0]["name"]
-    
+        return self._artist_credit[0][0]
+
     def get_artist_name_disambiguation(self) -> str:
         """
         Retrieves the disambiguation of the artist name of the release group.
@@ -53,8 +124,8 @@ class ReleaseGroup:
         Returns:
             str: The disambiguation of the artist name of the release group.
         """
-        return self._release_data["artist-credit"][0]["artist"]["disambiguation"]
-    
+        return self._artist_credit[0][2]
+
     def get_title(self) -> str:
         """
         Retrieves the title of the release group.
@@ -62,7 +133,7 @@ class ReleaseGroup:
         Returns:
             str: The title of the release group.
         """
-        return self._release_data["title"]
+        return self._title
 
     def get_title_disambiguation(self) -> str:
         """
@@ -71,7 +142,7 @@ class ReleaseGroup:
         Returns:
             str: The disambiguation of the title of the release group.
         """
-        return self._release_data["disambiguation"]
+        return self._disambiguation
 
     def get_first_release_date(self) -> str:
         """
@@ -80,17 +151,54 @@ class ReleaseGroup:
         Returns:
             str: The first release date of the release group in the "%Y-%m-%d" format.
         """
-        return self._release_data["first-release-date"]
-    
-    def get_genres(self) -> list[dict]:
+        return self._first_release_date
+
+    def get_release_ordinal(self) -> int | None:
+        """
+        Retrieves the ordinal of the first release date of the release group, where January 1 of year 1 is 1.
+        A date without a day or month is the first day of its month or year.
+
+        Returns:
+            int | None: The ordinal of the first release date or None if it is unknown or malformed.
+        """
+        return self._release_ordinal
+
+    def get_primary_type(self) -> str | None:
+        """
+        Retrieves the primary type of the release group.
+
+        Returns:
+            str | None: The primary type of the release group, e.g. "Album".
+        """
+        return self._primary_type
+
+    def get_secondary_types(self) -> tuple[str, ...] | None:
         """
-        Retrieves the list of genres associated with the release group.
+        Retrieves the secondary types of the release group.
 
         Returns:
-            list[dict]: The list of genres.
+            tuple[str, ...] | None: The secondary types of the release group, e.g. ("Live",).
         """
-        return self._release_data["genres"]
-    
+        return self._secondary_types
+
+    def get_artist_credit_count(self) -> int:
+        """
+        Retrieves the number of artist credits of the release group.
+
+        Returns:
+            int: The number of artist credits of the release group.
+        """
+        return len(self._artist_credit)
+
+    def get_genres(self) -> tuple[tuple[str, int], ...]:
+        """
+        Retrieves the genres associated with the release group.
+
+        Returns:
+            tuple[tuple[str, int], ...]: The name and vote count of every genre.
+        """
+        return self._genres
+
     def is_album(self) -> bool:
         """
         Returns True if the release group is an album, False otherwise.
@@ -98,7 +206,7 @@ class ReleaseGroup:
         Returns:
         bool: A boolean indicating whether the release group is an album.
         """
-        return str(self._release_data["primary-type"]).lower() == "album" and not self._release_data["secondary-types"]
+        return str(self._primary_type).lower() == "album" and not self._secondary_types
 
     def is_solo(self) -> bool:
         """
@@ -107,24 +215,63 @@ class ReleaseGroup:
         Returns:
         bool: A boolean indicating whether the release group is a solo release.
         """
-        return len(self._release_data["artist-credit"]) == 1
-    
-    def is_released(self, date: str = datetime.now().strftime("%Y-%m-%d")) -> bool:
+        return len(self._artist_credit) == 1
+
+    def is_released(self, date: str | None = None) -> bool:
         """
         Returns True if the release group has been released before the date, False otherwise.
-        
+
         Args:
-        date(str, optional): The date to check against in the "%Y-%m-%d" or "%Y-%m" or "%Y" format. Defaults to the current date.
+        date(str | None, optional): The date to check against in the "%Y-%m-%d" or "%Y-%m" or "%Y" format. Defaults to the current date.
 
         Returns:
         bool: A boolean indicating whether the release group has been released before the date.
-        
+
         Raises:
         ValueError: If the date argument is not in the "%Y-%m-%d" or "%Y-%m" or "%Y" format.
         """
-        dt_date = format_date(date)
-        frd = self._release_data["first-release-date"]
-        if not frd:
+        ordinal = date_to_ordinal(date) if date else datetime.now().toordinal()
+        if self._release_ordinal is None:
             return False
-        dt_frd = format_date(frd)
-        return dt_frd <= dt_date
\ No newline at end of file
+        return self._release_ordinal <= ordinal
+
+    def get_fingerprint(self) -> str:
+        """
+        Returns a hash of the fields used for filtering and saving the release group,
+        i.e. the title, types, first release date, genres and artist credit.
+
+        Returns:
+        str: The hex SHA-256 of the fields.
+        """
+        fields = {
+            "title": self._title,
+            "disambiguation": self._disambiguation,
+            "first-release-date": self._first_release_date,
+            "primary-type": self._primary_type,
+            "secondary-types": self._secondary_types,
+            "genres": sorted(self._genres),
+            "artist-credit": self._artist_credit,
+        }
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+    def to_dict(self) -> dict:
+        """
+        Returns the kept fields of the release group, e.g. to save it to a dataset.
+        A release group initialized with the returned dict has the same fields and fingerprint as this one.
+
+        Returns:
+        dict: The release group in the format returned by the MusicBrainz API.
+        """
+        return {
+            "id": self._id,
+            "title": self._title,
+            "disambiguation": self._disambiguation,
+            "first-release-date": self._first_release_date,
+            "primary-type": self._primary_type,
+            "secondary-types": list(self._secondary_types) if self._secondary_types is not None else None,
+            "genres": [{"name": name, "count": count} for name, count in self._genres],
+            "artist-credit": [
+                {"name": name, "artist": {"id": artist_id, "disambiguation": disambiguation}}
+                for name, artist_id, disambiguation in self._artist_credit
+            ],
+        }
@@ -0,0 +1,137 @@
+import re
+from typing import Iterable
+from musicbrainz.release_group import ReleaseGroup
+from utils.utils import date_to_ordinal
+
+
+SPEC_KEYS = {"primary_types", "secondary_types", "max_artist_credits", "released_by", "genres", "min_genre_votes"}
+
+
+class ReleaseGroupFilter:
+    """
+    Selects release groups by a declarative specification, compiled once and evaluated over whole batches of release groups.
+
+    The specification is a dict with the following optional keys, where a missing or None key does not restrict anything:
+    - "primary_types" (list[str]): The accepted primary types, case-insensitive.
+    - "secondary_types" (list[str]): The accepted secondary types, case-insensitive. A release group passes if all of its
+        secondary types are accepted, so an empty list only passes release groups without secondary types.
+    - "max_artist_credits" (int): The maximum number of artist credits, e.g. 1 for solo releases.
+        Release groups without artist credits do not pass.
+    - "released_by" (str): The last accepted first release date in the "%Y-%m-%d" or "%Y-%m" or "%Y" format.
+        Release groups without a first release date do not pass.
+    - "genres" (dict[str, list[str]]): The aliases of every genre in the order of priority. A MusicBrainz genre matches
+        a genre if its name contains one of the aliases, case-insensitive. A release group passes if one of its genres matches,
+        and is assigned the genre of its matching genre with the most votes.
+    - "min_genre_votes" (int): The minimum number of votes of a matching genre. Defaults to 1.
+
+    All aliases are compiled into one regular expression, and the genre of every distinct MusicBrainz genre name
+    is only searched for once.
+
+    Attributes:
+        _primary_types (frozenset[str] | None): The accepted primary types in lowercase.
+        _secondary_types (frozenset[str] | None): The accepted secondary types in lowercase.
+        _max_artist_credits (int | None): The maximum number of artist credits.
+        _release_ordinal (int | None): The ordinal of the last accepted first release date.
+        _genre_pattern (re.Pattern | None): The pattern of all aliases, matching at every position of a genre name.
+        _alias_genres (dict[str, tuple[int, str]]): The priority and genre of every alias in lowercase.
+        _min_genre_votes (int): The minimum number of votes of a matching genre.
+        _name_genres (dict[str, str | None]): The genre of every MusicBrainz genre name searched so far.
+
+    Methods:
+        match(release_group): Returns the genre of the release group if it passes the filter or None.
+        select(release_groups): Returns the release groups that pass the filter with their genres.
+    """
+    def __init__(self, spec: dict):
+        """
+        Initializes a ReleaseGroupFilter object, compiling the specification.
+
+        Args:
+            spec (dict): The specification of the filter.
+
+        Raises:
+            ValueError: If the specification has an unknown key, an invalid date or a genre without aliases.
+        """
+        unknown_keys = set(spec) - SPEC_KEYS
+        if unknown_keys:
+            raise ValueError(f"Unknown filter keys: {', '.join(sorted(unknown_keys))}")
+        primary_types = spec.get("primary_types")
+        secondary_types = spec.get("secondary_types")
+        released_by = spec.get("released_by")
+        self._primary_types = frozenset(t.lower() for t in primary_types) if primary_types is not None else None
+        self._secondary_types = frozenset(t.lower() for t in secondary_types) if secondary_types is not None else None
+        self._max_artist_credits = spec.get("max_artist_credits")
+        self._release_ordinal = date_to_ordinal(released_by) if released_by is not None else None
+        self._min_genre_votes = spec.get("min_genre_votes") or 1
+
+        self._alias_genres = {}
+        for genre, aliases in (spec.get("genres") or {}).items():
+            if not aliases:
+                raise ValueError(f"Genre \"{genre}\" must have at least one alias")
+            for alias in aliases:
+                self._alias_genres.setdefault(alias.lower(), (len(self._alias_genres), genre))
+        self._genre_pattern = None
+        if self._alias_genres:
+            alternatives = "|".join(re.escape(alias) for alias in self._alias_genres)
+            self._genre_pattern = re.compile(f"(?=({alternatives}))", re.IGNORECASE)
+        self._name_genres = {}
+
+    def _get_name_genre(self, name: str) -> str | None:
+        if name in self._name_genres:
+            return self._name_genres[name]
+        matches = [self._alias_genres[alias.lower()] for alias in self._genre_pattern.findall(name)]
+        genre = min(matches)[1] if matches else None
+        self._name_genres[name] = genre
+        return genre
+
+    def match(self, release_group: ReleaseGroup) -> str | None:
+        """
+        Returns the genre of the release group if it passes the filter or None.
+
+        Args:
+            release_group (ReleaseGroup): The release group.
+
+        Returns:
+            str | None: The genre of the release group, an empty string if the specification has no genres,
+                or None if the release group does not pass the filter.
+        """
+        if self._primary_types is not None and str(release_group.get_primary_type()).lower() not in self._primary_types:
+            return None
+        if self._secondary_types is not None and any(
+            t.lower() not in self._secondary_types for t in release_group.get_secondary_types() or ()
+        ):
+            return None
+        if self._max_artist_credits is not None and not 1 <= release_group.get_artist_credit_count() <= self._max_artist_credits:
+            return None
+        if self._release_ordinal is not None:
+            ordinal = release_group.get_release_ordinal()
+            if ordinal is None or ordinal > self._release_ordinal:
+                return None
+        if self._genre_pattern is None:
+            return ""
+
+        max_count = self._min_genre_votes - 1
+        max_count_genre = None
+        for name, count in release_group.get_genres():
+            if count > max_count:
+                genre = self._get_name_genre(name)
+                if genre is not None:
+                    max_count = count
+                    max_count_genre = genre
+        return max_count_genre
+
+    def select(self, release_groups: Iterable[ReleaseGroup]) -> list[tuple[ReleaseGroup, str]]:
+        """
+        Returns the release groups that pass the filter with their genres.
+
+        Args:
+            release_groups (Iterable[ReleaseGroup]): The release groups, e.g. all release groups of an artist.
+
+        Returns:
+            list[tuple[ReleaseGroup, str]]: The release groups that pass the filter in their order with their genres.
+        """
+        selected = []
+        for release_group in release_groups:
+            genre = self.match(release_group)
+            if genre is not None:
+                selected.append((release_group, genre))
+        return selected
@@ -0,0 +1,173 @@
+import os
+import time
+import sqlite3
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes the URL so equivalent URLs share a cache entry.
+
+    The scheme and host are lowercased, the fragment is dropped and the query parameters are sorted.
+
+    Args:
+        url (str): The URL to normalize.
+
+    Returns:
+        str: The normalized URL.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+def _connect(file_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(file_path, timeout=60, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "url TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, last_modified TEXT, "
+        "fetched_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)"
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+    return connection
+
+
+class ResponseCache:
+    """
+    A persistent cache of HTTP response bodies in a SQLite database, keyed by normalized URL.
+
+    Entries younger than the TTL are served without a request. Older entries are revalidated with their
+    ETag and Last-Modified headers. Once the total size of the bodies exceeds max_bytes,
+    the least recently used entries are evicted.
+
+    Attributes:
+        _ttl (float | None): The number of seconds an entry is fresh for. None keeps entries fresh forever.
+        _max_bytes (int): The maximum total size of the cached bodies.
+        _total_bytes (int): The current total size of the cached bodies.
+
+    Methods:
+        get(url): Returns the cached entry of the URL or None.
+        get_revalidation_headers(entry): Returns the conditional request headers for the entry.
+        put(url, body, headers): Caches the body of the URL with the validators from the response headers.
+        touch(url): Marks the entry of the URL as fresh again, e.g. after a 304 Not Modified response.
+        close(): Closes the cache database.
+    """
+    def __init__(self, file_path: str, ttl: float | None = 12 * 60 * 60, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Initializes a ResponseCache object, creating the cache database if it does not exist.
+
+        Args:
+            file_path (str): The path to the cache database.
+            ttl (float | None): The number of seconds an entry is fresh for. None keeps entries fresh forever.
+            max_bytes (int): The maximum total size of the cached bodies.
+        """
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._connection = _connect(file_path)
+        self._lock = threading.Lock()
+        self._total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, url: str) -> dict | None:
+        """
+        Returns the cached entry of the URL or None.
+
+        Args:
+            url (str): The URL of the request.
+
+        Returns:
+            dict | None: The entry with "body", "etag", "last_modified" and "fresh" keys or None if the URL is not cached.
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM responses WHERE url = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, key))
+        body, etag, last_modified, fetched_at = row
+        return {
+            "body": body,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": self._ttl is None or now - fetched_at < self._ttl,
+        }
+
+    def get_revalidation_headers(self, entry: dict | None) -> dict[str, str]:
+        """
+        Returns the conditional request headers for the entry.
+
+        Args:
+            entry (dict | None): The entry returned by get.
+
+        Returns:
+            dict[str, str]: The If-None-Match and If-Modified-Since headers for the validators of the entry.
+        """
+        headers = {}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url: str, body: bytes, headers: dict | None = None) -> None:
+        """
+        Caches the body of the URL with the validators from the response headers and evicts the least recently used entries
+        if the cache is over its size.
+
+        Args:
+            url (str): The URL of the request.
+            body (bytes): The response body.
+            headers (dict | None): The response headers.
+        """
+        headers = headers or {}
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            row = self._connection.execute("SELECT size FROM responses WHERE url = ?", (key,)).fetchone()
+            if row:
+                self._total_bytes -= row[0]
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, headers.get("ETag"), headers.get("Last-Modified"), now, now, len(body)),
+            )
+            self._total_bytes += len(body)
+            if self._total_bytes > self._max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        target_bytes = self._max_bytes * 0.9
+        rows = self._connection.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+        evicted_urls = []
+        for url, size in rows:
+            if self._total_bytes <= target_bytes:
+                break
+            evicted_urls.append((url,))
+            self._total_bytes -= size
+        self._connection.executemany("DELETE FROM responses WHERE url = ?", evicted_urls)
+
+    def touch(self, url: str) -> None:
+        """
+        Marks the entry of the URL as fresh again, e.g. after a 304 Not Modified response.
+
+        Args:
+            url (str): The URL of the request.
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, normalize_url(url))
+            )
+
+    def close(self) -> None:
+        """
+        Closes the cache database.
+        """
+        with self._lock:
+            self._connection.close()
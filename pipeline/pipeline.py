@@ -0,0 +1,215 @@
+import queue
+import threading
+from typing import Any, Callable, Iterable
+from utils.metrics import METRICS, measure_stage
+
+
+_END = object()
+_POLL_INTERVAL = 0.1
+
+
+class _Stopped(Exception):
+    pass
+
+
+class Stage:
+    """
+    A single pipeline stage processed by its own pool of worker threads.
+
+    Attributes:
+        name (str): The name of the stage.
+        func (Callable[[Any], Any]): Processes one item and returns the item for the next stage or None to drop it.
+            If fan_out is True, it returns an iterable of items instead.
+        workers (int): The number of worker threads of the stage.
+        fan_out (bool): Whether func returns an iterable of items instead of a single item.
+    """
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1, fan_out: bool = False):
+        """
+        Initializes a Stage object.
+
+        Args:
+            name (str): The name of the stage.
+            func (Callable[[Any], Any]): The function that processes one item.
+            workers (int): The number of worker threads of the stage.
+            fan_out (bool): Whether func returns an iterable of items instead of a single item.
+
+        Raises:
+            ValueError: If the number of workers is less than 1.
+        """
+        if workers < 1:
+            raise ValueError(f"Stage \"{name}\" must have at least 1 worker")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.fan_out = fan_out
+
+
+class Pipeline:
+    """
+    Runs items through a chain of stages connected by bounded queues.
+
+    Every stage has its own worker pool, so network-bound and CPU-bound stages overlap.
+    A full queue blocks the upstream stage, which keeps memory usage bounded.
+    The next input item is only taken from the iterable once the first stage has room for it,
+    so a lazy iterable is consumed at most prefetch items ahead of the first stage.
+    Every item is timed by stage in METRICS and profiled if the stage is enabled in PROFILER,
+    and the queue depths are sampled into METRICS while the pipeline runs.
+
+    Attributes:
+        _stages (list[Stage]): The stages in processing order.
+        _queues (list[queue.Queue]): The input queue of every stage.
+
+    Methods:
+        run(items): Feeds the items to the first stage and blocks until every stage is drained.
+        queue_depths(): Returns the current number of items waiting in front of every stage.
+    """
+    def __init__(self, stages: list[Stage], queue_size: int = 32, prefetch: int | None = None):
+        """
+        Initializes a Pipeline object.
+
+        Args:
+            stages (list[Stage]): The stages in processing order.
+            queue_size (int): The maximum number of items waiting in front of every stage after the first.
+            prefetch (int | None): The maximum number of input items waiting in front of the first stage. Defaults to queue_size.
+
+        Raises:
+            ValueError: If there are no stages or the queue size or prefetch is less than 1.
+        """
+        if not stages:
+            raise ValueError("Pipeline must have at least 1 stage")
+        if queue_size < 1:
+            raise ValueError("Queue size must be at least 1")
+        if prefetch is not None and prefetch < 1:
+            raise ValueError("Prefetch must be at least 1")
+        self._stages = stages
+        self._queues = [queue.Queue(maxsize=queue_size if i else prefetch or queue_size) for i in range(len(stages))]
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._active_workers = [stage.workers for stage in stages]
+        self._error = None
+
+    def queue_depths(self) -> dict[str, int]:
+        """
+        Returns the current number of items waiting in front of every stage.
+
+        Returns:
+            dict[str, int]: The queue depth by stage name.
+        """
+        return {stage.name: q.qsize() for stage, q in zip(self._stages, self._queues)}
+
+    def run(self, items: Iterable) -> None:
+        """
+        Feeds the items to the first stage and blocks until every stage is drained.
+
+        Args:
+            items (Iterable): The items to process.
+
+        Raises:
+            Exception: The first exception raised by any stage worker.
+        """
+        METRICS.add_collector(self._collect_metrics)
+        try:
+            self._run(items)
+        finally:
+            METRICS.remove_collector(self._collect_metrics)
+
+    def _collect_metrics(self) -> None:
+        for stage_name, depth in self.queue_depths().items():
+            METRICS.set_gauge("pipeline_queue_depth", depth, stage=stage_name)
+
+    def _run(self, items: Iterable) -> None:
+        threads = []
+        for stage_index, stage in enumerate(self._stages):
+            for worker_index in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(stage_index,),
+                    name=f"{stage.name}-{worker_index}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+        try:
+            try:
+                items = iter(items)
+                while True:
+                    self._wait_for_room(0)
+                    item = next(items, _END)
+                    if item is _END:
+                        break
+                    self._put(0, item)
+                self._put(0, _END)
+            except _Stopped:
+                pass
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(_POLL_INTERVAL)
+        except BaseException:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            raise
+        if self._error:
+            raise self._error
+
+    def _put(self, stage_index: int, item: Any) -> None:
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                self._queues[stage_index].put(item, timeout=_POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    def _wait_for_room(self, stage_index: int) -> None:
+        while self._queues[stage_index].full():
+            if self._stop.is_set():
+                raise _Stopped()
+            self._stop.wait(_POLL_INTERVAL)
+
+    def _get(self, stage_index: int) -> Any:
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                return self._queues[stage_index].get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def _emit(self, stage_index: int, item: Any) -> None:
+        if item is None or stage_index + 1 == len(self._stages):
+            return
+        self._put(stage_index + 1, item)
+
+    def _work(self, stage_index: int) -> None:
+        stage = self._stages[stage_index]
+        try:
+            while True:
+                item = self._get(stage_index)
+                if item is _END:
+                    self._put(stage_index, _END)
+                    break
+                with measure_stage(stage.name):
+                    result = stage.func(item)
+                if stage.fan_out:
+                    for output in result or ():
+                        self._emit(stage_index, output)
+                else:
+                    self._emit(stage_index, result)
+        except _Stopped:
+            return
+        except BaseException as e:
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self._stop.set()
+            return
+        with self._lock:
+            self._active_workers[stage_index] -= 1
+            last_worker = self._active_workers[stage_index] == 0
+        if last_worker and stage_index + 1 < len(self._stages):
+            try:
+                self._put(stage_index + 1, _END)
+            except _Stopped:
+                pass
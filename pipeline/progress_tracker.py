@@ -0,0 +1,59 @@
+import threading
+from typing import Callable
+
+
+class ProgressTracker:
+    """
+    Tracks the releases of every artist that are still being processed by a pipeline, possibly out of order.
+
+    Attributes:
+        _on_artist_done (Callable[[int], None]): Called with the artist index once all releases of the artist are done.
+        _pending (dict[int, int]): The number of unfinished releases by artist index, for artists that have been fetched.
+
+    Methods:
+        add_artist(artist_index, releases_count): Registers a fetched artist with the number of releases to process.
+        complete_releases(artist_indexes): Marks one release of every given artist as done.
+    """
+    def __init__(self, on_artist_done: Callable[[int], None]):
+        """
+        Initializes a ProgressTracker object.
+
+        Args:
+            on_artist_done (Callable[[int], None]): Called with the artist index once all releases of the artist are done.
+        """
+        self._on_artist_done = on_artist_done
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add_artist(self, artist_index: int, releases_count: int) -> None:
+        """
+        Registers a fetched artist with the number of releases to process.
+
+        Args:
+            artist_index (int): The index of the artist in the artists list.
+            releases_count (int): The number of releases of the artist that are passed to the next stages.
+        """
+        with self._lock:
+            self._pending[artist_index] = releases_count
+            done = releases_count == 0
+            if done:
+                del self._pending[artist_index]
+        if done:
+            self._on_artist_done(artist_index)
+
+    def complete_releases(self, artist_indexes: list[int]) -> None:
+        """
+        Marks one release of every given artist as done.
+
+        Args:
+            artist_indexes (list[int]): The artist index of every completed release.
+        """
+        done_artist_indexes = []
+        with self._lock:
+            for artist_index in artist_indexes:
+                self._pending[artist_index] -= 1
+                if self._pending[artist_index] == 0:
+                    del self._pending[artist_index]
+                    done_artist_indexes.append(artist_index)
+        for artist_index in done_artist_indexes:
+            self._on_artist_done(artist_index)
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+from musicbrainz.artist_resolver import ArtistResolver
+
+
+ARTISTS = {
+    "Artist 0": {"id": "id-0", "name": "Artist 0", "score": 100},
+    "Artist 1": {"id": "id-1", "name": "Artist 1", "score": 100},
+    "Artist 2": {"id": "id-2", "name": "Artist 2", "sort-name": "2, Artist", "score": 90},
+}
+MBID = "5B11F4CE-A62D-471E-81FC-A69A8278C7DA"
+
+
+class FakeMusicBrainzAPI:
+    """
+    A MusicBrainzAPI stand-in that serves the artists of ARTISTS and records every search.
+    """
+    def __init__(self):
+        self.searches = []
+        self.fetches = []
+
+    def search_artists(self, names: list[str]) -> list[dict]:
+        self.searches.append(list(names))
+        return [ARTISTS[name] for name in names if name in ARTISTS]
+
+    def fetch_artist(self, artist: str) -> dict:
+        self.fetches.append(artist)
+        if artist not in ARTISTS and artist != "Misspelled":
+            raise ValueError(f"No artist found for \"{artist}\"")
+        # Falls back to the first result like MusicBrainzAPI.fetch_artist does.
+        return ARTISTS.get(artist, {"id": "id-first", "name": "First result", "score": 50})
+
+
+class ArtistResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.dir_path, "artists.sqlite3")
+        self.mb = FakeMusicBrainzAPI()
+        self.resolvers = []
+
+    def tearDown(self):
+        for resolver in self.resolvers:
+            resolver.close()
+        shutil.rmtree(self.dir_path)
+
+    def _open(self, artists: list[str], **kwargs) -> ArtistResolver:
+        resolver = ArtistResolver(self.file_path, self.mb, artists, **kwargs)
+        self.resolvers.append(resolver)
+        return resolver
+
+    def test_resolves_the_next_names_in_one_search(self):
+        resolver = self._open(["Artist 0", MBID, "Artist 1", "Artist 2"], batch_size=3)
+        self.assertEqual(resolver.resolve("Artist 0"), "id-0")
+        self.assertEqual(resolver.resolve(MBID), MBID.lower())
+        self.assertEqual(resolver.resolve("Artist 1"), "id-1")
+        self.assertEqual(self.mb.searches, [["Artist 0", "Artist 1"]])
+        self.assertEqual(resolver.resolve("Artist 2"), "id-2")
+        self.assertEqual(self.mb.searches, [["Artist 0", "Artist 1"], ["Artist 2"]])
+        self.assertEqual(self.mb.fetches, [])
+
+    def test_falls_back_to_a_search_of_its_own_for_unmatched_names(self):
+        resolver = self._open(["Artist 0", "Misspelled", "Artist 1"])
+        self.assertEqual(resolver.resolve("Artist 0"), "id-0")
+        self.assertEqual(self.mb.searches, [["Artist 0", "Misspelled", "Artist 1"]])
+        self.assertEqual(resolver.resolve("Misspelled"), "id-first")
+        self.assertEqual(resolver.resolve("Artist 1"), "id-1")
+        self.assertEqual(self.mb.searches, [["Artist 0", "Misspelled", "Artist 1"]])
+        self.assertEqual(self.mb.fetches, ["Misspelled"])
+        self.assertEqual(resolver.get("Misspelled")["artist_id"], "id-first")
+
+    def test_raises_for_names_without_any_artist(self):
+        resolver = self._open(["Unknown"])
+        with self.assertRaises(ValueError):
+            resolver.resolve("Unknown")
+        self.assertIsNone(resolver.get("Unknown"))
+
+    def test_keeps_resolved_names_after_reopening(self):
+        resolver = self._open(["Artist 0", "Artist 1"])
+        self.assertEqual(resolver.resolve("Artist 0"), "id-0")
+        resolver.close()
+        resolver = self._open(["Artist 0", "Artist 1"])
+        self.assertEqual(resolver.resolve("Artist 1"), "id-1")
+        self.assertEqual(resolver.get("Artist 0")["score"], 100)
+        self.assertEqual(len(self.mb.searches), 1)
+
+    def test_searches_expired_names_again(self):
+        resolver = self._open(["Artist 0"], ttl=-1)
+        self.assertEqual(resolver.resolve("Artist 0"), "id-0")
+        self.assertIsNone(resolver.get("Artist 0"))
+        self.assertEqual(resolver.resolve("Artist 0"), "id-0")
+        self.assertEqual(len(self.mb.searches), 2)
+
+    def test_rejects_invalid_batch_sizes(self):
+        with self.assertRaises(ValueError):
+            ArtistResolver(self.file_path, self.mb, [], batch_size=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import Future
+from PIL import Image
+import main
+from managers.csv_manager import CSVManager
+from utils.cover_index import CoverIndex, perceptual_hash
+
+
+HASH = 0x0F0F0F0F0F0F0F0F
+NEAR_HASH = HASH ^ 0b11
+FAR_HASH = HASH ^ 0xFF
+
+
+class CoverIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.dir_path, "cover_index.sqlite3")
+        self.index = CoverIndex(self.file_path, max_distance=4, min_bits=8)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.dir_path)
+
+    def test_confirms_covers_with_the_same_pixels(self):
+        self.assertIsNone(self.index.find_or_add("a", "Artist", HASH, "digest", "artist/a.jpg"))
+        original = self.index.find_or_add("b", "Artist", HASH, "digest", "artist/b.jpg")
+        self.assertEqual(original["release_group_id"], "a")
+        self.assertEqual(original["storage_path"], "artist/a.jpg")
+        self.assertTrue(original["confirmed"])
+        self.assertEqual(self.index.get_duplicates(), {"b": "a"})
+
+    def test_only_matches_covers_of_the_same_artist(self):
+        self.assertIsNone(self.index.find_or_add("a", "Artist", HASH, "digest", "artist/a.jpg"))
+        self.assertIsNone(self.index.find_or_add("b", "Other", HASH, "digest", "other/b.jpg"))
+        self.assertEqual(self.index.get_duplicates(), {})
+        self.assertEqual(len(self.index), 2)
+
+    def test_returns_similar_covers_as_unconfirmed_candidates(self):
+        self.assertIsNone(self.index.find_or_add("a", "Artist", HASH, "digest-a", "artist/a.jpg"))
+        candidate = self.index.find_or_add("b", "Artist", NEAR_HASH, "digest-b", "artist/b.jpg")
+        self.assertEqual(candidate["release_group_id"], "a")
+        self.assertEqual(candidate["distance"], 2)
+        self.assertFalse(candidate["confirmed"])
+        self.assertEqual(self.index.get_duplicates(), {})
+        self.index.add("b", "Artist", NEAR_HASH, "digest-b", "artist/b.jpg", candidate)
+        self.assertEqual(self.index.get_duplicates(), {"b": "a"})
+
+    def test_does_not_match_distant_covers(self):
+        self.assertIsNone(self.index.find_or_add("a", "Artist", HASH, "digest-a", "artist/a.jpg"))
+        self.assertIsNone(self.index.find_or_add("b", "Artist", FAR_HASH, "digest-b", "artist/b.jpg"))
+
+    def test_never_matches_low_entropy_hashes(self):
+        white = perceptual_hash(Image.new("RGB", (64, 64), "white"))
+        for i in range(2):
+            self.assertIsNone(self.index.find_or_add(f"white-{i}", "Artist", white, "digest", f"artist/white-{i}.jpg"))
+        self.assertIsNone(self.index.find_or_add("a", "Artist", 0x7F, "digest-a", "artist/a.jpg"))
+        self.assertIsNone(self.index.find_or_add("b", "Artist", 0x7F, "digest-a", "artist/b.jpg"))
+        self.assertEqual(self.index.get_duplicates(), {})
+
+    def test_keeps_recorded_decisions_after_reopening(self):
+        self.assertIsNone(self.index.find_or_add("a", "Artist", HASH, "digest", "artist/a.jpg"))
+        self.assertTrue(self.index.find_or_add("b", "Artist", HASH, "digest", "artist/b.jpg")["confirmed"])
+        self.index.close()
+        self.index = CoverIndex(self.file_path, max_distance=4, min_bits=8)
+        self.assertIsNone(self.index.find_or_add("a", "Artist", HASH, "digest", "artist/a.jpg"))
+        original = self.index.find_or_add("b", "Artist", HASH, "digest", "artist/b.jpg")
+        self.assertEqual(original["release_group_id"], "a")
+        self.assertTrue(original["confirmed"])
+
+    def test_rejects_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            CoverIndex(self.file_path, max_distance=65)
+        with self.assertRaises(ValueError):
+            CoverIndex(self.file_path, min_bits=33)
+
+
+class _Sink:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, row: dict) -> None:
+        self.rows.append(dict(row))
+
+
+def _release(release_group_id: str, **kwargs) -> dict:
+    return {
+        "release_group_id": release_group_id,
+        "release_data": {"artist": "Artist", "title": f"Title {release_group_id}", "embedding": "[0.1,0.2]"},
+        **kwargs,
+    }
+
+
+class DuplicateRowTest(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.cm = CSVManager(os.path.join(self.dir_path, "db.csv"), key_fields=("release_group_id",))
+        self.sink = _Sink()
+
+    def tearDown(self):
+        self.cm.close()
+        shutil.rmtree(self.dir_path)
+
+    def test_writes_duplicates_with_the_cover_of_the_original(self):
+        src_future = Future()
+        src_future.set_result("https://covers/a.jpg")
+        main.upload_release(self.sink, self.cm, _release("a", src_future=src_future))
+        main.upload_release(self.sink, self.cm, _release("b", duplicate_of="a", src="https://covers/a.jpg"))
+        self.assertEqual([(row["release_group_id"], row["src"], row["duplicate_of"]) for row in self.sink.rows], [
+            ("a", "https://covers/a.jpg", None), ("b", "https://covers/a.jpg", "a"),
+        ])
+        self.assertEqual(self.cm.find("a")["duplicate_of"], "")
+        self.assertEqual(self.cm.find("b")["duplicate_of"], "a")
+        self.assertEqual(self.cm.find("b")["src"], "https://covers/a.jpg")
+
+    def test_does_not_save_unchanged_rows_again(self):
+        for _ in range(2):
+            main.upload_release(self.sink, self.cm, _release("b", duplicate_of="a", src="https://covers/a.jpg"))
+        self.cm.close()
+        with open(os.path.join(self.dir_path, "db.csv"), "r") as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
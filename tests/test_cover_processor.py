@@ -0,0 +1,50 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from PIL import Image
+from utils.cover_index import image_digest, perceptual_hash
+from utils.cover_processor import CoverProcessor
+
+
+def _cover(size: int = 96, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    image = Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8), "RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class CoverProcessorTest(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.cover_path = os.path.join(self.dir_path, "artist", "title.jpg")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def _assert_process_and_load_match(self, max_workers: int):
+        processor = CoverProcessor((64, 64), max_workers=max_workers)
+        image, jpeg = processor.process(self.cover_path, _cover())
+        processor.close()
+
+        processor = CoverProcessor((64, 64), max_workers=max_workers)
+        loaded_image, loaded_jpeg = processor.load(self.cover_path)
+        processor.close()
+        self.assertEqual(image.size, (64, 64))
+        self.assertEqual(loaded_jpeg, jpeg)
+        self.assertEqual(image.tobytes(), loaded_image.tobytes())
+        self.assertEqual(image_digest(image), image_digest(loaded_image))
+        self.assertEqual(perceptual_hash(image), perceptual_hash(loaded_image))
+
+    def test_load_returns_the_pixels_of_process(self):
+        self._assert_process_and_load_match(0)
+
+    def test_load_returns_the_pixels_of_process_in_the_process_pool(self):
+        self._assert_process_and_load_match(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+from managers.csv_manager import CSVManager
+
+
+def _row(i: int, title: str | None = None) -> dict:
+    return {"artist": "Artist", "title": title or f"Title {i}", "src": f"https://covers/{i}.jpg"}
+
+
+class CSVManagerIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.dir_path, "db.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def test_finds_saved_rows_by_key(self):
+        cm = CSVManager(self.file_path, key_fields=("src",))
+        cm.save(_row(0))
+        cm.save(_row(1))
+        self.assertTrue(cm.key_exists("https://covers/1.jpg"))
+        self.assertFalse(cm.key_exists("https://covers/2.jpg"))
+        self.assertEqual(cm.find("https://covers/0.jpg"), _row(0))
+        self.assertIsNone(cm.find("https://covers/2.jpg"))
+        self.assertTrue(cm.csv_data_exists(_row(1)))
+        self.assertFalse(cm.csv_data_exists(_row(1, "Other")))
+        cm.close()
+
+    def test_finds_the_latest_row_of_a_key(self):
+        cm = CSVManager(self.file_path, key_fields=("src",))
+        cm.save(_row(0))
+        cm.save(_row(0, "Changed"))
+        self.assertEqual(cm.find("https://covers/0.jpg")["title"], "Changed")
+        cm.close()
+
+    def test_rebuilds_the_index_from_the_file(self):
+        cm = CSVManager(self.file_path, key_fields=("src",))
+        cm.save(_row(0))
+        cm.save(_row(0, "Changed"))
+        cm.save(_row(1))
+        cm.close()
+        cm = CSVManager(self.file_path, key_fields=("src",))
+        self.assertEqual(cm.find("https://covers/0.jpg")["title"], "Changed")
+        self.assertTrue(cm.csv_data_exists(_row(0)))
+        self.assertTrue(cm.key_exists("https://covers/1.jpg"))
+        cm.close()
+
+    def test_finds_buffered_rows(self):
+        cm = CSVManager(self.file_path, key_fields=("src",), batch_size=100, flush_interval=60)
+        cm.save(_row(0))
+        self.assertEqual(cm.find("https://covers/0.jpg"), _row(0))
+        cm.close()
+
+    def test_saves_none_as_an_empty_cell(self):
+        cm = CSVManager(self.file_path, key_fields=("src",))
+        cm.save({**_row(0), "duplicate_of": None})
+        self.assertTrue(cm.csv_data_exists({**_row(0), "duplicate_of": None}))
+        self.assertEqual(cm.find("https://covers/0.jpg")["duplicate_of"], "")
+        cm.close()
+
+    def test_rejects_invalid_rows(self):
+        cm = CSVManager(self.file_path, key_fields=("src",))
+        with self.assertRaises(ValueError):
+            cm.save({**_row(0), "title": ""})
+        cm.save(_row(0))
+        with self.assertRaises(ValueError):
+            cm.save({**_row(1), "unknown": "value"})
+        cm.close()
+        with self.assertRaises(ValueError):
+            CSVManager(os.path.join(self.dir_path, "db.txt"))
+
+
+class CSVManagerCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.dir_path, "db.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def _read_lines(self) -> list[str]:
+        with open(self.file_path, "r") as f:
+            return f.read().splitlines()
+
+    def test_writes_complete_batches(self):
+        cm = CSVManager(self.file_path, key_fields=("src",), batch_size=3, flush_interval=60)
+        cm.save(_row(0))
+        self.assertEqual(self._read_lines(), [])
+        cm.save(_row(1))
+        self.assertEqual(len(self._read_lines()), 3)
+        cm.save(_row(2))
+        cm.close()
+        self.assertEqual(len(self._read_lines()), 4)
+        with open(f"{self.file_path}.checkpoint", "r") as f:
+            self.assertEqual(int(f.read()), os.path.getsize(self.file_path))
+
+    def test_truncates_an_incomplete_batch_to_the_last_checkpoint(self):
+        cm = CSVManager(self.file_path, key_fields=("src",))
+        cm.save(_row(0))
+        cm.close()
+        with open(self.file_path, "a") as f:
+            f.write("Artist,Title 1,https://cov")
+        cm = CSVManager(self.file_path, key_fields=("src",))
+        self.assertFalse(cm.key_exists("https://cov"))
+        cm.save(_row(1))
+        cm.close()
+        self.assertEqual(self._read_lines(), [
+            "artist,title,src", "Artist,Title 0,https://covers/0.jpg", "Artist,Title 1,https://covers/1.jpg",
+        ])
+
+    def test_keeps_a_file_without_checkpoint(self):
+        with open(self.file_path, "w") as f:
+            f.write("artist,title,src\nArtist,Title 0,https://covers/0.jpg\n")
+        cm = CSVManager(self.file_path, key_fields=("src",))
+        self.assertEqual(cm.find("https://covers/0.jpg"), _row(0))
+        cm.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+import main
+from managers.dataset_manager import DatasetManager
+from managers.journal_manager import JournalManager
+from managers.refresh_manager import RefreshManager
+from utils.services import ServiceRegistry
+
+
+def _release(i: int) -> dict:
+    return {
+        "release_group_id": f"id-{i}",
+        "fingerprint": f"fingerprint-{i}",
+        "release_data": {"artist": "Artist", "title": f"Title {i}", "year": "2000", "genre": "rock"},
+        "cover_path": f"covers/artist/title-{i}.jpg",
+    }
+
+
+class JournalManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.dir_path, ".journal.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def test_keeps_completed_stages_and_artists_after_reopening(self):
+        journal = JournalManager(self.file_path)
+        journal.complete_stage(["id-0", "id-1"], "cover")
+        journal.complete_stage("id-0", "embed")
+        journal.complete_artist("Artist")
+        journal.close()
+
+        journal = JournalManager(self.file_path)
+        self.assertTrue(journal.is_stage_done("id-0", "embed"))
+        self.assertTrue(journal.is_stage_done("id-1", "cover"))
+        self.assertFalse(journal.is_stage_done("id-1", "embed"))
+        self.assertTrue(journal.is_artist_done("Artist"))
+        self.assertFalse(journal.is_artist_done("Other"))
+        journal.delete_file()
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_resumes_from_the_unfinished_releases(self):
+        services = ServiceRegistry()
+        listings_file_path = os.path.join(self.dir_path, "listings.jsonl")
+        services.register("listings", lambda: DatasetManager(listings_file_path, "artist"))
+        services.get("listings").put({"artist": "Artist", "releases": [_release(i) for i in range(3)]})
+        refresh = RefreshManager(os.path.join(self.dir_path, "refresh.sqlite3"))
+
+        journal = JournalManager(self.file_path)
+        releases = main.fetch_command_releases(services, journal, refresh, "embed", "Artist")
+        self.assertEqual([release["release_group_id"] for release in releases], ["id-0", "id-1", "id-2"])
+        journal.complete_stage("id-1", "embed")
+        journal.close()
+
+        journal = JournalManager(self.file_path)
+        releases = main.fetch_command_releases(services, journal, refresh, "embed", "Artist")
+        self.assertEqual([release["release_group_id"] for release in releases], ["id-0", "id-2"])
+        journal.close()
+        refresh.close()
+        services.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import csv
+import time
+import shutil
+import tempfile
+import unittest
+from managers.csv_manager import merge_csv_files
+from managers.lease_manager import LeaseManager
+
+
+ARTISTS = ["Artist 0", "Artist 1", "Artist 2"]
+
+
+class LeaseManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.file_path = os.path.join(self.dir_path, "leases.sqlite3")
+        self.leases = []
+
+    def tearDown(self):
+        for leases in self.leases:
+            leases.close()
+        shutil.rmtree(self.dir_path)
+
+    def _open(self, worker_id: str, lease_duration: float = 600) -> LeaseManager:
+        leases = LeaseManager(self.file_path, worker_id, lease_duration)
+        leases.add_artists(ARTISTS)
+        self.leases.append(leases)
+        return leases
+
+    def _crash(self, leases: LeaseManager) -> None:
+        # Stops renewing the leases like a crashed worker, without freeing them.
+        leases._closed.set()
+        leases._thread.join()
+
+    def test_workers_claim_different_artists(self):
+        worker_1 = self._open("worker-1")
+        worker_2 = self._open("worker-2")
+        self.assertEqual(worker_1.claim(2), [0, 1])
+        self.assertEqual(worker_2.claim(2), [2])
+        self.assertEqual(worker_2.claim(), [])
+
+    def test_reclaims_expired_leases(self):
+        crashed = self._open("crashed", lease_duration=0.3)
+        self.assertEqual(crashed.claim(), [0])
+        self._crash(crashed)
+        worker = self._open("worker")
+        self.assertEqual(worker.claim(), [1])
+        time.sleep(0.4)
+        self.assertEqual(worker.claim(), [0])
+
+    def test_renews_held_leases(self):
+        holder = self._open("holder", lease_duration=0.3)
+        self.assertEqual(holder.claim(), [0])
+        worker = self._open("worker")
+        time.sleep(0.5)
+        self.assertEqual(worker.claim(3), [1, 2])
+
+    def test_does_not_claim_completed_artists(self):
+        worker_1 = self._open("worker-1", lease_duration=0.1)
+        self.assertEqual(worker_1.claim(), [0])
+        worker_1.complete(0)
+        self._crash(worker_1)
+        time.sleep(0.2)
+        worker_2 = self._open("worker-2")
+        self.assertEqual(worker_2.claim(3), [1, 2])
+
+    def test_close_frees_unfinished_leases(self):
+        worker_1 = LeaseManager(self.file_path, "worker-1")
+        worker_1.add_artists(ARTISTS)
+        self.assertEqual(worker_1.claim(2), [0, 1])
+        worker_1.complete(0)
+        worker_1.close()
+        worker_2 = self._open("worker-2")
+        self.assertEqual(worker_2.claim(3), [1, 2])
+
+
+class MergeCSVFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def _write(self, name: str, rows: list[list[str]]) -> str:
+        file_path = os.path.join(self.dir_path, name)
+        with open(file_path, "w", newline="") as f:
+            csv.writer(f).writerows(rows)
+        return file_path
+
+    def test_keeps_the_latest_row_by_update_time(self):
+        file_path = self._write("db.csv", [["release_group_id", "title", "updated_at"], ["a", "Main", "5"]])
+        worker_1 = self._write("db.worker-1.csv", [["release_group_id", "title", "updated_at"], ["a", "Newest", "30"], ["b", "B", "10"]])
+        worker_2 = self._write("db.worker-2.csv", [["release_group_id", "title", "updated_at"], ["a", "Older", "20"]])
+        self.assertEqual(merge_csv_files(file_path, [worker_2, worker_1], "release_group_id"), 2)
+        with open(file_path, "r", newline="") as f:
+            self.assertEqual(list(csv.reader(f)), [["release_group_id", "title", "updated_at"], ["a", "Newest", "30"], ["b", "B", "10"]])
+
+    def test_merges_rows_without_update_time_as_oldest(self):
+        file_path = self._write("db.csv", [["release_group_id", "title"], ["a", "Old"], ["b", "B"]])
+        worker = self._write("db.worker-1.csv", [["release_group_id", "title", "updated_at"], ["a", "New", "1"]])
+        merge_csv_files(file_path, [worker], "release_group_id")
+        with open(file_path, "r", newline="") as f:
+            self.assertEqual(list(csv.reader(f)), [["release_group_id", "title", "updated_at"], ["a", "New", "1"], ["b", "B", "0"]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import time
+import threading
+import unittest
+from pipeline.pipeline import Pipeline, Stage
+from pipeline.progress_tracker import ProgressTracker
+
+
+class PipelineTest(unittest.TestCase):
+    def test_processes_every_item_through_every_stage(self):
+        results = []
+        lock = threading.Lock()
+
+        def collect(item):
+            with lock:
+                results.append(item)
+
+        pipeline = Pipeline([
+            Stage("fetch", lambda i: [(i, j) for j in range(3)], fan_out=True),
+            Stage("double", lambda item: (item[0], item[1] * 2), workers=4),
+            Stage("collect", collect),
+        ], queue_size=2)
+        pipeline.run(range(10))
+        self.assertEqual(sorted(results), [(i, j * 2) for i in range(10) for j in range(3)])
+
+    def test_drops_none_results(self):
+        results = []
+        pipeline = Pipeline([
+            Stage("filter", lambda i: i if i % 2 else None, workers=2),
+            Stage("collect", results.append),
+        ])
+        pipeline.run(range(10))
+        self.assertEqual(sorted(results), [1, 3, 5, 7, 9])
+
+    def test_raises_the_first_stage_error(self):
+        def fail(i):
+            if i == 3:
+                raise RuntimeError("stage failed")
+            return i
+
+        pipeline = Pipeline([Stage("fail", fail, workers=2), Stage("sink", lambda i: None)])
+        with self.assertRaisesRegex(RuntimeError, "stage failed"):
+            pipeline.run(range(100))
+
+    def test_consumes_items_at_most_prefetch_ahead_of_the_first_stage(self):
+        pulled = []
+        started = []
+        max_ahead = []
+
+        def items():
+            for i in range(6):
+                max_ahead.append(len(pulled) - len(started))
+                pulled.append(i)
+                yield i
+
+        def fetch(i):
+            started.append(i)
+            time.sleep(0.02)
+            return [i]
+
+        pipeline = Pipeline([Stage("fetch", fetch, fan_out=True), Stage("sink", lambda i: None)], queue_size=32, prefetch=1)
+        pipeline.run(items())
+        self.assertEqual(pulled, list(range(6)))
+        # One item waits in the queue and one may have just been taken by the fetch worker.
+        self.assertLessEqual(max(max_ahead), 2)
+
+    def test_rejects_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            Pipeline([])
+        with self.assertRaises(ValueError):
+            Pipeline([Stage("a", lambda i: i)], queue_size=0)
+        with self.assertRaises(ValueError):
+            Pipeline([Stage("a", lambda i: i)], prefetch=0)
+        with self.assertRaises(ValueError):
+            Stage("a", lambda i: i, workers=0)
+
+
+class ProgressTrackerTest(unittest.TestCase):
+    def test_reports_artists_once_all_releases_are_done(self):
+        done = []
+        tracker = ProgressTracker(done.append)
+        tracker.add_artist(0, 2)
+        tracker.add_artist(1, 1)
+        tracker.complete_releases([0, 1])
+        self.assertEqual(done, [1])
+        tracker.complete_releases([0])
+        self.assertEqual(done, [1, 0])
+
+    def test_reports_artists_without_releases_immediately(self):
+        done = []
+        tracker = ProgressTracker(done.append)
+        tracker.add_artist(3, 0)
+        self.assertEqual(done, [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import random
+import unittest
+from main import RELEASE_FILTER
+from musicbrainz.extended_release_group import ExtendedReleaseGroup
+from musicbrainz.release_group import ReleaseGroup
+from musicbrainz.release_group_filter import ReleaseGroupFilter
+
+
+PRIMARY_TYPES = ["Album", "Album", "album", "EP", None]
+SECONDARY_TYPES = [None, [], [], ["Live"], ["Compilation", "Live"]]
+DATES = [None, "", "0000", "2023", "2023-12", "2023-12-31", "2024-01-01", "1999-05", "2024"]
+GENRE_NAMES = ["rock", "pop rock", "Hip Hop", "indie pop", "jazz", "r&b", "Rock and Roll", "soul", "pop"]
+
+
+def _old_match(release_group: ReleaseGroup) -> str | None:
+    # The filters of main.py before RELEASE_FILTER replaced them.
+    if not (release_group.is_album() and release_group.is_solo() and release_group.is_released("2023-12-31")):
+        return None
+    genre = ExtendedReleaseGroup(release_group).get_genre(["rock", "pop", "r&b", "hip hop"])
+    if not genre:
+        return None
+    return "hip-hop" if genre == "hip hop" else genre
+
+
+def _random_release_group(rng: random.Random, i: int) -> ReleaseGroup:
+    release_data = {
+        "id": f"id-{i}",
+        "title": f"Title {i}",
+        "primary-type": rng.choice(PRIMARY_TYPES),
+        "secondary-types": rng.choice(SECONDARY_TYPES),
+        "genres": [{"name": name, "count": rng.randint(0, 4)} for name in rng.sample(GENRE_NAMES, rng.randint(0, 4))],
+        "artist-credit": [{"name": f"Artist {j}", "artist": {"id": f"artist-{j}"}} for j in range(rng.choice([0, 1, 1, 2]))],
+    }
+    date = rng.choice(DATES)
+    if date is not None:
+        release_data["first-release-date"] = date
+    return ReleaseGroup(release_data)
+
+
+class ReleaseGroupFilterTest(unittest.TestCase):
+    def test_matches_the_old_filters(self):
+        rng = random.Random(0)
+        release_filter = ReleaseGroupFilter(RELEASE_FILTER)
+        release_groups = [_random_release_group(rng, i) for i in range(2000)]
+        matches = [release_filter.match(release_group) for release_group in release_groups]
+        self.assertEqual(matches, [_old_match(release_group) for release_group in release_groups])
+        self.assertGreater(sum(match is not None for match in matches), 50)
+        self.assertEqual(
+            release_filter.select(release_groups),
+            [(release_group, match) for release_group, match in zip(release_groups, matches) if match is not None],
+        )
+
+    def test_prefers_the_first_alias_of_a_genre_name(self):
+        release_filter = ReleaseGroupFilter(RELEASE_FILTER)
+        release_data = {
+            "id": "id", "title": "Title", "primary-type": "Album", "secondary-types": [], "first-release-date": "2000",
+            "artist-credit": [{"name": "Artist", "artist": {"id": "artist"}}],
+            "genres": [{"name": "pop rock", "count": 2}, {"name": "hip hop", "count": 2}],
+        }
+        self.assertEqual(release_filter.match(ReleaseGroup(release_data)), "rock")
+
+    def test_rejects_invalid_specifications(self):
+        with self.assertRaises(ValueError):
+            ReleaseGroupFilter({"genre": {"rock": ["rock"]}})
+        with self.assertRaises(ValueError):
+            ReleaseGroupFilter({"genres": {"rock": []}})
+        with self.assertRaises(ValueError):
+            ReleaseGroupFilter({"released_by": "2023-13-01"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import time
+import threading
+import unittest
+from managers.supabase_sink import SupabaseSink
+
+
+COLUMN_NAMES = ["artist", "title", "year", "genre", "src", "embedding"]
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self) -> "_Result":
+        return self
+
+
+class _Table:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    def upsert(self, rows: list[dict], **kwargs) -> _Result:
+        with self._client.lock:
+            if self._client.failing_upserts:
+                self._client.failing_upserts -= 1
+                raise ConnectionError("Fake upsert failure")
+            self._client.rows.extend(rows)
+            self._client.upserts.append(len(rows))
+        return _Result(rows)
+
+
+class FakeClient:
+    """
+    Records the upserts of SupabaseSink and fails the next failing_upserts of them with a ConnectionError.
+    """
+    def __init__(self, column_names: list[str]):
+        self.column_names = column_names
+        self.rows = []
+        self.upserts = []
+        self.failing_upserts = 0
+        self.lock = threading.Lock()
+
+    def rpc(self, name: str, params: dict) -> _Result:
+        return _Result(self.column_names)
+
+    def from_(self, table: str) -> _Table:
+        return _Table(self)
+
+
+def _row(i: int) -> dict:
+    return {"artist": "Artist", "title": f"Title {i}", "year": "2000", "genre": "rock", "src": f"https://covers/{i}.jpg",
+            "embedding": "[0.1,0.2]"}
+
+
+def _wait_until(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class SupabaseSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeClient(COLUMN_NAMES)
+
+    def test_writes_complete_batches(self):
+        sink = SupabaseSink(self.client, "releases", batch_size=3, flush_interval=60)
+        for i in range(7):
+            sink.add(_row(i))
+        self.assertEqual(self.client.upserts, [3, 3])
+        sink.close()
+        self.assertEqual(self.client.upserts, [3, 3, 1])
+        self.assertEqual([row["title"] for row in self.client.rows], [f"Title {i}" for i in range(7)])
+
+    def test_flushes_on_timer(self):
+        sink = SupabaseSink(self.client, "releases", batch_size=100, flush_interval=0.05)
+        sink.add(_row(0))
+        self.assertTrue(_wait_until(lambda: self.client.upserts == [1]))
+        sink.close()
+        self.assertEqual(self.client.upserts, [1])
+
+    def test_flushes_on_close(self):
+        sink = SupabaseSink(self.client, "releases", batch_size=100, flush_interval=60)
+        sink.add(_row(0))
+        sink.add(_row(1))
+        self.assertEqual(self.client.upserts, [])
+        sink.close()
+        self.assertEqual(self.client.upserts, [2])
+
+    def test_rejects_unknown_columns(self):
+        sink = SupabaseSink(self.client, "releases", batch_size=100, flush_interval=60)
+        with self.assertRaises(ValueError):
+            sink.add({**_row(0), "unknown": "value"})
+        sink.close()
+        self.assertEqual(self.client.rows, [])
+
+    def test_reraises_background_error_on_add(self):
+        sink = SupabaseSink(self.client, "releases", batch_size=100, flush_interval=0.05)
+        self.client.failing_upserts = 1
+        sink.add(_row(0))
+        self.assertTrue(_wait_until(lambda: sink._error is not None))
+        with self.assertRaises(ConnectionError):
+            sink.add(_row(1))
+        sink.add(_row(1))
+        sink.close()
+        self.assertEqual(sorted(row["title"] for row in self.client.rows), ["Title 0", "Title 1"])
+
+    def test_close_writes_buffered_rows_before_reraising(self):
+        sink = SupabaseSink(self.client, "releases", batch_size=100, flush_interval=0.05)
+        self.client.failing_upserts = 1
+        sink.add(_row(0))
+        self.assertTrue(_wait_until(lambda: sink._error is not None))
+        with self.assertRaises(ConnectionError):
+            sink.close()
+        self.assertEqual([row["title"] for row in self.client.rows], ["Title 0"])
+
+    def test_keeps_rows_of_failed_flush(self):
+        sink = SupabaseSink(self.client, "releases", batch_size=100, flush_interval=60)
+        sink.add(_row(0))
+        self.client.failing_upserts = 1
+        with self.assertRaises(ConnectionError):
+            sink.flush()
+        sink.close()
+        self.assertEqual([row["title"] for row in self.client.rows], ["Title 0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
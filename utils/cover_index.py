@@ -0,0 +1,276 @@
+import os
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from PIL import Image
+
+
+HASH_SIZE = 8
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    """
+    Returns the 64-bit difference hash of the image, which stays the same or changes in a few bits
+    when the image is resized, recompressed or slightly retouched.
+
+    Args:
+        image (Image.Image): The decoded image.
+
+    Returns:
+        int: The hash with one bit per pair of horizontally adjacent pixels of a 9x8 grayscale thumbnail.
+    """
+    thumbnail = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def image_digest(image: Image.Image) -> str:
+    """
+    Returns the digest of the pixels of the image, which is only the same for identical decoded images.
+
+    Args:
+        image (Image.Image): The decoded image.
+
+    Returns:
+        str: The hex SHA-256 of the image mode and size and the image pixels.
+    """
+    h = hashlib.sha256()
+    h.update(f"{image.mode}\0{image.width}x{image.height}\0".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def _count_bits(cover_hash: int) -> int:
+    return bin(cover_hash).count("1")
+
+
+def _connect(file_path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    columns = [column for _, column, *_ in connection.execute("PRAGMA table_info(covers)").fetchall()]
+    if columns and "digest" not in columns:
+        print(f"Rebuilding {file_path} with the artist and the digest of every cover")
+        connection.execute("DROP TABLE covers")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS covers ("
+        "release_group_id TEXT PRIMARY KEY, artist TEXT NOT NULL, hash TEXT NOT NULL, digest TEXT NOT NULL, "
+        "storage_path TEXT NOT NULL, original_id TEXT, distance INTEGER)"
+    )
+    return connection
+
+
+class CoverIndex:
+    """
+    A persistent index of the perceptual hashes of the covers, used to find near-duplicate covers,
+    e.g. of the deluxe and remastered editions of an album.
+
+    Every cover is stored either as an original or as a duplicate of an original of the same artist.
+    Only the originals of the artist are searched, with a brute-force Hamming distance over a NumPy array of their hashes.
+    A cover with the same pixels as the nearest original is a confirmed duplicate. A cover that only has a similar hash
+    is a candidate that the caller confirms, e.g. by comparing embeddings, and records with add.
+    Low-detail covers, e.g. of a single color, have hashes with almost all bits equal and never match or are matched.
+
+    Attributes:
+        max_distance (int): The maximum number of differing bits of a duplicate.
+        min_bits (int): The minimum number of set and of unset bits of a hash that is matched.
+        _connection (sqlite3.Connection): The connection to the index database.
+        _hashes (np.ndarray): The hashes of the matched originals, followed by unused capacity.
+        _ids (list[str]): The release group ID of every matched original.
+        _digests (list[str]): The digest of the cover of every matched original.
+        _storage_paths (list[str]): The storage path of the cover of every matched original.
+        _artist_rows (dict[str, list[int]]): The rows of the matched originals of every artist.
+
+    Methods:
+        find(artist, cover_hash, exclude): Returns the nearest original of the artist within max_distance or None.
+        find_or_add(release_group_id, artist, cover_hash, digest, storage_path): Returns the original the cover duplicates
+            or is a candidate duplicate of, or adds the cover as an original and returns None.
+        add(release_group_id, artist, cover_hash, digest, storage_path, original): Records the cover as a duplicate of the original
+            or as an original.
+        get_duplicates(): Returns the original of every duplicate.
+        close(): Closes the index database.
+    """
+    def __init__(self, file_path: str, max_distance: int = 4, min_bits: int = 8):
+        """
+        Initializes a CoverIndex object, creating the index database if it does not exist, and loads the originals.
+
+        Args:
+            file_path (str): The path to the index database.
+            max_distance (int): The maximum number of differing bits of a duplicate, out of 64.
+            min_bits (int): The minimum number of set and of unset bits of a hash that is matched, out of 64.
+
+        Raises:
+            ValueError: If the maximum distance is not between 0 and 64 or the minimum number of bits is not between 0 and 32.
+        """
+        if not 0 <= max_distance <= HASH_SIZE * HASH_SIZE:
+            raise ValueError(f"Maximum distance must be between 0 and {HASH_SIZE * HASH_SIZE}")
+        if not 0 <= min_bits <= HASH_SIZE * HASH_SIZE // 2:
+            raise ValueError(f"Minimum number of bits must be between 0 and {HASH_SIZE * HASH_SIZE // 2}")
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        self.max_distance = max_distance
+        self.min_bits = min_bits
+        self._connection = _connect(file_path)
+        self._lock = threading.Lock()
+        self._hashes = np.zeros(1024, dtype=np.uint64)
+        self._ids = []
+        self._digests = []
+        self._storage_paths = []
+        self._artist_rows = {}
+        rows = self._connection.execute(
+            "SELECT release_group_id, artist, hash, digest, storage_path FROM covers WHERE original_id IS NULL ORDER BY rowid"
+        ).fetchall()
+        for release_group_id, artist, cover_hash, digest, storage_path in rows:
+            self._index(release_group_id, artist, int(cover_hash, 16), digest, storage_path)
+
+    def _is_matched(self, cover_hash: int) -> bool:
+        bits = _count_bits(cover_hash)
+        return self.min_bits <= bits <= HASH_SIZE * HASH_SIZE - self.min_bits
+
+    def _index(self, release_group_id: str, artist: str, cover_hash: int, digest: str, storage_path: str) -> None:
+        if not self._is_matched(cover_hash):
+            return
+        row = len(self._ids)
+        if row == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.zeros(len(self._hashes), dtype=np.uint64)])
+        self._hashes[row] = cover_hash
+        self._ids.append(release_group_id)
+        self._digests.append(digest)
+        self._storage_paths.append(storage_path)
+        self._artist_rows.setdefault(artist, []).append(row)
+
+    def _unindex(self, release_group_id: str, artist: str) -> None:
+        rows = self._artist_rows.get(artist, [])
+        self._artist_rows[artist] = [row for row in rows if self._ids[row] != release_group_id]
+
+    def _find(self, artist: str, cover_hash: int, exclude: str | None) -> dict | None:
+        rows = [row for row in self._artist_rows.get(artist, []) if self._ids[row] != exclude]
+        if not rows or not self._is_matched(cover_hash):
+            return None
+        differences = self._hashes[rows] ^ np.uint64(cover_hash)
+        distances = POPCOUNT[differences.view(np.uint8)].reshape(len(rows), 8).sum(axis=1)
+        index = int(distances.argmin())
+        if distances[index] > self.max_distance:
+            return None
+        row = rows[index]
+        return {
+            "release_group_id": self._ids[row],
+            "storage_path": self._storage_paths[row],
+            "distance": int(distances[index]),
+            "digest": self._digests[row],
+        }
+
+    def _add(self, release_group_id: str, artist: str, cover_hash: int, digest: str, storage_path: str,
+             original: dict | None) -> None:
+        self._unindex(release_group_id, artist)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO covers VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                release_group_id, artist, f"{cover_hash:016x}", digest, storage_path,
+                original["release_group_id"] if original else None, original["distance"] if original else None,
+            ),
+        )
+        if not original:
+            self._index(release_group_id, artist, cover_hash, digest, storage_path)
+
+    def find(self, artist: str, cover_hash: int, exclude: str | None = None) -> dict | None:
+        """
+        Returns the nearest original of the artist within max_distance or None.
+
+        Args:
+            artist (str): The name of the artist of the cover.
+            cover_hash (int): The hash returned by perceptual_hash.
+            exclude (str | None): The ID of a release group that is not returned, e.g. the one of the cover itself.
+
+        Returns:
+            dict | None: The "release_group_id", "storage_path", "distance" and "digest" of the original
+                or None if there is none or the hash is not matched.
+        """
+        with self._lock:
+            return self._find(artist, cover_hash, exclude)
+
+    def find_or_add(self, release_group_id: str, artist: str, cover_hash: int, digest: str, storage_path: str) -> dict | None:
+        """
+        Returns the original the cover duplicates or is a candidate duplicate of, or adds the cover as an original and returns None.
+
+        A cover recorded before with the same digest keeps its recorded status, so every run makes the same decision.
+        A release group that is already an original stays one, with its hash updated.
+        A cover with the same digest as the nearest original is recorded as its duplicate and returned with "confirmed" set.
+        Otherwise the nearest original is returned as a candidate without "confirmed" and nothing is recorded until add is called.
+        The lookup and the insert happen under one lock, so of two concurrent exact duplicates exactly one becomes the original.
+
+        Args:
+            release_group_id (str): The ID of the release group.
+            artist (str): The name of the artist of the cover.
+            cover_hash (int): The hash returned by perceptual_hash.
+            digest (str): The digest returned by image_digest.
+            storage_path (str): The path to the cover in the bucket.
+
+        Returns:
+            dict | None: The original returned by find with a "confirmed" key or None if the cover is an original.
+        """
+        with self._lock:
+            recorded = self._connection.execute(
+                "SELECT c.digest, c.original_id, c.distance, o.storage_path, o.digest FROM covers c "
+                "LEFT JOIN covers o ON o.release_group_id = c.original_id WHERE c.release_group_id = ?",
+                (release_group_id,),
+            ).fetchone()
+            if recorded:
+                recorded_digest, original_id, distance, original_storage_path, original_digest = recorded
+                if original_id is None:
+                    self._add(release_group_id, artist, cover_hash, digest, storage_path, None)
+                    return None
+                if recorded_digest == digest and original_storage_path is not None:
+                    return {
+                        "release_group_id": original_id, "storage_path": original_storage_path, "distance": distance,
+                        "digest": original_digest, "confirmed": True,
+                    }
+            original = self._find(artist, cover_hash, release_group_id)
+            if not original:
+                self._add(release_group_id, artist, cover_hash, digest, storage_path, None)
+                return None
+            if original["digest"] != digest:
+                return {**original, "confirmed": False}
+            self._add(release_group_id, artist, cover_hash, digest, storage_path, original)
+            return {**original, "confirmed": True}
+
+    def add(self, release_group_id: str, artist: str, cover_hash: int, digest: str, storage_path: str,
+            original: dict | None = None) -> None:
+        """
+        Records the cover as a duplicate of the original or as an original, e.g. once a candidate has been confirmed or rejected.
+
+        Args:
+            release_group_id (str): The ID of the release group.
+            artist (str): The name of the artist of the cover.
+            cover_hash (int): The hash returned by perceptual_hash.
+            digest (str): The digest returned by image_digest.
+            storage_path (str): The path to the cover in the bucket.
+            original (dict | None): The original returned by find_or_add or None to record the cover as an original.
+        """
+        with self._lock:
+            self._add(release_group_id, artist, cover_hash, digest, storage_path, original)
+
+    def get_duplicates(self) -> dict[str, str]:
+        """
+        Returns the original of every duplicate.
+
+        Returns:
+            dict[str, str]: The release group ID of the original by the release group ID of the duplicate.
+        """
+        with self._lock:
+            return dict(self._connection.execute(
+                "SELECT release_group_id, original_id FROM covers WHERE original_id IS NOT NULL"
+            ).fetchall())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(rows) for rows in self._artist_rows.values())
+
+    def close(self) -> None:
+        """
+        Closes the index database.
+        """
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,106 @@
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image
+from utils.utils import decode_cover, encode_cover, write_file_atomic
+from utils.metrics import METRICS
+
+
+def _process_cover(cover: bytes, resolution: tuple, encode: bool = True) -> tuple[tuple[int, int], bytes, bytes | None]:
+    image = decode_cover(cover, resolution)
+    if not encode:
+        return image.size, image.tobytes(), None
+    jpeg = encode_cover(image)
+    image = decode_cover(jpeg, resolution)
+    return image.size, image.tobytes(), jpeg
+
+
+class CoverProcessor:
+    """
+    Decodes, resizes and encodes cover art once per cover, using a process pool to run on all cores.
+
+    The decoded image is returned for embedding and the encoded JPEG for uploading,
+    while the JPEG is written to disk in the background. The returned image is decoded from the written JPEG,
+    so process and load return the same pixels and hashes of the pixels stay the same across runs.
+
+    Attributes:
+        _resolution (tuple): The width and height of the processed covers.
+        _process_executor (ProcessPoolExecutor | None): The pool that decodes covers or None to decode them in the calling thread.
+        _write_executor (ThreadPoolExecutor): The pool that writes covers to disk.
+
+    Methods:
+        process(cover_path, cover): Decodes the cover, starts writing it to the cover path and returns the image and the JPEG content.
+        load(cover_path): Decodes a cover saved by process and returns the image and the JPEG content.
+        close(): Waits for the pending writes and stops the pools.
+    """
+    def __init__(self, resolution: tuple = (1024, 1024), max_workers: int | None = None, write_workers: int = 2):
+        """
+        Initializes a CoverProcessor object.
+
+        Args:
+            resolution (tuple): The width and height of the processed covers.
+            max_workers (int | None): The number of decoding processes. None uses all cores, 0 decodes in the calling thread.
+            write_workers (int): The number of threads that write covers to disk.
+        """
+        self._resolution = resolution
+        self._process_executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers != 0 else None
+        self._write_executor = ThreadPoolExecutor(max_workers=write_workers, thread_name_prefix="cover-writer")
+        self._writes = set()
+
+    def process(self, cover_path: str, cover: bytes) -> tuple[Image.Image, bytes]:
+        """
+        Decodes the cover, starts writing it to the cover path and returns the image and the JPEG content.
+
+        Args:
+            cover_path (str): The path to save the cover art.
+            cover (bytes): The downloaded content of the cover art.
+
+        Returns:
+            tuple[Image.Image, bytes]: The RGB image decoded from the JPEG content and the JPEG content.
+        """
+        with METRICS.timer("cover_decode_seconds"):
+            if self._process_executor:
+                size, pixels, jpeg = self._process_executor.submit(_process_cover, cover, self._resolution).result()
+            else:
+                size, pixels, jpeg = _process_cover(cover, self._resolution)
+        image = Image.frombytes("RGB", size, pixels)
+        self._write(cover_path, jpeg)
+        return image, jpeg
+
+    def load(self, cover_path: str) -> tuple[Image.Image, bytes]:
+        """
+        Decodes a cover saved by process and returns the image and the JPEG content.
+
+        Args:
+            cover_path (str): The path to the saved cover art.
+
+        Returns:
+            tuple[Image.Image, bytes]: The decoded RGB image and the unchanged JPEG content of the file.
+        """
+        with open(cover_path, "rb") as f:
+            jpeg = f.read()
+        with METRICS.timer("cover_decode_seconds"):
+            if self._process_executor:
+                size, pixels, _ = self._process_executor.submit(_process_cover, jpeg, self._resolution, False).result()
+                return Image.frombytes("RGB", size, pixels), jpeg
+            return decode_cover(jpeg, self._resolution), jpeg
+
+    def _write(self, cover_path: str, jpeg: bytes) -> None:
+        future = self._write_executor.submit(write_file_atomic, cover_path, jpeg)
+        self._writes.add(future)
+        future.add_done_callback(self._on_write_done)
+
+    def _on_write_done(self, future: Future) -> None:
+        if future.exception() is None:
+            self._writes.discard(future)
+
+    def close(self) -> None:
+        """
+        Waits for the pending writes and stops the pools.
+
+        Raises:
+            Exception: The error of the first failed write.
+        """
+        self._write_executor.shutdown(wait=True)
+        if self._process_executor:
+            self._process_executor.shutdown(wait=True)
+        for future in self._writes:
+            future.result()
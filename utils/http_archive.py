@@ -0,0 +1,290 @@
+import io
+import time
+import zlib
+import json
+import random
+import sqlite3
+import hashlib
+import threading
+from urllib.parse import urlsplit
+from requests import PreparedRequest, Response, Session
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive", "set-cookie"}
+
+
+def _hash_body(body: bytes | str | None) -> str:
+    if body is None:
+        body = b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return hashlib.sha256(body).hexdigest()
+
+
+def _get_path(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.path or '/'}?{parts.query}" if parts.query else parts.path or "/"
+
+
+def filter_response_headers(headers: dict) -> dict[str, str]:
+    """
+    Drops the response headers that describe the transfer rather than the content, and cookies.
+
+    Args:
+        headers (dict): The response headers.
+
+    Returns:
+        dict[str, str]: The headers that are recorded and replayed.
+    """
+    return {name: value for name, value in headers.items() if name.lower() not in SKIPPED_HEADERS}
+
+
+class ReplayPolicy:
+    """
+    Decides the latency and the injected errors of replayed responses.
+
+    Attributes:
+        _latency (float | None): The latency of every response in seconds. None replays the recorded latency.
+        _error_rate (float): The probability of replacing a response with an error.
+        _error_status (int): The status code of the injected errors.
+        _random (random.Random): The random number generator, seeded for reproducible runs.
+
+    Methods:
+        wait(recorded_elapsed): Sleeps for the latency of a response.
+        should_fail(): Returns True if the response should be replaced with an error, False otherwise.
+    """
+    def __init__(self, latency: float | None = None, error_rate: float = 0.0, error_status: int = 503, seed: int | None = None):
+        """
+        Initializes a ReplayPolicy object.
+
+        Args:
+            latency (float | None): The latency of every response in seconds. None replays the recorded latency.
+            error_rate (float): The probability of replacing a response with an error.
+            error_status (int): The status code of the injected errors.
+            seed (int | None): The seed of the random number generator. None seeds it randomly.
+
+        Raises:
+            ValueError: If the error rate is not between 0 and 1.
+        """
+        if not 0.0 <= error_rate <= 1.0:
+            raise ValueError("Error rate must be between 0 and 1")
+        self._latency = latency
+        self._error_rate = error_rate
+        self._error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def error_status(self) -> int:
+        return self._error_status
+
+    def wait(self, recorded_elapsed: float) -> None:
+        """
+        Sleeps for the latency of a response.
+
+        Args:
+            recorded_elapsed (float): The recorded latency of the response in seconds.
+        """
+        latency = recorded_elapsed if self._latency is None else self._latency
+        if latency > 0:
+            time.sleep(latency)
+
+    def should_fail(self) -> bool:
+        """
+        Returns True if the response should be replaced with an error, False otherwise.
+
+        Returns:
+            bool: A boolean indicating whether to inject an error.
+        """
+        with self._lock:
+            return self._random.random() < self._error_rate
+
+
+class HTTPArchive:
+    """
+    Stores recorded HTTP exchanges in a SQLite database.
+
+    Exchanges are keyed by method, URL and the SHA-256 of the request body, and the latest recording of a key wins.
+    Response bodies are compressed with zlib and stored once per distinct content, so repeated covers and pages take no extra space.
+    Request headers are never stored, so API keys do not end up in the archive.
+
+    Attributes:
+        _file_path (str): The path to the archive database.
+
+    Methods:
+        record(method, url, request_body, status, headers, body, elapsed): Stores an exchange.
+        find(method, url, request_body): Returns the recorded response of the request or None.
+        close(): Closes the archive database.
+    """
+    def __init__(self, file_path: str):
+        """
+        Initializes an HTTPArchive object, creating the archive database if it does not exist.
+
+        Args:
+            file_path (str): The path to the archive database.
+        """
+        self._file_path = file_path
+        self._connection = sqlite3.connect(file_path, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS exchanges ("
+            "method TEXT NOT NULL, url TEXT NOT NULL, path TEXT NOT NULL, request_hash TEXT NOT NULL, "
+            "status INTEGER NOT NULL, headers TEXT NOT NULL, body_hash TEXT NOT NULL, elapsed REAL NOT NULL, "
+            "recorded_at REAL NOT NULL, PRIMARY KEY (method, url, request_hash))"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS exchanges_path ON exchanges (method, path)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS bodies (hash TEXT PRIMARY KEY, content BLOB NOT NULL)")
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def record(self, method: str, url: str, request_body: bytes | str | None, status: int, headers: dict,
+               body: bytes, elapsed: float) -> None:
+        """
+        Stores an exchange, replacing an earlier recording of the same request.
+
+        Args:
+            method (str): The request method.
+            url (str): The request URL.
+            request_body (bytes | str | None): The request body.
+            status (int): The response status code.
+            headers (dict): The response headers.
+            body (bytes): The decoded response body.
+            elapsed (float): The time between sending the request and receiving the response headers in seconds.
+        """
+        body_hash = hashlib.sha256(body).hexdigest()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO bodies VALUES (?, ?)", (body_hash, zlib.compress(body))
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO exchanges VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (method.upper(), url, _get_path(url), _hash_body(request_body), status,
+                 json.dumps(filter_response_headers(headers)), body_hash, elapsed, time.time()),
+            )
+
+    def find(self, method: str, url: str, request_body: bytes | str | None = None) -> dict | None:
+        """
+        Returns the recorded response of the request or None.
+
+        The exchange with the same request body is preferred. If there is none, the latest exchange of the method and URL is returned,
+        because multipart bodies differ between runs. A URL that is only a path matches recordings of any host.
+
+        Args:
+            method (str): The request method.
+            url (str): The request URL or path.
+            request_body (bytes | str | None): The request body.
+
+        Returns:
+            dict | None: The response with "status", "headers", "body" and "elapsed" keys or None if the request was not recorded.
+        """
+        column = "path" if url.startswith("/") else "url"
+        query = (
+            "SELECT status, headers, content, elapsed FROM exchanges JOIN bodies ON bodies.hash = exchanges.body_hash "
+            f"WHERE method = ? AND {column} = ? ORDER BY request_hash = ? DESC, recorded_at DESC LIMIT 1"
+        )
+        with self._lock:
+            row = self._connection.execute(query, (method.upper(), url, _hash_body(request_body))).fetchone()
+        if row is None:
+            return None
+        status, headers, content, elapsed = row
+        return {"status": status, "headers": json.loads(headers), "body": zlib.decompress(content), "elapsed": elapsed}
+
+    def close(self) -> None:
+        """
+        Closes the archive database.
+        """
+        with self._lock:
+            self._connection.close()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    A transport adapter that sends requests over the network and records every exchange in an archive.
+
+    Streamed responses are read in full before they are returned, and iterating over them yields the recorded content.
+    """
+    def __init__(self, archive: HTTPArchive, **kwargs):
+        """
+        Initializes a RecordingAdapter object.
+
+        Args:
+            archive (HTTPArchive): The archive to record the exchanges in.
+            **kwargs: Additional keyword arguments for HTTPAdapter.
+        """
+        super().__init__(**kwargs)
+        self._archive = archive
+
+    def send(self, request: PreparedRequest, **kwargs) -> Response:
+        response = super().send(request, **kwargs)
+        body = response.content
+        self._archive.record(request.method, request.url, request.body, response.status_code, response.headers,
+                             body, response.elapsed.total_seconds())
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    A transport adapter that serves requests from an archive without any network access.
+
+    Requests missing from the archive get a 404 response. The latency and injected errors follow the replay policy.
+    """
+    def __init__(self, archive: HTTPArchive, policy: ReplayPolicy | None = None):
+        """
+        Initializes a ReplayAdapter object.
+
+        Args:
+            archive (HTTPArchive): The archive to serve the responses from.
+            policy (ReplayPolicy | None): The latency and error policy. None replays the recorded latency without errors.
+        """
+        super().__init__()
+        self._archive = archive
+        self._policy = policy or ReplayPolicy()
+
+    def send(self, request: PreparedRequest, stream: bool = False, **kwargs) -> Response:
+        recorded = self._archive.find(request.method, request.url, request.body)
+        if recorded is None:
+            recorded = {"status": 404, "headers": {}, "body": b"Not recorded", "elapsed": 0.0}
+        elif self._policy.should_fail():
+            recorded = {"status": self._policy.error_status, "headers": {}, "body": b"Injected error", "elapsed": recorded["elapsed"]}
+        self._policy.wait(recorded["elapsed"])
+
+        response = Response()
+        response.status_code = recorded["status"]
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(recorded["body"])
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        if not stream:
+            response.content
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def mount_archive(session: Session, archive: HTTPArchive, mode: str, policy: ReplayPolicy | None = None) -> None:
+    """
+    Mounts a recording or replaying adapter for all HTTP and HTTPS requests of the session.
+
+    Args:
+        session (Session): The session to mount the adapter on.
+        archive (HTTPArchive): The archive to record in or replay from.
+        mode (str): "record" or "replay".
+        policy (ReplayPolicy | None): The latency and error policy of the replay mode.
+
+    Raises:
+        ValueError: If the mode is not "record" or "replay".
+    """
+    if mode == "record":
+        adapter = RecordingAdapter(archive)
+    elif mode == "replay":
+        adapter = ReplayAdapter(archive, policy)
+    else:
+        raise ValueError(f"Mode \"{mode}\" must be \"record\" or \"replay\"")
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
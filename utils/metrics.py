@@ -0,0 +1,418 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+
+PREFIX = "ingestor_"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _estimate_quantile(counts: list[int], count: int, quantile: float) -> float | None:
+    if not count:
+        return None
+    rank = quantile * count
+    cumulative = 0
+    for bound, bucket_count in zip(BUCKETS, counts):
+        cumulative += bucket_count
+        if cumulative >= rank:
+            return bound if bound != float("inf") else BUCKETS[-2]
+    return BUCKETS[-2]
+
+
+def _write_text_atomic(file_path: str, text: str) -> None:
+    if os.path.dirname(file_path):
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_file_path = f"{file_path}.tmp"
+    with open(tmp_file_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_file_path, file_path)
+
+
+class Metrics:
+    """
+    Keeps counters, gauges and latency histograms by name and labels.
+
+    Every update takes a single lock, so the metrics can be updated from any thread at the cost of a dictionary lookup.
+    Collectors are called before every snapshot to refresh gauges that are sampled rather than updated, like queue depths.
+
+    Methods:
+        increment(name, value, **labels): Adds the value to a counter.
+        set_gauge(name, value, **labels): Sets a gauge to the value.
+        observe(name, seconds, **labels): Adds the duration to a histogram.
+        timer(name, **labels): Returns a context manager that adds its duration to a histogram.
+        add_collector(collector): Registers a function that is called before every snapshot.
+        remove_collector(collector): Unregisters a collector.
+        snapshot(): Returns all metrics as a dictionary.
+        to_prometheus(): Returns all metrics in the Prometheus text format.
+    """
+    def __init__(self):
+        """
+        Initializes an empty Metrics object.
+        """
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """
+        Adds the value to a counter.
+
+        Args:
+            name (str): The name of the counter.
+            value (float): The value to add.
+            **labels (str): The labels of the counter.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        """
+        Sets a gauge to the value.
+
+        Args:
+            name (str): The name of the gauge.
+            value (float): The value of the gauge.
+            **labels (str): The labels of the gauge.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        """
+        Adds the duration to a histogram.
+
+        Args:
+            name (str): The name of the histogram.
+            seconds (float): The duration in seconds.
+            **labels (str): The labels of the histogram.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        bucket_index = next(i for i, bound in enumerate(BUCKETS) if seconds <= bound)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"counts": [0] * len(BUCKETS), "count": 0, "sum": 0.0}
+            histogram["counts"][bucket_index] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """
+        Returns a context manager that adds its duration to a histogram, also when the body raises.
+
+        Args:
+            name (str): The name of the histogram.
+            **labels (str): The labels of the histogram.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """
+        Registers a function that is called before every snapshot.
+
+        Args:
+            collector (Callable[[], None]): The function that refreshes sampled gauges.
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]) -> None:
+        """
+        Unregisters a collector.
+
+        Args:
+            collector (Callable[[], None]): The registered function.
+        """
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def _collect(self) -> tuple[dict, dict, dict]:
+        with self._lock:
+            collectors = list(self._collectors)
+        for collector in collectors:
+            collector()
+        with self._lock:
+            histograms = {
+                key: {"counts": list(histogram["counts"]), "count": histogram["count"], "sum": histogram["sum"]}
+                for key, histogram in self._histograms.items()
+            }
+            return dict(self._counters), dict(self._gauges), histograms
+
+    def snapshot(self) -> dict:
+        """
+        Returns all metrics as a dictionary with estimated p50 and p99 latencies of every histogram.
+
+        Returns:
+            dict: The "counters", "gauges" and "histograms" lists, each entry with "name", "labels" and its values.
+        """
+        counters, gauges, histograms = self._collect()
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters.items()],
+            "gauges": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in gauges.items()],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram["count"],
+                    "sum": round(histogram["sum"], 6),
+                    "p50": _estimate_quantile(histogram["counts"], histogram["count"], 0.5),
+                    "p99": _estimate_quantile(histogram["counts"], histogram["count"], 0.99),
+                }
+                for (name, labels), histogram in histograms.items()
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Returns all metrics in the Prometheus text format, with every name prefixed by "ingestor_".
+
+        Returns:
+            str: The metrics for the node exporter textfile collector.
+        """
+        counters, gauges, histograms = self._collect()
+        lines = []
+        for kind, values in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in values}):
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                for (metric_name, labels), value in sorted(values.items()):
+                    if metric_name == name:
+                        lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for (metric_name, labels), histogram in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram["counts"]):
+                    cumulative += count
+                    bucket_labels = _format_labels(labels, f'le="{_format_bound(bound)}"')
+                    lines.append(f"{PREFIX}{name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram['sum']}")
+                lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    Periodically writes the metrics to a Prometheus textfile and appends them to a JSONL file from a background thread.
+
+    The textfile is replaced atomically, so the node exporter never reads a partial file.
+    Every JSONL line is a timestamped snapshot, so rates and ETAs can be computed from consecutive lines.
+
+    Attributes:
+        _metrics (Metrics): The metrics to export.
+        _interval (float): The number of seconds between exports.
+        _textfile_path (str | None): The path to the Prometheus textfile or None to skip it.
+        _jsonl_path (str | None): The path to the JSONL file or None to skip it.
+
+    Methods:
+        export(): Writes the metrics immediately.
+        close(): Stops the background thread and writes the metrics one last time.
+    """
+    def __init__(self, metrics: "Metrics", interval: float = 15.0, textfile_path: str | None = None, jsonl_path: str | None = None):
+        """
+        Initializes a MetricsExporter object and starts the background thread.
+
+        Args:
+            metrics (Metrics): The metrics to export.
+            interval (float): The number of seconds between exports.
+            textfile_path (str | None): The path to the Prometheus textfile or None to skip it.
+            jsonl_path (str | None): The path to the JSONL file or None to skip it.
+        """
+        self._metrics = metrics
+        self._interval = interval
+        self._textfile_path = textfile_path
+        self._jsonl_path = jsonl_path
+        self._started_at = time.time()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            try:
+                self.export()
+            except Exception as e:
+                print(f"Failed to export metrics: {e}")
+
+    def export(self) -> None:
+        """
+        Writes the metrics immediately.
+        """
+        if self._textfile_path:
+            _write_text_atomic(self._textfile_path, self._metrics.to_prometheus())
+        if self._jsonl_path:
+            if os.path.dirname(self._jsonl_path):
+                os.makedirs(os.path.dirname(self._jsonl_path), exist_ok=True)
+            now = time.time()
+            line = {"timestamp": round(now, 3), "uptime": round(now - self._started_at, 3), **self._metrics.snapshot()}
+            with open(self._jsonl_path, "a") as f:
+                f.write(json.dumps(line) + "\n")
+
+    def close(self) -> None:
+        """
+        Stops the background thread and writes the metrics one last time.
+        """
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.export()
+
+
+class StageProfiler:
+    """
+    Profiles the calls of selected stages with cProfile or pyinstrument. Profiling is off until enable is called.
+
+    pyinstrument only profiles the thread that started it, so every thread gets its own pyinstrument profiler per stage
+    and writes "<stage>-<thread>.html" on close.
+    Since Python 3.12, only one cProfile profiler can be active in a process, so every stage has one cProfile profiler,
+    and the profiled stage bodies run one at a time. A body of another profiled stage waits until the running one is done.
+    On close, the results of every stage are written to "<stage>.prof".
+    A stage body profiled inside another one, in the same thread, is part of the outer profile.
+
+    Methods:
+        enable(stages, dir_path, backend): Starts profiling the stages.
+        profile(stage): Returns a context manager that profiles its body if the stage is enabled.
+        close(): Writes the results of the enabled stages.
+    """
+    def __init__(self):
+        """
+        Initializes a disabled StageProfiler object.
+        """
+        self._stages = set()
+        self._dir_path = None
+        self._backend = "cprofile"
+        self._profilers = {}
+        self._lock = threading.Lock()
+        self._cprofile_lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, stages: list[str], dir_path: str, backend: str = "cprofile") -> None:
+        """
+        Starts profiling the stages.
+
+        Args:
+            stages (list[str]): The names of the stages to profile.
+            dir_path (str): The directory the results are written to.
+            backend (str): "cprofile" or "pyinstrument".
+
+        Raises:
+            ValueError: If the backend is not "cprofile" or "pyinstrument".
+            ImportError: If the backend is "pyinstrument" and it is not installed.
+        """
+        if backend not in ("cprofile", "pyinstrument"):
+            raise ValueError(f"Profiler backend \"{backend}\" must be \"cprofile\" or \"pyinstrument\"")
+        if backend == "pyinstrument":
+            import pyinstrument # noqa: F401
+        with self._lock:
+            self._stages = set(stages)
+            self._dir_path = dir_path
+            self._backend = backend
+
+    def _get_profiler(self, stage: str):
+        key = (stage, threading.current_thread().name if self._backend == "pyinstrument" else None)
+        with self._lock:
+            profiler = self._profilers.get(key)
+            if profiler is None:
+                if self._backend == "pyinstrument":
+                    from pyinstrument import Profiler
+                    profiler = Profiler()
+                else:
+                    profiler = cProfile.Profile()
+                self._profilers[key] = profiler
+            return profiler
+
+    @contextmanager
+    def profile(self, stage: str) -> Iterator[None]:
+        """
+        Returns a context manager that profiles its body if the stage is enabled.
+
+        Args:
+            stage (str): The name of the stage.
+        """
+        if stage not in self._stages or getattr(self._local, "profiling", False):
+            yield
+            return
+        profiler = self._get_profiler(stage)
+        self._local.profiling = True
+        try:
+            if self._backend == "pyinstrument":
+                profiler.start()
+                try:
+                    yield
+                finally:
+                    profiler.stop()
+            else:
+                with self._cprofile_lock:
+                    profiler.enable()
+                    try:
+                        yield
+                    finally:
+                        profiler.disable()
+        finally:
+            self._local.profiling = False
+
+    def close(self) -> None:
+        """
+        Writes the results of the enabled stages.
+        """
+        with self._lock:
+            profilers = dict(self._profilers)
+            self._profilers = {}
+        if not profilers:
+            return
+        os.makedirs(self._dir_path, exist_ok=True)
+        stats = {}
+        for (stage, thread_name), profiler in profilers.items():
+            if self._backend == "pyinstrument":
+                _write_text_atomic(os.path.join(self._dir_path, f"{stage}-{thread_name}.html"), profiler.output_html())
+            elif stage in stats:
+                stats[stage].add(profiler)
+            else:
+                stats[stage] = pstats.Stats(profiler)
+        for stage, stage_stats in stats.items():
+            stage_stats.dump_stats(os.path.join(self._dir_path, f"{stage}.prof"))
+
+
+METRICS = Metrics()
+PROFILER = StageProfiler()
+
+
+@contextmanager
+def measure_stage(stage: str) -> Iterator[None]:
+    """
+    Returns a context manager that times its body in the "pipeline_stage_seconds" histogram of METRICS
+    and profiles it if the stage is enabled in PROFILER.
+
+    Args:
+        stage (str): The name of the stage.
+    """
+    with METRICS.timer("pipeline_stage_seconds", stage=stage), PROFILER.profile(stage):
+        yield
@@ -0,0 +1,281 @@
+import time
+import asyncio
+import sqlite3
+import threading
+from typing import Callable
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    A token bucket that limits the rate of requests and is safe to share between threads and asyncio tasks.
+
+    Callers reserve a token under a short lock and then sleep outside of it,
+    so waiting callers are served in order and the lock is never held while sleeping.
+
+    Attributes:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens, i.e. the allowed burst size.
+
+    Methods:
+        reserve(): Takes a token and returns how long to wait before using it.
+        acquire(): Blocks the current thread until a token is available.
+        acquire_async(): Suspends the current task until a token is available.
+    """
+    def __init__(self, rate: float, capacity: float = 1):
+        """
+        Initializes a TokenBucket object.
+
+        Args:
+            rate (float): The number of tokens added per second.
+            capacity (float): The maximum number of tokens, i.e. the allowed burst size.
+
+        Raises:
+            ValueError: If the rate or the capacity is not positive.
+        """
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("Rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns how long to wait before using it.
+
+        Returns:
+            float: The number of seconds to wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        """
+        Blocks the current thread until a token is available.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """
+        Suspends the current task until a token is available.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops handing out tokens for the given number of seconds, e.g. after a Retry-After response.
+
+        Args:
+            seconds (float): The number of seconds to pause for.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A token bucket kept in a SQLite database, so it is shared by processes on one or more hosts with a common filesystem.
+
+    The bucket state is read and updated in one immediate transaction per reservation.
+    Hosts should have synchronized clocks, since the refill is based on the wall-clock time.
+
+    Attributes:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens, i.e. the allowed burst size.
+        _file_path (str): The path to the SQLite database.
+        _name (str): The name of the bucket in the database.
+    """
+    def __init__(self, file_path: str, name: str, rate: float, capacity: float = 1):
+        """
+        Initializes a SharedTokenBucket object, creating the database and the bucket if they do not exist.
+
+        Args:
+            file_path (str): The path to the SQLite database.
+            name (str): The name of the bucket in the database.
+            rate (float): The number of tokens added per second.
+            capacity (float): The maximum number of tokens, i.e. the allowed burst size.
+        """
+        super().__init__(rate, capacity)
+        self._file_path = file_path
+        self._name = name
+        self._connection = sqlite3.connect(file_path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._connection.execute("INSERT OR IGNORE INTO buckets VALUES (?, ?, ?)", (name, capacity, time.time()))
+
+    def _update(self, change: Callable[[float], float]) -> float:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, updated_at = self._connection.execute(
+                    "SELECT tokens, updated_at FROM buckets WHERE name = ?", (self._name,)
+                ).fetchone()
+                now = time.time()
+                tokens = change(min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate))
+                self._connection.execute(
+                    "UPDATE buckets SET tokens = ?, updated_at = ? WHERE name = ?", (tokens, max(now, updated_at), self._name)
+                )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            return tokens
+
+    def reserve(self) -> float:
+        """
+        Takes a token and returns how long to wait before using it.
+
+        Returns:
+            float: The number of seconds to wait.
+        """
+        tokens = self._update(lambda tokens: tokens - 1)
+        if tokens >= 0:
+            return 0
+        return -tokens / self.rate
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops handing out tokens for the given number of seconds, e.g. after a Retry-After response.
+
+        Args:
+            seconds (float): The number of seconds to pause for.
+        """
+        self._update(lambda tokens: min(tokens, -seconds * self.rate))
+
+
+class RateLimiter:
+    """
+    Keeps a token bucket for every host.
+
+    Attributes:
+        _limits (dict[str, tuple[float, float]]): The rate and capacity by host. A host also matches its subdomains.
+        _default_limit (tuple[float, float] | None): The rate and capacity for the other hosts. None means unlimited.
+        _shared_file_path (str | None): The path to the SQLite database of shared token buckets or None to keep them in memory.
+        _buckets (dict[str, TokenBucket]): The token buckets created so far by host.
+
+    Methods:
+        get_bucket(url): Returns the token bucket for the host of the URL, or None if the host is unlimited.
+        acquire(url): Blocks the current thread until a request to the URL is allowed.
+        acquire_async(url): Suspends the current task until a request to the URL is allowed.
+        share(file_path): Moves the token buckets to a SQLite database shared between processes and hosts.
+        set_limits(limits, default_limit): Replaces the limits and drops the token buckets created so far.
+        pause(url, seconds): Stops requests to the host of the URL for the given number of seconds.
+    """
+    def __init__(self, limits: dict[str, tuple[float, float]], default_limit: tuple[float, float] | None = None,
+                 shared_file_path: str | None = None):
+        """
+        Initializes a RateLimiter object.
+
+        Args:
+            limits (dict[str, tuple[float, float]]): The rate and capacity by host. A host also matches its subdomains.
+            default_limit (tuple[float, float] | None): The rate and capacity for the other hosts. None means unlimited.
+            shared_file_path (str | None): The path to a SQLite database to share the token buckets between processes and hosts.
+                None keeps them in memory.
+        """
+        self._limits = limits
+        self._default_limit = default_limit
+        self._shared_file_path = shared_file_path
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _find_limit(self, host: str) -> tuple[str, tuple[float, float] | None]:
+        for limited_host, limit in self._limits.items():
+            if host == limited_host or host.endswith(f".{limited_host}"):
+                return limited_host, limit
+        return host, self._default_limit
+
+    def get_bucket(self, url: str) -> TokenBucket | None:
+        """
+        Returns the token bucket for the host of the URL, or None if the host is unlimited.
+
+        Args:
+            url (str): The URL of the request.
+
+        Returns:
+            TokenBucket | None: The token bucket of the host.
+        """
+        host = (urlsplit(url).hostname or "").lower()
+        key, limit = self._find_limit(host)
+        if limit is None:
+            return None
+        with self._lock:
+            if key not in self._buckets:
+                if self._shared_file_path:
+                    self._buckets[key] = SharedTokenBucket(self._shared_file_path, key, *limit)
+                else:
+                    self._buckets[key] = TokenBucket(*limit)
+            return self._buckets[key]
+
+    def acquire(self, url: str) -> None:
+        """
+        Blocks the current thread until a request to the URL is allowed.
+
+        Args:
+            url (str): The URL of the request.
+        """
+        bucket = self.get_bucket(url)
+        if bucket:
+            bucket.acquire()
+
+    async def acquire_async(self, url: str) -> None:
+        """
+        Suspends the current task until a request to the URL is allowed.
+
+        Args:
+            url (str): The URL of the request.
+        """
+        bucket = self.get_bucket(url)
+        if bucket:
+            await bucket.acquire_async()
+
+    def share(self, file_path: str) -> None:
+        """
+        Moves the token buckets to a SQLite database shared between processes and hosts.
+
+        Args:
+            file_path (str): The path to the SQLite database.
+        """
+        with self._lock:
+            self._shared_file_path = file_path
+            self._buckets = {}
+
+    def set_limits(self, limits: dict[str, tuple[float, float]], default_limit: tuple[float, float] | None = None) -> None:
+        """
+        Replaces the limits and drops the token buckets created so far, e.g. to lift the limits for synthetic benchmarks.
+
+        Args:
+            limits (dict[str, tuple[float, float]]): The rate and capacity by host. A host also matches its subdomains.
+            default_limit (tuple[float, float] | None): The rate and capacity for the other hosts. None means unlimited.
+        """
+        with self._lock:
+            self._limits = limits
+            self._default_limit = default_limit
+            self._buckets = {}
+
+    def pause(self, url: str, seconds: float) -> None:
+        """
+        Stops requests to the host of the URL for the given number of seconds.
+
+        Args:
+            url (str): The URL of the request.
+            seconds (float): The number of seconds to pause for.
+        """
+        bucket = self.get_bucket(url)
+        if bucket:
+            bucket.pause(seconds)
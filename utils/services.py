@@ -0,0 +1,145 @@
+import threading
+from typing import Any, Callable
+
+
+def _close(service: Any) -> None:
+    close = getattr(service, "close", None)
+    if close:
+        close()
+
+
+class ServiceRegistry:
+    """
+    Creates services on first use, so a run only pays for the imports, models and clients it actually needs.
+
+    Every service is created at most once, even if several threads ask for it at the same time.
+    A service can be warmed up in a background thread, so its creation overlaps with other work.
+    Services are closed in the reverse order of their creation, so a service is closed before the services it was created from.
+
+    Attributes:
+        _factories (dict[str, Callable[[], Any]]): The function that creates every service by name.
+        _closers (dict[str, Callable[[Any], None]]): The function that closes every service by name.
+        _services (dict[str, Any]): The created services by name, in the order of their creation.
+
+    Methods:
+        register(name, factory, closer): Registers the factory of the service.
+        get(name): Returns the service, creating it if needed.
+        peek(name): Returns the service if it has been created or None.
+        warm_up(*names): Starts creating the services in a background thread.
+        close(): Closes the created services in the reverse order of their creation.
+    """
+    def __init__(self):
+        """
+        Initializes a ServiceRegistry object without any services.
+        """
+        self._factories = {}
+        self._closers = {}
+        self._services = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._warm_up_threads = []
+
+    def register(self, name: str, factory: Callable[[], Any], closer: Callable[[Any], None] = _close) -> None:
+        """
+        Registers the factory of the service.
+
+        Args:
+            name (str): The name of the service.
+            factory (Callable[[], Any]): Creates the service. It may get other services from the registry.
+            closer (Callable[[Any], None]): Closes the service. Calls its close method by default.
+
+        Raises:
+            ValueError: If a service with the name is already registered.
+        """
+        with self._lock:
+            if name in self._factories:
+                raise ValueError(f"Service \"{name}\" is already registered")
+            self._factories[name] = factory
+            self._closers[name] = closer
+            self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        """
+        Returns the service, creating it if needed.
+
+        If the factory raises an exception, the service is not created and the next call tries again.
+
+        Args:
+            name (str): The name of the service.
+
+        Returns:
+            Any: The service.
+
+        Raises:
+            KeyError: If no service with the name is registered.
+        """
+        if name in self._services:
+            return self._services[name]
+        if name not in self._factories:
+            raise KeyError(f"Service \"{name}\" is not registered")
+        with self._locks[name]:
+            if name not in self._services:
+                service = self._factories[name]()
+                with self._lock:
+                    self._services[name] = service
+            return self._services[name]
+
+    def peek(self, name: str) -> Any:
+        """
+        Returns the service if it has been created or None.
+
+        Args:
+            name (str): The name of the service.
+
+        Returns:
+            Any: The service or None if it has not been created yet.
+        """
+        return self._services.get(name)
+
+    def warm_up(self, *names: str) -> None:
+        """
+        Starts creating the services in a background thread. Services that are already created are skipped.
+        An exception is not raised here but by the next get of the service.
+
+        Args:
+            *names (str): The names of the services.
+        """
+        names = [name for name in names if name not in self._services]
+        if not names:
+            return
+
+        def create() -> None:
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    return
+
+        thread = threading.Thread(target=create, name=f"warm-up-{'-'.join(names)}", daemon=True)
+        with self._lock:
+            self._warm_up_threads.append(thread)
+        thread.start()
+
+    def close(self) -> None:
+        """
+        Waits for the warm-up threads and closes the created services in the reverse order of their creation.
+        All services are closed even if closing one of them fails.
+
+        Raises:
+            Exception: The first exception raised by a closer.
+        """
+        for thread in self._warm_up_threads:
+            thread.join()
+        with self._lock:
+            services = list(self._services.items())
+            self._services.clear()
+        error = None
+        for name, service in reversed(services):
+            if service is None:
+                continue
+            try:
+                self._closers[name](service)
+            except Exception as e:
+                error = error or e
+        if error:
+            raise error
@@ -0,0 +1,156 @@
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from requests import Session
+from utils.http_archive import HTTPArchive, ReplayPolicy, filter_response_headers
+
+
+FORWARDED_REQUEST_HEADERS_SKIPPED = {"host", "content-length", "accept-encoding", "connection"}
+SERVER_HEADERS = {"date", "server"}
+
+
+class StandInServer:
+    """
+    A local HTTP server that stands in for a remote service, e.g. Supabase, whose client cannot be given a requests Session.
+
+    In the record mode, every request is forwarded to the upstream URL and the exchange is recorded in the archive.
+    In the replay mode, requests are served from the archive with the latency and injected errors of the replay policy,
+    and requests missing from the archive get a 404 response.
+
+    Attributes:
+        url (str): The base URL of the server.
+        _archive (HTTPArchive): The archive to record in or replay from.
+        _mode (str): "record" or "replay".
+        _upstream_url (str | None): The base URL of the service that requests are forwarded to in the record mode.
+        _policy (ReplayPolicy): The latency and error policy of the replay mode.
+
+    Methods:
+        start(): Starts serving requests in a background thread.
+        close(): Stops the server.
+    """
+    def __init__(self, archive: HTTPArchive, mode: str, upstream_url: str | None = None, policy: ReplayPolicy | None = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        """
+        Initializes a StandInServer object and binds it to the address.
+
+        Args:
+            archive (HTTPArchive): The archive to record in or replay from.
+            mode (str): "record" or "replay".
+            upstream_url (str | None): The base URL of the service that requests are forwarded to in the record mode.
+            policy (ReplayPolicy | None): The latency and error policy. None replays the recorded latency without errors.
+            host (str): The host to bind to.
+            port (int): The port to bind to. 0 picks a free port.
+
+        Raises:
+            ValueError: If the mode is not "record" or "replay" or the record mode has no upstream URL.
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Mode \"{mode}\" must be \"record\" or \"replay\"")
+        if mode == "record" and not upstream_url:
+            raise ValueError("Record mode requires an upstream URL")
+        self._archive = archive
+        self._mode = mode
+        self._upstream_url = upstream_url.rstrip("/") if upstream_url else None
+        self._policy = policy or ReplayPolicy()
+        self._session = Session()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+        self.url = f"http://{host}:{self._server.server_address[1]}"
+
+    def _make_handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else None
+                status, headers, content = server._respond(self.command, self.path, dict(self.headers), body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    if name.lower() not in SERVER_HEADERS:
+                        self.send_header(name, value)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(content)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = _handle
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+    def _respond(self, method: str, path: str, headers: dict, body: bytes | None) -> tuple[int, dict, bytes]:
+        if self._mode == "record":
+            url = f"{self._upstream_url}{path}"
+            forwarded_headers = {
+                name: value for name, value in headers.items() if name.lower() not in FORWARDED_REQUEST_HEADERS_SKIPPED
+            }
+            response = self._session.request(method, url, headers=forwarded_headers, data=body, allow_redirects=False)
+            response_headers = filter_response_headers(response.headers)
+            self._archive.record(method, url, body, response.status_code, response_headers,
+                                 response.content, response.elapsed.total_seconds())
+            return response.status_code, response_headers, response.content
+
+        recorded = self._archive.find(method, f"{self._upstream_url}{path}" if self._upstream_url else path, body)
+        if recorded is None:
+            return 404, {}, b"Not recorded"
+        self._policy.wait(recorded["elapsed"])
+        if self._policy.should_fail():
+            return self._policy.error_status, {}, b"Injected error"
+        return recorded["status"], recorded["headers"], recorded["body"]
+
+    def start(self) -> "StandInServer":
+        """
+        Starts serving requests in a background thread.
+
+        Returns:
+            StandInServer: The server itself.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stand-in-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """
+        Stops the server.
+        """
+        if self._thread:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        self._session.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serves or records an HTTP archive as a stand-in for a remote service.")
+    parser.add_argument("archive", help="path to the archive database")
+    parser.add_argument("--upstream", help="forward requests to this URL and record them instead of replaying")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, help="latency of every response in seconds, defaults to the recorded latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of replacing a response with a 503")
+    parser.add_argument("--seed", type=int, help="seed of the injected errors")
+    args = parser.parse_args()
+
+    archive = HTTPArchive(args.archive)
+    policy = ReplayPolicy(args.latency, args.error_rate, seed=args.seed)
+    server = StandInServer(archive, "record" if args.upstream else "replay", args.upstream, policy, args.host, args.port)
+    print(f"Serving {args.archive} on {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Exiting...")
+    finally:
+        server.close()
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
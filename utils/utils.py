@@ -1,13 +1,36 @@
 import os
 import io
 import re
+import json
 import time
+import random
 from PIL import Image
+from typing import Any
 from datetime import datetime
+from functools import lru_cache
 from unidecode import unidecode
 from requests import Session, Response
-from requests.exceptions import HTTPError
+from urllib.parse import urlsplit
+from email.utils import parsedate_to_datetime
+from requests.exceptions import HTTPError, ConnectionError, Timeout
+from utils.rate_limiter import RateLimiter
+from utils.metrics import METRICS
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+REQUEST_TIMEOUT = (10, 30)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+BACKOFF_FACTOR = 1
+MAX_BACKOFF = 60
+
+RATE_LIMITER = RateLimiter({
+    "musicbrainz.org": (1, 1),
+    "coverartarchive.org": (10, 10),
+})
 
 SPECIAL_CHARS_DICT = {
             "?": "question mark",
@@ -115,6 +138,77 @@ def load_lines(file_path: str, separator: str = "\n") -> list:
         return lines
 
 
+def load_json(content: bytes | str) -> Any:
+    """
+    Parses a JSON document with orjson if it is installed, or with the json module otherwise.
+
+    Args:
+        content (bytes | str): The JSON document.
+
+    Returns:
+        Any: The parsed document.
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def decode_cover(cover: bytes, resolution: tuple = (1024, 1024)) -> Image.Image:
+    """
+    Decodes the cover art into an RGB image of the given resolution.
+
+    JPEG covers are downscaled by the decoder itself (draft mode) to the smallest scale that is still not below the resolution,
+    so large covers are never fully decoded.
+
+    Args:
+        cover (bytes): The content of the cover art in bytes.
+        resolution (tuple): A tuple containing the desired width and height (e.g. (1024, 1024))
+
+    Returns:
+        Image.Image: The decoded RGB image.
+    """
+    image = Image.open(io.BytesIO(cover))
+    image.draft("RGB", resolution)
+    image = image.convert('RGB')
+    if image.size != tuple(resolution):
+        image = image.resize(resolution)
+    return image
+
+
+def encode_cover(image: Image.Image) -> bytes:
+    """
+    Encodes the image as JPEG.
+
+    Args:
+        image (Image.Image): The image to encode.
+
+    Returns:
+        bytes: The JPEG content.
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def write_file_atomic(file_path: str, content: bytes) -> None:
+    """
+    Writes the content to a temporary file and renames it to the file path,
+    so the file is never left partially written, e.g. on KeyboardInterrupt.
+    Also creates all directories in the file path if they do not exist.
+
+    Args:
+        file_path (str): The path to the file.
+        content (bytes): The content to write.
+    """
+    dir_path = os.path.dirname(file_path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    tmp_file_path = f"{file_path}.tmp"
+    with open(tmp_file_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_file_path, file_path)
+
+
 def save_cover(cover_path: str, cover: bytes, resolution: tuple = (1024, 1024)):
     """
     Saves the cover art to a file.
@@ -124,23 +218,7 @@ def save_cover(cover_path: str, cover: bytes, resolution: tuple = (1024, 1024)):
         cover (bytes): The content of the cover art in bytes.
         resolution (tuple): A tuple containing the desired width and height (e.g. (1024, 1024))
     """
-    try:
-        dir_path = os.path.dirname(cover_path)
-        os.makedirs(dir_path, exist_ok=True)
-        image = Image.open(io.BytesIO(cover))
-        image = image.convert('RGB')
-        image = image.resize(resolution)
-        image.save(cover_path)
-    except KeyboardInterrupt as e:
-        print(f"Saving {cover_path}...")
-        raise e
-    finally:
-        dir_path = os.path.dirname(cover_path)
-        os.makedirs(dir_path, exist_ok=True)
-        image = Image.open(io.BytesIO(cover))
-        image = image.convert('RGB')
-        image = image.resize(resolution)
-        image.save(cover_path)
+    write_file_atomic(cover_path, encode_cover(decode_cover(cover, resolution)))
 
 
 def get_user_input(prompt, original_value):
@@ -183,39 +261,86 @@ def create_file_if_not_exists(file_path: str) -> str:
     return file_path
 
 
-def make_api_request(s: Session, url: str) -> Response:
+def _get_retry_after(response: Response) -> float | None:
+    retry_after = response.headers.get("Retry-After")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def make_api_request(s: Session, url: str, timeout: tuple[float, float] = REQUEST_TIMEOUT, max_retries: int = 5,
+                     rate_limiter: RateLimiter | None = RATE_LIMITER, **kwargs) -> Response:
     """
     Makes a GET request to the specified URL using the provided Session object.
 
-    The function will retry the request up to 5 times with exponential backoff if it encounters a 503 status code.
+    Every attempt first waits for the rate limiter of the URL's host, so concurrent callers share the allowed rate.
+    The function will retry the request up to max_retries times on 429 and 5xx status codes, connection errors and timeouts.
+    It waits for the Retry-After header if the server sends one and for a jittered exponential backoff otherwise.
     If all retries fail, it will raise an exception.
+    Every attempt is recorded in METRICS by host and status, together with the time spent waiting for the rate limiter and backing off.
 
     Args:
         s (Session): The Session object to use for the request.
         url (str): The URL to make the request to.
+        timeout (tuple[float, float]): The connect and read timeouts of every attempt in seconds.
+        max_retries (int): The maximum number of retries.
+        rate_limiter (RateLimiter | None): The rate limiter to wait for before every attempt. None disables rate limiting.
+        **kwargs: Additional keyword arguments for Session.get.
 
     Returns:
         Response: The response object from the successful request.
 
     Raises:
+        HTTPError: If the response has a status code that is not retried.
         Exception: If all retries fail.
     """
-    retries = 0
-    max_retries = 5
-    backoff_factor = 1
-    while retries < max_retries:
+    host = urlsplit(url).hostname or ""
+    last_error = None
+    for attempt in range(max_retries + 1):
+        if rate_limiter:
+            wait_start = time.perf_counter()
+            rate_limiter.acquire(url)
+            METRICS.increment("http_rate_limit_wait_seconds_total", time.perf_counter() - wait_start, host=host)
+        retry_after = None
+        status = "error"
+        request_start = time.perf_counter()
         try:
-            response = s.get(url)
+            response = s.get(url, timeout=timeout, **kwargs)
+            status = str(response.status_code)
             response.raise_for_status()
             return response
         except HTTPError as e:
-            if e.response.status_code == 503:
-                retries += 1
-                backoff_factor *= 2
-                time.sleep(backoff_factor)
-            else:
+            if e.response.status_code not in RETRY_STATUS_CODES:
                 raise
-    raise Exception(f"Failed to make API request after {max_retries} retries")
+            last_error = e
+            retry_after = _get_retry_after(e.response)
+        except (ConnectionError, Timeout) as e:
+            last_error = e
+        finally:
+            METRICS.observe("http_request_seconds", time.perf_counter() - request_start, host=host)
+            METRICS.increment("http_requests_total", host=host, status=status)
+        if attempt == max_retries:
+            break
+        METRICS.increment("http_retries_total", host=host)
+        if retry_after is None:
+            backoff = random.uniform(0, min(MAX_BACKOFF, BACKOFF_FACTOR * 2 ** attempt))
+        elif rate_limiter and rate_limiter.get_bucket(url):
+            # The pause is waited out in the next acquire and counted as rate limiter wait.
+            rate_limiter.pause(url, min(retry_after, MAX_BACKOFF))
+            continue
+        else:
+            backoff = min(retry_after, MAX_BACKOFF)
+        time.sleep(backoff)
+        METRICS.increment("http_backoff_seconds_total", backoff, host=host)
+    raise Exception(f"Failed to make API request after {max_retries} retries") from last_error
 
 
 def format_date(date: str) -> datetime:
@@ -253,4 +378,30 @@ def format_date(date: str) -> datetime:
         dt = dt.replace(day=1)
     if dt.month == 0:
         dt = dt.replace(month=1)
-    return dt
\ No newline at end of file
+    return dt
+
+
+@lru_cache(maxsize=4096)
+def date_to_ordinal(date: str) -> int:
+    """
+    Converts a date string to the proleptic Gregorian ordinal of its first day, so dates can be compared as integers.
+
+    Accepts the same formats as format_date without trying every format with strptime:
+    - %Y-%m-%d
+    - %Y-%m
+    - %Y
+
+    Args:
+        date (str): The date string to convert.
+
+    Returns:
+        int: The ordinal of the date, where January 1 of year 1 is 1.
+
+    Raises:
+        ValueError: If the date string cannot be parsed.
+    """
+    parts = date.split("-")
+    if not 1 <= len(parts) <= 3 or not all(part.isdigit() for part in parts):
+        raise ValueError("Date must be in one of the following formats: %Y-%m-%d, %Y-%m, %Y")
+    year, month, day = [int(part) for part in parts] + [1] * (3 - len(parts))
+    return datetime(year, month, day).toordinal()